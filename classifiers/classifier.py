@@ -1,30 +1,237 @@
 #!/usr/bin/env python3
 """ Manages classifier files.
+Models are loaded lazily, once per process, and shared by all containers (see load).
+There are three backends: SVM classifiers (svm, need sklearn), nearest-template classifiers (template, NumPy only)
+and both of them in two passes (two-pass): all samples are classified by template classifier, and only those
+it is not sure about are classified again by SVM classifier (loaded only if it is needed; if it cannot be loaded,
+e.g. sklearn is missing, such samples keep labels and low confidence given by template classifier).
 """
 
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import warnings
+
+import numpy as np
+
+from classifiers.template import TemplateClassifier
+
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
 
 
-def get(classifier):
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FILES = {'digit': 'digit_clf.p', 'horizontal': 'horizclf.p', 'vertical': 'vertclf.p',
+         'square': 'sqclf.p', 'x': 'xclf.p'}
+TEMPLATES = {'digit': 'digit_templates.npz', 'horizontal': 'horiz_templates.npz', 'vertical': 'vert_templates.npz',
+             'square': 'sq_templates.npz', 'x': 'x_templates.npz'}
+BACKENDS = {'svm': FILES, 'template': TEMPLATES, 'two-pass': FILES}
+# margins of scores of template classifiers (best class - second best) below which samples are classified
+# again in two-pass backend; SVM classifiers are better only at digits close to templates of two classes
+# (on bundled images: two-pass digits - no errors, template - 1 error), so dots are re-classified only at ties
+MARGINS = {'digit': 0.75, 'horizontal': 0.1, 'vertical': 0.1, 'square': 0.1, 'x': 0.1}
+
+models = {}  # models loaded in this process, by name and backend
+versions = {}  # digests of files of classifiers, by names and backend
+lock = threading.Lock()
+
+
+def get(classifier, backend='svm'):
     """
-    Gives SVM classifier file, depending on name.
+    Gives classifier file, depending on name. File has to be closed by caller, see also load.
     :param classifier: name of classifier: [digit, horizontal, vertical, square, x]
+    :param backend: svm or template
     :return: classifier file
     """
-    if classifier == 'digit':
-        return open('classifiers/digit_clf.p', 'rb')
-    elif classifier == 'horizontal':
-        return open('classifiers/horizclf.p', 'rb')
-    elif classifier == 'vertical':
-        return open('classifiers/vertclf.p', 'rb')
-    elif classifier == 'square':
-        return open('classifiers/sqclf.p', 'rb')
-    elif classifier == 'x':
-        return open('classifiers/xclf.p', 'rb')
+    if classifier in BACKENDS[backend]:
+        return open(os.path.join(DIRECTORY, BACKENDS[backend][classifier]), 'rb')
     else:
         print('No such classifier: {}'.format(classifier))
 
 
+def load(classifier, backend='svm'):
+    """
+    Gives classifier, depending on name. Classifier is read at first use and then shared.
+    :param classifier: name of classifier: [digit, horizontal, vertical, square, x]
+    :param backend: svm (SVM classifier), template (nearest-template classifier) or two-pass (both)
+    :return: classifier
+    """
+    with lock:
+        if (classifier, backend) not in models:
+            if classifier not in BACKENDS[backend]:
+                raise KeyError('No such classifier: {}'.format(classifier))
+            if backend == 'two-pass':
+                models[(classifier, backend)] = TwoPassClassifier(classifier)
+                return models[(classifier, backend)]
+            with get(classifier, backend) as f:
+                if backend == 'template':
+                    models[(classifier, backend)] = TemplateClassifier.load(f, MARGINS[classifier])
+                elif sys.version_info < (3, 0):
+                    models[(classifier, backend)] = pickle.load(f)
+                else:
+                    models[(classifier, backend)] = pickle.load(f, encoding='latin1')
+        return models[(classifier, backend)]
+
+
+def prewarm(classifiers=None, backend='svm'):
+    """
+    Loads classifiers in advance, e.g. before forking worker processes, so that workers share them.
+    :param classifiers: names of classifiers, all if None
+    :param backend: svm, template or two-pass (only template classifiers are loaded, SVM classifiers are loaded
+    when they are needed)
+    :return: None
+    """
+    for name in classifiers or BACKENDS[backend]:
+        if backend == 'two-pass':
+            load(name, 'template')
+        load(name, backend)
+
+
+def version(classifiers=None, backend='svm'):
+    """
+    Gives version of classifiers: digest of their files (and margins for two-pass backend), so it changes whenever
+    classifiers change, e.g. to find results of classification stored earlier (see common.cache).
+    Files are read once per process, classifiers are not loaded.
+    :param classifiers: names of classifiers, all if None
+    :param backend: svm, template or two-pass
+    :return: hexadecimal digest
+    """
+    names = tuple(sorted(classifiers or BACKENDS[backend]))
+    with lock:
+        if (names, backend) not in versions:
+            digest = hashlib.sha256(backend.encode())
+            kinds = ['template', 'svm'] if backend == 'two-pass' else [backend]
+            for name in names:
+                for kind in kinds:
+                    with open(os.path.join(DIRECTORY, BACKENDS[kind][name]), 'rb') as f:
+                        digest.update(f.read())
+                if backend != 'svm':
+                    digest.update(repr(MARGINS[name]).encode())
+            versions[(names, backend)] = digest.hexdigest()
+        return versions[(names, backend)]
+
+
+class TwoPassClassifier:
+    """Template classifier, with samples it is not sure about classified again by SVM classifier."""
+
+    def __init__(self, name):
+        """
+        Initialization of classifier, models are loaded at first use (see load).
+        :param name: name of classifier: [digit, horizontal, vertical, square, x]
+        """
+        self.name = name
+        self.error = None  # error of loading SVM classifier, it is not loaded again
+
+    @property
+    def fast(self):
+        """Template classifier, used for all samples."""
+        return load(self.name, 'template')
+
+    @property
+    def exact(self):
+        """SVM classifier, used for samples with low confidence only; None if it cannot be loaded."""
+        if self.error is None:
+            try:
+                return load(self.name, 'svm')
+            except Exception as error:
+                self.error = error
+                warnings.warn('SVM classifier {} cannot be loaded ({}: {}), samples are classified by template '
+                              'classifier only'.format(self.name, type(error).__name__, error))
+        return None
+
+    @property
+    def classes_(self):
+        """Labels of classes."""
+        return self.fast.classes_
+
+    def classify(self, data):
+        """
+        Classifies samples in two passes.
+        :param data: array, one row of features for every sample
+        :return: labels, decision scores (of template classifier) and confidence of samples (see confidence);
+        samples classified again have confidence 1 if both classifiers agree, if SVM classifier cannot be loaded
+        samples keep labels and confidence of template classifier
+        """
+        labels, scores = classify(self.fast, data)
+        certainty = confidence(self.fast, labels, scores)
+        unsure = np.flatnonzero(certainty < 1)
+        if len(unsure) and self.exact is not None:
+            exact = classify(self.exact, np.asarray(data)[unsure])[0]
+            certainty[unsure[exact == labels[unsure]]] = 1
+            labels[unsure] = exact
+        return labels, scores, certainty
+
+    def predict(self, data):
+        """Returns labels of samples."""
+        return self.classify(data)[0]
+
+
+def classify(classifier, data):
+    """
+    Classifies rows of data with one evaluation of classifier.
+    For SVM classifier labels are chosen from decision scores the way libsvm does it (one-vs-one voting,
+    ties go to first class), so they are the same as given by predict.
+    :param classifier: SVM, nearest-template or two-pass classifier
+    :param data: array, one row of features for every sample
+    :return: labels and decision scores of samples
+    """
+    if isinstance(classifier, TwoPassClassifier):
+        return classifier.classify(data)[:2]
+    if isinstance(classifier, TemplateClassifier):
+        return classifier.classify(data)
+    scores = classifier.decision_function(data)
+    classes = classifier.classes_
+    if scores.ndim == 1:
+        return classes[(scores > 0).astype(int)], scores
+    first, second = np.triu_indices(len(classes), 1)
+    if scores.shape[1] != len(first):
+        return classifier.predict(data), scores
+    votes = np.zeros((len(scores), len(classes)), int)
+    for k in range(len(first)):
+        winners = np.where(scores[:, k] > 0, first[k], second[k])
+        votes[np.arange(len(scores)), winners] += 1
+    return classes[votes.argmax(axis=1)], scores
+
+
+def confidence(classifier, labels, scores):
+    """
+    Tells how sure classifier is of labels: 1 at the boundary below which two-pass classifier classifies
+    samples again. For template classifier it is margin of scores (best - second best) divided by margin
+    of classifier, for SVM classifier distance from decision boundary (in units of margin of SVM, for many classes
+    the smallest one among pairs of classes with chosen class).
+    :param classifier: SVM or nearest-template classifier
+    :param labels: labels of samples
+    :param scores: decision scores of samples
+    :return: array of confidence of samples
+    """
+    if isinstance(classifier, TemplateClassifier):
+        best = np.sort(scores, axis=1)[:, -2:]
+        with np.errstate(invalid='ignore'):
+            return np.nan_to_num((best[:, 1] - best[:, 0]) / classifier.margin)
+    if scores.ndim == 1:
+        return np.abs(scores)
+    first, second = np.triu_indices(len(classifier.classes_), 1)
+    if scores.shape[1] != len(first):
+        return np.max(scores, axis=1)
+    chosen = np.searchsorted(classifier.classes_, labels)[:, None]
+    oriented = np.where(first == chosen, scores, np.where(second == chosen, -scores, np.inf))
+    return np.maximum(oriented.min(axis=1), 0)
+
+
+def classify_with_confidence(classifier, data):
+    """
+    Classifies rows of data, see classify and confidence.
+    :param classifier: SVM, nearest-template or two-pass classifier
+    :param data: array, one row of features for every sample
+    :return: labels, decision scores and confidence of samples
+    """
+    if isinstance(classifier, TwoPassClassifier):
+        return classifier.classify(data)
+    labels, scores = classify(classifier, data)
+    return labels, scores, confidence(classifier, labels, scores)
+
+
 if __name__ == '__main__':
     print('Use get(classifier) function.')
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+""" Nearest-template classifier: fast alternative to SVM classifiers, using only NumPy.
+    Templates are stored images of every class. Score of class is (log of) mean of exp(-gamma * squared distance)
+    to templates of that class, so samples close to templates of class get high score, whatever the number
+    of templates of every class. Distances of whole batch of samples to all templates come from one
+    matrix multiplication.
+    Templates are built from the same folders as in numberrecognition.py and circle_recognition.py
+    (images are not included in this repository) or from support vectors of existing SVM classifiers.
+"""
+
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+
+class TemplateClassifier:
+    """Classifier comparing samples with stored templates."""
+
+    def __init__(self, templates, labels, classes, gamma=0.00001, margin=1.0):
+        """
+        Initialization of classifier.
+        :param templates: array, one row of features (pixels 0-255) for every template
+        :param labels: index of class of every template
+        :param classes: labels of classes
+        :param gamma: how fast influence of template decreases with distance
+        :param margin: difference of scores of the best and second best class for which classifier is sure
+        (see classifier.confidence)
+        """
+        self.templates = np.asarray(templates, float)
+        self.labels = np.asarray(labels, int)
+        self.classes_ = np.asarray(classes)
+        self.gamma = float(gamma)
+        self.margin = float(margin)
+        self.norms = (self.templates ** 2).sum(axis=1)
+        # weights of templates in mean of their class
+        self.members = np.zeros((len(self.labels), len(self.classes_)))
+        self.members[np.arange(len(self.labels)), self.labels] = 1
+        self.members /= np.maximum(self.members.sum(axis=0), 1)
+
+    @classmethod
+    def from_svm(cls, svm):
+        """Creates classifier with support vectors of SVM classifier as templates."""
+        labels = np.repeat(np.arange(len(svm.classes_)), svm.n_support_)
+        return cls(svm.support_vectors_, labels, svm.classes_, svm.gamma)
+
+    @classmethod
+    def load(cls, f, margin=1.0):
+        """Reads classifier from .npz file."""
+        data = np.load(f)
+        return cls(data['templates'], data['labels'], data['classes'], data['gamma'], margin)
+
+    def save(self, f):
+        """Writes classifier to .npz file, templates are stored as bytes."""
+        np.savez_compressed(f, templates=np.clip(self.templates, 0, 255).astype(np.uint8), labels=self.labels,
+                            classes=self.classes_, gamma=self.gamma)
+
+    def decision_function(self, data):
+        """
+        Scores of classes.
+        :param data: array, one row of features for every sample
+        :return: array, one row of scores of all classes for every sample
+        """
+        data = np.asarray(data, float)
+        logits = -self.gamma * ((data ** 2).sum(axis=1)[:, None] - 2 * data.dot(self.templates.T) + self.norms)
+        top = logits.max(axis=1)[:, None]
+        with np.errstate(divide='ignore'):
+            return np.log(np.exp(logits - top).dot(self.members)) + top
+
+    def classify(self, data):
+        """Returns labels and scores of samples."""
+        scores = self.decision_function(data)
+        return self.classes_[scores.argmax(axis=1)], scores
+
+    def predict(self, data):
+        """Returns labels of samples."""
+        return self.classify(data)[0]
+
+
+def read_digits(data_dir):
+    """Reads training images of digits, prepared as in numberrecognition.py."""
+    images, labels = [], []
+    for d in ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '100']:
+        for y in sorted(glob.glob(os.path.join(data_dir, d, '*'))):
+            img = cv2.imread(y, cv2.IMREAD_GRAYSCALE)
+            images.append(cv2.resize(img[:-2, :], (15, 15)).reshape(-1))
+            labels.append(int(d))
+    return images, labels
+
+
+def read_circles(data_dir, d):
+    """Reads training images of one part of sym-a-pix puzzle (horiz, sq, vert, x), as in circle_recognition.py."""
+    images, labels = [], []
+    for l, dl in enumerate(['_empty', '_circle']):
+        for y in sorted(glob.glob(os.path.join(data_dir, d + dl, '*'))):
+            img = cv2.imread(y, cv2.IMREAD_GRAYSCALE)
+            images.append(cv2.resize(img, (20, 20)).reshape(-1))
+            labels.append(l)
+    return images, labels
+
+
+def train(images, labels):
+    """Creates classifier with all training images as templates."""
+    classes, indices = np.unique(labels, return_inverse=True)
+    return TemplateClassifier(np.array(images), indices, classes)
+
+
+if __name__ == '__main__':
+    # python -m classifiers.template - templates from support vectors of SVM classifiers in this directory
+    # python -m classifiers.template numbers_dir classes_dir - templates from training images
+    from classifiers import classifier
+    if len(sys.argv) > 2:
+        models = {'digit': train(*read_digits(sys.argv[1]))}
+        for name, d in [('horizontal', 'horiz'), ('square', 'sq'), ('vertical', 'vert'), ('x', 'x')]:
+            models[name] = train(*read_circles(sys.argv[2], d))
+    else:
+        models = dict((name, TemplateClassifier.from_svm(classifier.load(name))) for name in classifier.FILES)
+    for name, model in models.items():
+        model.save(os.path.join(classifier.DIRECTORY, classifier.TEMPLATES[name]))
@@ -0,0 +1,39 @@
+"""Compact storage of puzzle boards.
+
+Every board holds small integers only, so all of them are stored as int8 (one byte per field).
+Values used on boards:
+    fill-a-pix puzzle: 0-9 - number of black squares in neighbourhood, 100 - no number
+    fill-a-pix solution and user's solution: 1 - black, -1 - not black, 0 - unknown
+    sym-a-pix puzzle (doubled coordinates, squares at even positions, walls and crossings between them):
+        color of dot (1, 2, ...) where dot is, -1 (generated puzzle) or 0 (read puzzle) elsewhere
+    sym-a-pix solution and user's solution: squares - color of their block (0 - unknown),
+        walls - 1 if there is a wall, 0 if not, -2 - dot on wall or crossing
+    sym-a-pix fill color: -1 - none, color of block otherwise
+Values of fields should be converted to int before adding them up, sums of them may not fit in int8.
+"""
+
+import numpy as np
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+BOARD_TYPE = np.int8
+
+
+def new_board(shape, value=0):
+    """
+    Creates board filled with value.
+    :param shape: shape of board
+    :param value: initial value of every field
+    :return: board
+    """
+    return np.full(shape, value, BOARD_TYPE)
+
+
+def as_board(array):
+    """
+    Converts array to board, array is not copied if it already is a board.
+    :param array: array or nested lists
+    :return: board
+    """
+    return np.asarray(array, BOARD_TYPE)
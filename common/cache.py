@@ -0,0 +1,130 @@
+"""On-disk cache of puzzles read from images.
+
+Reading puzzle (decoding image, detecting lines, classifying fragments) is repeated every time the same image is
+opened, so its results (positions of lines, board, colors, confidence of classifiers) are stored in .npz files.
+Entry is found by digest of bytes of image and of everything else that changes result of reading (kind of puzzle,
+classifiers and their files, parameters of reader, version of reading), so modified images or classifiers never
+get stale entries. Entries not used for the longest time are removed when cache gets too big (time of last use
+is modification time of file).
+Directory of cache can be set with environment variable PUZZLE_CACHE.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+DIRECTORY = os.environ.get('PUZZLE_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'puzzles'))
+VERSION = 1                  # version of reading, has to be changed whenever results of reading change
+MAX_ENTRIES = 1000           # largest number of entries
+MAX_BYTES = 64 * 2 ** 20     # largest size of all entries
+
+
+class PuzzleCache:
+    """Entries of arrays in .npz files, found by digest of image."""
+
+    def __init__(self, directory=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        """
+        Initialization of cache, directory is created at first write.
+        :param directory: directory of entries, DIRECTORY if None
+        :param max_entries: largest number of entries
+        :param max_bytes: largest size of all entries
+        """
+        self.directory = directory or DIRECTORY
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(filename, *parts):
+        """
+        Gives key of entry.
+        :param filename: name of file with image, bytes of file already read or image already decoded
+        :param parts: everything else that changes result of reading
+        :return: hexadecimal digest of bytes of image and parts
+        """
+        digest = hashlib.sha256()
+        if isinstance(filename, np.ndarray):
+            digest.update(repr(filename.shape).encode())
+            digest.update(np.ascontiguousarray(filename).data)
+        elif isinstance(filename, (bytes, bytearray, memoryview)):
+            digest.update(filename)
+        else:
+            with open(str(filename), 'rb') as f:
+                for block in iter(lambda: f.read(2 ** 20), b''):
+                    digest.update(block)
+        digest.update(repr((VERSION,) + parts).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        """Returns name of file of entry."""
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """
+        Reads entry, and marks it as just used.
+        :param key: key of entry
+        :return: dictionary of arrays, None if there is no such entry
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                entry = dict((name, data[name]) for name in data.files)
+            os.utime(path)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, key, **arrays):
+        """
+        Writes entry (replacing old one at once, so readers never see a part of it) and removes entries
+        not used for the longest time if there are too many of them.
+        :param key: key of entry
+        :param arrays: arrays to be stored
+        :return: None
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        f, name = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(f, 'wb') as out:
+                np.savez(out, **arrays)
+            os.replace(name, self.path(key))
+        except BaseException:
+            os.remove(name)
+            raise
+        self.evict()
+
+    def entries(self):
+        """Returns names, times of last use and sizes of files of entries, the oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return [(name, used, size) for used, size, name in sorted(entries)]
+
+    def evict(self):
+        """Removes entries not used for the longest time, until there are at most max_entries of max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        for name, _, size in entries:
+            if len(entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            entries = entries[1:]
+            total -= size
+
+    def clear(self):
+        """Removes all entries."""
+        if os.path.isdir(self.directory):
+            for name, _, _ in self.entries():
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,180 @@
+"""Geometry of boards in doubled coordinates.
+
+Squares are at (even, even) positions, walls at (even, odd) and (odd, even), crossings at (odd, odd).
+Which walls surround a point, which squares a dot covers, etc. depends only on position, so for every
+shape of board it is computed once (Geometry objects are shared between boards of the same shape)
+and kept as tuples of positions and as offsets in flat indices of padded boards (boards with lines
+just outside of board).
+"""
+
+import numpy as np
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+# offsets of relations from point, by parity of point (x % 2, y % 2)
+FRAME = {(0, 0): ((-1, 0), (1, 0), (0, -1), (0, 1)),
+         (0, 1): ((0, -2), (0, 2), (-1, -1), (-1, 1), (1, -1), (1, 1)),
+         (1, 0): ((-2, 0), (2, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)),
+         (1, 1): ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))}
+BLOCK = {(0, 0): ((0, 0),),
+         (0, 1): ((0, -1), (0, 1)),
+         (1, 0): ((-1, 0), (1, 0)),
+         (1, 1): ((-1, -1), (-1, 1), (1, -1), (1, 1))}
+NEXT_TO = {(0, 0): ((0, -1), (0, 1)),
+           (0, 1): ((0, -1), (0, 1)),
+           (1, 0): ((-1, 0), (1, 0)),
+           (1, 1): ()}
+ADJACENT = ((-2, 0), (2, 0), (0, -2), (0, 2))
+
+
+def shifted(x, y, offsets):
+    """Returns positions x, y moved by offsets."""
+    return tuple((x + a, y + b) for a, b in offsets)
+
+
+def frame_at(i, j):
+    """Closest possible walls around point."""
+    return shifted(i, j, FRAME[(i % 2, j % 2)])
+
+
+def block_at(i, j):
+    """Squares covered by dot in point."""
+    return shifted(i, j, BLOCK[(i % 2, j % 2)])
+
+
+def next_to_at(x, y):
+    """Two squares next to wall, empty for crossings."""
+    return shifted(x, y, NEXT_TO[(x % 2, y % 2)])
+
+
+def adjacent_at(x, y):
+    """Squares adjacent to square."""
+    return shifted(x, y, ADJACENT)
+
+
+def wall_at(x, y, i, j):
+    """Wall between two squares, None if they are not in one row or column."""
+    if x == i:
+        return x, int((y + j) / 2)
+    elif y == j:
+        return int((x + i) / 2), y
+
+
+class Geometry:
+    """Relations between points of board with given shape, computed once for every shape."""
+
+    shapes = {}
+
+    def __new__(cls, shape):
+        shape = (int(shape[0]), int(shape[1]))
+        geometry = cls.shapes.get(shape)
+        if geometry is None:
+            geometry = super().__new__(cls)
+            geometry.setup(shape)
+            cls.shapes[shape] = geometry
+        return geometry
+
+    def __reduce__(self):
+        """Geometry is pickled (and copied) as its shape, so unpickled geometry is shared too."""
+        return Geometry, (self.shape,)
+
+    def setup(self, shape):
+        """
+        Computes layout of padded boards and offsets of relations.
+        Padded board has margin of one point (lines just outside of board), so walls around any point of board
+        can be read by flat index without checking bounds; points symmetric around dots can be further away,
+        they are found by mirror_indices.
+        :param shape: shape of board
+        :return: None
+        """
+        self.shape = shape
+        h, w = shape
+        self.margin = (1, 1)
+        top, left = self.margin
+        self.padded_shape = (h + 2 * top, w + 2 * left)
+        self.stride = self.padded_shape[1]
+        self.offset = top * self.stride + left
+        self.wall_offsets = (-self.stride, self.stride, -1, 1)  # walls around square
+        inside = np.zeros(self.padded_shape, bool)
+        inside[top: top + h, left: left + w] = True
+        self.inside_mask = inside.reshape(-1)
+        self.frame_offsets = dict((p, np.array([a * self.stride + b for a, b in f], int)) for p, f in FRAME.items())
+        self.block_offsets = dict((p, np.array([a * self.stride + b for a, b in f], int)) for p, f in BLOCK.items())
+        self.frames = {}
+        self.blocks = {}
+        self.neighbours = {}
+
+    def index(self, x, y):
+        """Returns flat index of point x, y in padded boards."""
+        return self.offset + x * self.stride + y
+
+    def position(self, index):
+        """Returns point x, y of flat index in padded boards."""
+        x, y = divmod(index, self.stride)
+        return x - self.margin[0], y - self.margin[1]
+
+    def is_inside(self, x, y):
+        """Checks if point is inside the board."""
+        return 0 <= x < self.shape[0] and 0 <= y < self.shape[1]
+
+    def mirror_index(self, index, centre):
+        """
+        Returns flat index of point symmetric to point with flat index around point with flat index centre,
+        None if it is outside of padded board.
+        """
+        (a, b), (c, d) = divmod(centre, self.stride), divmod(index, self.stride)
+        x, y = 2 * a - c, 2 * b - d
+        if 0 <= x < self.padded_shape[0] and 0 <= y < self.stride:
+            return x * self.stride + y
+        return None
+
+    def mirror_indices(self, x, y, indices):
+        """
+        Returns flat indices of points symmetric to points with flat indices around point x, y,
+        and which of them are inside of padded board (others have to be dropped, their indices are not valid).
+        """
+        rows, cols = np.divmod(indices, self.stride)
+        rows = 2 * (x + self.margin[0]) - rows
+        cols = 2 * (y + self.margin[1]) - cols
+        valid = (rows >= 0) & (rows < self.padded_shape[0]) & (cols >= 0) & (cols < self.stride)
+        return rows * self.stride + cols, valid
+
+    def frame(self, x, y):
+        """Returns closest possible walls around point, as tuple of positions."""
+        frame = self.frames.get((x, y))
+        if frame is None:
+            frame = self.frames[(x, y)] = frame_at(int(x), int(y))
+        return frame
+
+    def block(self, x, y):
+        """Returns squares covered by dot in point, as tuple of positions."""
+        block = self.blocks.get((x, y))
+        if block is None:
+            block = self.blocks[(x, y)] = block_at(int(x), int(y))
+        return block
+
+    def adjacent(self, x, y):
+        """Returns squares adjacent to square, as tuple of positions."""
+        adjacent = self.neighbours.get((x, y))
+        if adjacent is None:
+            adjacent = self.neighbours[(x, y)] = adjacent_at(int(x), int(y))
+        return adjacent
+
+    @staticmethod
+    def next_to(x, y):
+        """Returns two squares next to wall."""
+        return next_to_at(x, y)
+
+    @staticmethod
+    def wall_between(x, y, i, j):
+        """Returns wall between two squares."""
+        return wall_at(x, y, i, j)
+
+    def frame_indices(self, x, y):
+        """Returns flat indices of closest possible walls around point."""
+        return self.offset + x * self.stride + y + self.frame_offsets[(x % 2, y % 2)]
+
+    def block_indices(self, x, y):
+        """Returns flat indices of squares covered by dot in point."""
+        return self.offset + x * self.stride + y + self.block_offsets[(x % 2, y % 2)]
@@ -13,6 +13,19 @@ __email__ = 'ada.borowa@gmail.com'
 DEGREE_VERTICAL = 0          # 0 degrees
 DEGREE_HORIZONTAL = 1.5708   # pi/2 degrees
 EPS = 0.0001
+LINE_WIDTH = 11              # lines thinner than this are found in profiles
+LINE_CONTRAST = 40           # how much darker than surroundings pixel of line is
+LINE_FILL = 0.6              # part of row (column) that has to be line
+FRAME_WIDTH = 3              # first and last lines thicker than this are frame of puzzle
+LINE_REGULARITY = 0.25       # largest allowed deviation of distance between lines from median distance
+CELL_SIZE = 28               # images are reduced only as long as cells keep at least this size
+GRID_AREA = 0.02             # smallest area of grid on page, relative to area of page
+GRID_FILL = 0.85             # smallest part of bounding box of grid enclosed by its outline
+# flags of cv2.imread for images reduced 1, 2, 4 and 8 times while decoding: gray, colour
+REDUCED = {1: (cv2.IMREAD_GRAYSCALE, cv2.IMREAD_COLOR),
+           2: (cv2.IMREAD_REDUCED_GRAYSCALE_2, cv2.IMREAD_REDUCED_COLOR_2),
+           4: (cv2.IMREAD_REDUCED_GRAYSCALE_4, cv2.IMREAD_REDUCED_COLOR_4),
+           8: (cv2.IMREAD_REDUCED_GRAYSCALE_8, cv2.IMREAD_REDUCED_COLOR_8)}
 
 
 def get_unique_lines(rhos):
@@ -36,7 +49,83 @@ def get_unique_lines(rhos):
     return tmp
 
 
+def get_profile(img, axis):
+    """
+    Counts, for every row (axis=0) or column (axis=1), part of pixels belonging to thin dark line along it.
+    Pixel belongs to line if it is darker than pixels above and below (left and right) of it - black-hat
+    with kernel across lines, so shading, text and thick shapes are not counted.
+    :param img: gray image
+    :param axis: 0 - profile of rows (horizontal lines), 1 - profile of columns (vertical lines)
+    :return: array with value from 0 to 1 for every row (column)
+    """
+    kernel = np.ones((LINE_WIDTH, 1) if axis == 0 else (1, LINE_WIDTH), np.uint8)
+    dark = cv2.morphologyEx(img, cv2.MORPH_BLACKHAT, kernel) > LINE_CONTRAST
+    return dark.mean(axis=1 - axis)
+
+
+def get_peaks(profile):
+    """
+    Finds positions of peaks of profile: centres of runs of rows (columns) that are filled by line.
+    First and last line (frame of puzzle) may be thicker than others or cut by border of image, their positions
+    are then taken at their inner edges, so cells cut up to the lines do not contain the frame (as with positions
+    from Hough transformation).
+    :param profile: profile of image
+    :return: list of positions of peaks
+    """
+    hot = np.concatenate(([False], profile > LINE_FILL, [False]))
+    edges = np.flatnonzero(hot[1:] != hot[:-1]).reshape(-1, 2)
+    peaks = []
+    for start, end in edges:
+        weights = profile[start: end]
+        peaks.append(int(np.dot(np.arange(start, end), weights) / weights.sum() + 0.5))
+    if len(edges):
+        start, end = edges[0]
+        if end - start > FRAME_WIDTH or start == 0:
+            peaks[0] = int(end) - 1
+        start, end = edges[-1]
+        if end - start > FRAME_WIDTH or end == len(profile):
+            peaks[-1] = int(start)
+    return peaks
+
+
+def is_grid(rhos):
+    """Checks if lines form grid: there are at least two of them and distances between them are similar."""
+    if len(rhos) < 2:
+        return False
+    distances = np.diff(rhos)
+    median = np.median(distances)
+    return median > 0 and np.abs(distances - median).max() <= LINE_REGULARITY * median
+
+
+def get_profile_lines(img):
+    """
+    Detects horizontal and vertical lines on image using darkness profiles of rows and columns.
+    Works only for images that are not rotated (lines of grid are parallel to edges of image).
+    :param img: gray image
+    :return: positions of horizontal and vertical lines, empty lists if lines do not form grid
+    """
+    rho_horizontal = get_peaks(get_profile(img, 0))
+    rho_vertical = get_peaks(get_profile(img, 1))
+    if not (is_grid(rho_horizontal) and is_grid(rho_vertical)):
+        return [], []
+    return get_unique_lines(rho_horizontal), get_unique_lines(rho_vertical)
+
+
 def get_line_positions(img, sensitivity=100):
+    """
+    Detects vertical and horizontal lines on image. Lines are found in profiles of image (fast);
+    if they do not form regular grid (e.g. image is rotated), Hough transformation is used.
+    :param sensitivity: Hough transformation parameter
+    :param img: Image
+    :return: positions of horizontal and vertical lines
+    """
+    rho_horizontal, rho_vertical = get_profile_lines(img)
+    if rho_horizontal:
+        return rho_horizontal, rho_vertical
+    return get_hough_lines(img, sensitivity)
+
+
+def get_hough_lines(img, sensitivity=100):
     """
     Using Hough transformation detects lines on image. Detects only vertical and horizontal lines.
     :param sensitivity: Hough transformation parameter
@@ -61,3 +150,237 @@ def get_line_positions(img, sensitivity=100):
     rho_vertical = get_unique_lines(rho_vertical)
 
     return rho_horizontal, rho_vertical
+
+
+def get_sample_positions(bounds, size, limit):
+    """
+    Positions of pixels of ranges of image resized to size, as in cv2.resize with linear interpolation.
+    :param bounds: list of (start, end) of ranges of pixels, end is not included
+    :param size: length of range after resizing
+    :param limit: size of image (ranges are cut to it)
+    :return: array of positions, size of them for every range
+    """
+    bounds = np.asarray(bounds, float).reshape(-1, 2)
+    start = bounds[:, :1]
+    length = np.minimum(bounds[:, 1:], limit) - start
+    positions = (np.arange(size) + 0.5) * (length / size) - 0.5
+    return (start + np.clip(positions, 0, length - 1)).astype(np.float32).reshape(-1)
+
+
+def cut_cells(img, rows, cols, size):
+    """
+    Cuts all cells of grid from image and resizes them, with one call of cv2.remap.
+    :param img: image
+    :param rows: (start, end) of every row of cells
+    :param cols: (start, end) of every column of cells
+    :param size: width and height of resized cells
+    :return: array of shape (number of cells, height, width), cells row by row
+    """
+    width, height = size
+    map_y = get_sample_positions(rows, height, img.shape[0])
+    map_x = get_sample_positions(cols, width, img.shape[1])
+    map_x, map_y = np.meshgrid(map_x, map_y)
+    cells = cv2.remap(img, map_x, map_y, cv2.INTER_LINEAR)
+    cells = cells.reshape((len(rows), height, len(cols), width) + img.shape[2:])
+    return np.ascontiguousarray(cells.swapaxes(1, 2)).reshape((-1, height, width) + img.shape[2:])
+
+
+def count_ink(samples, contrast=LINE_CONTRAST):
+    """
+    Counts pixels of every sample that are much darker than its background (median).
+    :param samples: array of gray samples (number of samples, height, width)
+    :param contrast: how much darker than background pixel of ink is
+    :return: array of counts
+    """
+    samples = samples.astype(np.int16)
+    background = np.median(samples.reshape(len(samples), -1), axis=1)
+    return (samples < background[:, None, None] - contrast).sum(axis=(1, 2))
+
+
+def get_centre_deviation(samples, border=3, radius=5):
+    """
+    Measures how much centre of every sample differs from empty fragment of grid predicted from its borders:
+    every row is as light as the lighter of its ends, every column as the lighter of its ends, and every pixel
+    as the darker of its row and column. So lines crossing the sample are predicted, things touching only one
+    side of it are not, and dot in the centre makes big difference.
+    :param samples: array of gray samples (number of samples, height, width)
+    :param border: width of borders of sample
+    :param radius: half of size of centre of sample
+    :return: array of mean absolute differences in centres of samples
+    """
+    samples = samples.astype(np.float32)
+    rows = np.maximum(samples[:, :, :border].mean(axis=2), samples[:, :, -border:].mean(axis=2))
+    cols = np.maximum(samples[:, :border, :].mean(axis=1), samples[:, -border:, :].mean(axis=1))
+    x, y = samples.shape[1] // 2, samples.shape[2] // 2
+    empty = np.minimum(rows[:, x - radius: x + radius, None], cols[:, None, y - radius: y + radius])
+    return np.abs(samples[:, x - radius: x + radius, y - radius: y + radius] - empty).mean(axis=(1, 2))
+
+
+def get_blobs(img_rgb, rho_horizontal, rho_vertical, contrast=LINE_CONTRAST):
+    """
+    Finds dark blobs (dots, parts of digits, etc.) lying on grid, in one pass over whole image.
+    Lines of grid are removed from dark pixels (narrow bands along detected lines and runs longer than most
+    of cell), while blobs thicker than lines (filled dots) are kept whole; gaps left by removed lines in thin
+    blobs (rings) are then closed. Pixel is dark if its darkest channel is much darker than median,
+    so coloured dots are found as well.
+    :param img_rgb: colour image
+    :param rho_horizontal: positions of horizontal lines
+    :param rho_vertical: positions of vertical lines
+    :param contrast: how much darker than background pixel of blob is
+    :return: array of bounding boxes of blobs: x, y (first column and row), width, height
+    """
+    cell = min(np.median(np.diff(rho_horizontal)), np.median(np.diff(rho_vertical)))
+    low = cv2.min(cv2.min(img_rgb[:, :, 0], img_rgb[:, :, 1]), img_rgb[:, :, 2])
+    ink = (low < np.median(low) - contrast).astype(np.uint8)
+    run = int(0.8 * cell) | 1
+    lines = (cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((1, run), np.uint8)) |
+             cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((run, 1), np.uint8)))
+    gap = max(3, int(0.12 * cell) | 1)
+    for rho in rho_horizontal:
+        lines[max(0, rho - gap // 2): rho + gap // 2 + 1, :] = 1
+    for rho in rho_vertical:
+        lines[:, max(0, rho - gap // 2): rho + gap // 2 + 1] = 1
+    disc = max(3, int(0.3 * cell) | 1)
+    solid = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (disc, disc)))
+    # thick frames are not blobs
+    solid &= ~(cv2.morphologyEx(solid, cv2.MORPH_OPEN, np.ones((1, run), np.uint8)) |
+               cv2.morphologyEx(solid, cv2.MORPH_OPEN, np.ones((run, 1), np.uint8)))
+    blobs = cv2.morphologyEx((ink & ~lines) | solid, cv2.MORPH_CLOSE,
+                             cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (gap + 2, gap + 2)))
+    return cv2.connectedComponentsWithStats(blobs, connectivity=8)[2][1:, :4]
+
+
+def read_image(filename, reduction=1, color=False):
+    """
+    Reads image, reduced while decoding (JPEG images are decoded directly in smaller size).
+    :param filename: name of file with image, bytes of file already read or image already decoded (e.g. part of page)
+    :param reduction: 1, 2, 4 or 8
+    :param color: True for colour image, False for gray image
+    :return: image
+    """
+    if isinstance(filename, np.ndarray):
+        img = filename
+        if img.ndim == 3 and not color:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        elif img.ndim == 2 and color:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        if reduction > 1:
+            size = (-(-img.shape[1] // reduction), -(-img.shape[0] // reduction))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    elif isinstance(filename, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(filename, np.uint8), REDUCED[reduction][int(color)])
+    else:
+        img = cv2.imread(str(filename), REDUCED[reduction][int(color)])
+    if img is None:
+        raise IOError('File not found')
+    return img
+
+
+def find_grids(img_gray, min_area=GRID_AREA, fill=GRID_FILL, contrast=LINE_CONTRAST):
+    """
+    Finds grids of puzzles on page with many of them: large rectangular outlines of connected dark pixels
+    (lines of grid are connected, so outline of grid is its frame; text and pictures give small or irregular ones).
+    :param img_gray: gray image of page
+    :param min_area: smallest area of grid, relative to area of page
+    :param fill: smallest part of bounding box enclosed by outline
+    :param contrast: how much darker than median of page pixel of line is
+    :return: list of regions x, y, width, height, from top to bottom (in rows of grids), from left to right
+    """
+    ink = (img_gray < np.median(img_gray) - contrast).astype(np.uint8)
+    # small gaps of lines (e.g. in scans) do not break outline
+    ink = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+    contours = cv2.findContours(ink, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    grids = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h >= min_area * ink.size and cv2.contourArea(contour) >= fill * w * h:
+            grids.append((x, y, w, h))
+    # grids overlapping in rows of page are in one row
+    grids.sort(key=lambda g: g[1])
+    rows = []
+    for grid in grids:
+        if rows and grid[1] < min(g[1] + g[3] / 2.0 for g in rows[-1]):
+            rows[-1].append(grid)
+        else:
+            rows.append([grid])
+    return [grid for row in rows for grid in sorted(row)]
+
+
+def crop_grid(img, region, margin=0.05):
+    """
+    Cuts grid from page, with margin around it (lines of grid should not touch border of image).
+    :param img: image of page
+    :param region: region of grid: x, y, width, height
+    :param margin: width of margin, relative to size of grid
+    :return: image of grid
+    """
+    x, y, w, h = region
+    a, b = int(margin * h) + 2, int(margin * w) + 2
+    return np.ascontiguousarray(img[max(y - a, 0): y + h + a, max(x - b, 0): x + w + b])
+
+
+def scale_lines(rhos, factor):
+    """Moves positions of lines from image reduced factor times to bigger image (to centres of reduced pixels)."""
+    return [int(rho * factor + (factor - 1) / 2.0) for rho in rhos]
+
+
+def refine_lines(profile, rhos, radius):
+    """
+    Moves lines to peaks of profile (see get_profile) closer than radius.
+    :param profile: profile of image
+    :param rhos: approximate positions of lines
+    :param radius: largest error of positions
+    :return: positions of lines
+    """
+    refined = []
+    for rho in rhos:
+        start = max(rho - radius, 0)
+        window = profile[start: rho + radius + 1]
+        if window.max() > LINE_FILL:
+            rho = start + int(np.flatnonzero(window == window.max()).mean() + 0.5)
+        refined.append(rho)
+    return refined
+
+
+def load_grid_image(filename, sensitivity=100, max_size=None):
+    """
+    Reads image of puzzle and detects lines of its grid.
+    If max_size is given, lines are detected on image reduced while decoding so that it is not bigger than max_size.
+    Cells are then cut from image decoded with the biggest reduction that keeps them at least CELL_SIZE pixels
+    (like in images the classifiers were trained with), so time and memory do not grow with resolution.
+    :param filename: name of file with image, bytes of file already read or image already decoded
+    :param sensitivity: Hough transformation parameter (for not reduced image)
+    :param max_size: largest size of image for which lines are detected, None - image is never reduced
+    :return: colour image, gray image, positions of horizontal and vertical lines in them
+    """
+    detection = 1
+    if max_size is not None:
+        side = 8 * max(read_image(filename, 8).shape)
+        while detection < 8 and side > max_size * detection:
+            detection *= 2
+    if detection == 1:
+        img_rgb = read_image(filename, color=True)
+        img_gray = cv2.cvtColor(img_rgb, cv2.COLOR_BGR2GRAY)
+    else:
+        img_rgb, img_gray = None, read_image(filename, detection)
+    rho_horizontal, rho_vertical = get_line_positions(img_gray, int(sensitivity / detection))
+    if max_size is None:
+        return img_rgb, img_gray, rho_horizontal, rho_vertical
+
+    cell = detection * min(np.median(np.diff(rho_horizontal)), np.median(np.diff(rho_vertical)))
+    reduction = 1
+    while reduction < 8 and cell >= 2 * reduction * CELL_SIZE:
+        reduction *= 2
+    if reduction != detection:
+        img_rgb = read_image(filename, reduction, color=True)
+        img_gray = cv2.cvtColor(img_rgb, cv2.COLOR_BGR2GRAY)
+        if reduction > detection:
+            rho_horizontal, rho_vertical = get_line_positions(img_gray, int(sensitivity / reduction))
+        else:
+            factor = detection // reduction
+            rho_horizontal = refine_lines(get_profile(img_gray, 0), scale_lines(rho_horizontal, factor), factor)
+            rho_vertical = refine_lines(get_profile(img_gray, 1), scale_lines(rho_vertical, factor), factor)
+    elif img_rgb is None:
+        img_rgb = read_image(filename, reduction, color=True)
+        img_gray = cv2.cvtColor(img_rgb, cv2.COLOR_BGR2GRAY)
+    return img_rgb, img_gray, rho_horizontal, rho_vertical
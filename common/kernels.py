@@ -0,0 +1,173 @@
+"""Kernels of the hottest board operations.
+
+Every kernel has a NumPy implementation and, if numba is installed, a compiled one giving identical results.
+(Flood fill reaches small regions only, so its NumPy version walks the board with a stack instead of
+expanding whole board at every step.)
+Backend is chosen at import: numba if it can be imported, NumPy otherwise. It can be forced with
+environment variable PUZZLE_KERNELS set to 'numba' or 'numpy'. Compiled kernels are cached on disk
+(numba's cache=True), so they are compiled only at first use, not at import and not at every start.
+"""
+
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+BACKEND = os.environ.get('PUZZLE_KERNELS', 'numba' if numba is not None else 'numpy').lower()
+if BACKEND not in ('numba', 'numpy'):
+    raise ValueError('PUZZLE_KERNELS should be numba or numpy, not {}'.format(BACKEND))
+if BACKEND == 'numba' and numba is None:
+    raise ImportError('PUZZLE_KERNELS=numba, but numba is not installed')
+
+
+def hood_counts_numpy(board, value):
+    """
+    Counts fields equal to value in 3x3 neighbourhood (with field itself) of every field.
+    :param board: board
+    :param value: value to be counted
+    :return: array of counts, of shape of board
+    """
+    h, w = board.shape
+    hits = np.zeros((h + 2, w + 2), np.int32)
+    hits[1: h + 1, 1: w + 1] = board == value
+    counts = np.zeros((h, w), np.int32)
+    for a in range(3):
+        for b in range(3):
+            counts += hits[a: a + h, b: b + w]
+    return counts
+
+
+def flood_numpy(board, seeds, stride):
+    """
+    Finds squares connected with seeds, not separated by walls. Board has to be flat padded board
+    (squares every 2 fields, walls between them) with walls all around squares which can be reached.
+    :param board: flat board, walls have value 1
+    :param seeds: flat indices of starting squares
+    :param stride: length of row of board
+    :return: sorted flat indices of reached squares
+    """
+    reach = set(int(s) for s in seeds)
+    stack = list(reach)
+    offsets = (-stride, stride, -1, 1)
+    while stack:
+        k = stack.pop()
+        for o in offsets:
+            if board.item(k + o) != 1 and k + 2 * o not in reach:
+                reach.add(k + 2 * o)
+                stack.append(k + 2 * o)
+    return np.array(sorted(reach), np.int64)
+
+
+def wall_counts_numpy(squares):
+    """
+    Counts squares of set next to every wall of board: walls with 1 are boundary of set, with 2 are inside of it.
+    :param squares: boolean array, one field for every square of board
+    :return: array of counts, of shape of board in doubled coordinates (squares and crossings have 0)
+    """
+    h, w = squares.shape
+    squares = squares.astype(np.int8)
+    counts = np.zeros((2 * h - 1, 2 * w - 1), np.int8)
+    counts[::2, 1::2] = squares[:, :-1] + squares[:, 1:]
+    counts[1::2, ::2] = squares[:-1, :] + squares[1:, :]
+    return counts
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def hood_counts_numba(board, value):
+        """Compiled hood_counts."""
+        h, w = board.shape
+        counts = np.zeros((h, w), np.int32)
+        for i in range(h):
+            for j in range(w):
+                if board[i, j] == value:
+                    for a in range(max(0, i - 1), min(i + 2, h)):
+                        for b in range(max(0, j - 1), min(j + 2, w)):
+                            counts[a, b] += 1
+        return counts
+
+    @numba.njit(cache=True)
+    def flood_numba(board, seeds, stride, reach, queue):
+        """
+        Compiled flood. Buffers reach (False for every field) and queue are reused between calls (see flood_buffers),
+        only fields of reached squares are written and reach is cleared again before return.
+        """
+        n = 0
+        for s in seeds:
+            if not reach[s]:
+                reach[s] = True
+                queue[n] = s
+                n += 1
+        offsets = (-stride, stride, -1, 1)
+        head = 0
+        while head < n:
+            k = queue[head]
+            head += 1
+            for o in offsets:
+                if board[k + o] != 1 and not reach[k + 2 * o]:
+                    reach[k + 2 * o] = True
+                    queue[n] = k + 2 * o
+                    n += 1
+        reached = np.sort(queue[:n])
+        for k in reached:
+            reach[k] = False
+        return reached
+
+    @numba.njit(cache=True)
+    def wall_counts_numba(squares):
+        """Compiled wall_counts."""
+        h, w = squares.shape
+        counts = np.zeros((2 * h - 1, 2 * w - 1), np.int8)
+        for r in range(h):
+            for c in range(w):
+                if squares[r, c]:
+                    if c > 0:
+                        counts[2 * r, 2 * c - 1] += 1
+                    if c < w - 1:
+                        counts[2 * r, 2 * c + 1] += 1
+                    if r > 0:
+                        counts[2 * r - 1, 2 * c] += 1
+                    if r < h - 1:
+                        counts[2 * r + 1, 2 * c] += 1
+        return counts
+
+
+def hood_counts(board, value):
+    """Counts fields equal to value in 3x3 neighbourhood of every field, see hood_counts_numpy."""
+    if BACKEND == 'numba':
+        return hood_counts_numba(board, value)
+    return hood_counts_numpy(board, value)
+
+
+def flood_buffers(size):
+    """
+    Gives buffers for compiled flood of boards with given number of fields, so they are not allocated at every call.
+    :param size: number of fields of flat board
+    :return: visited fields (all False) and queue of squares
+    """
+    return np.zeros(size, np.bool_), np.empty(size, np.int64)
+
+
+def flood(board, seeds, stride, buffers=None):
+    """
+    Finds squares connected with seeds, not separated by walls, see flood_numpy.
+    :param buffers: buffers from flood_buffers(board.size), used only by compiled flood; new ones if None
+    """
+    if BACKEND == 'numba':
+        reach, queue = buffers if buffers is not None else flood_buffers(board.size)
+        return flood_numba(board, np.asarray(seeds, np.int64), stride, reach, queue)
+    return flood_numpy(board, seeds, stride)
+
+
+def wall_counts(squares):
+    """Counts squares of set next to every wall of board, see wall_counts_numpy."""
+    if BACKEND == 'numba':
+        return wall_counts_numba(np.asarray(squares, np.bool_))
+    return wall_counts_numpy(squares)
@@ -1,8 +1,11 @@
-"""Miscellaneous common functions."""
+"""Miscellaneous common functions.
+Relations between points of board are kept in common.geometry, functions here return them as lists."""
 
 import math
 import numpy as np
 
+from common.geometry import frame_at, block_at, wall_at, next_to_at, adjacent_at
+
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
 
@@ -23,28 +26,12 @@ def get_unique(a):
 
 def define_frame(i, j):
     """Defines frame of closest possible walls."""
-    if i % 2 == 0 and j % 2 == 0:
-        return [[i - 1, j], [i + 1, j], [i, j - 1], [i, j + 1]]
-    elif i % 2 == 0 and j % 2 > 0:
-        return [[i, j - 2], [i, j + 2], [i - 1, j - 1], [i - 1, j + 1], [i + 1, j - 1], [i + 1, j + 1]]
-    elif i % 2 > 0 and j % 2 == 0:
-        return [[i - 2, j], [i + 2, j], [i - 1, j - 1], [i - 1, j + 1], [i + 1, j - 1], [i + 1, j + 1]]
-    elif i % 2 > 0 and j % 2 > 0:
-        return [[i - 2, j - 1], [i - 2, j + 1], [i - 1, j - 2], [i - 1, j + 2],
-                [i + 1, j - 2], [i + 1, j + 2], [i + 2, j - 1], [i + 2, j + 1]]
+    return [list(p) for p in frame_at(i, j)]
 
 
 def define_block(i, j):
     """Defines squares in block."""
-    if i % 2 == 0 and j % 2 == 0:
-        return [[i, j]]
-    elif i % 2 == 0 and j % 2 > 0:
-        return [[i, j - 1], [i, j + 1]]
-    elif i % 2 > 0 and j % 2 == 0:
-        return [[i - 1, j], [i + 1, j]]
-    elif i % 2 > 0 and j % 2 > 0:
-        return [[i - 1, j - 1], [i - 1, j + 1],
-                [i + 1, j - 1], [i + 1, j + 1]]
+    return [list(p) for p in block_at(i, j)]
 
 
 def symmetric_point(x, y, a, b):
@@ -54,19 +41,14 @@ def symmetric_point(x, y, a, b):
 
 def wall_between(x, y, i, j):
     """Finds location of the wall between two squares."""
-    if x == i:
-        return [x, int((y + j) / 2.0)]
-    elif y == j:
-        return [int((x + i) / 2.0), y]
+    wall = wall_at(x, y, i, j)
+    if wall is not None:
+        return list(wall)
 
 
 def squares_next_to(x, y):
     """Returns 2 squares next to a wall."""
-    if x % 2 == 0:
-        return [[x, y - 1], [x, y + 1]]
-    elif y % 2 == 0:
-        return [[x - 1, y], [x + 1, y]]
-    return []
+    return [list(p) for p in next_to_at(x, y)]
 
 
 def count(array, el):
@@ -85,14 +67,14 @@ def point_dist(x, y, i, j):
 
 def adjacent_squares(x, y):
     """Returns list of squares adjacent to given."""
-    return [[x - 2, y], [x + 2, y], [x, y - 2], [x, y + 2]]
+    return [list(p) for p in adjacent_at(x, y)]
 
 
 def closest_closed(i, j, array):
     """Checks if closest block to dot are filled."""
-    block = define_block(i, j)
+    block = block_at(i, j)
     closed = True
     for b in block:
-        if array[b[0], b[1]] < 1:
+        if array.item(b[0], b[1]) < 1:
             closed = False
     return closed
@@ -0,0 +1,128 @@
+"""Tests of common.cache, with readers of both puzzles."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from classifiers import classifier
+from common.cache import PuzzleCache
+from common_tests.images import grid_image
+from fillapix.imageops.reader import FillAPixReader
+from symapix.imageops.reader import SymAPixReader
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+
+class TestCache(unittest.TestCase):
+    """Tests for cache of puzzles read from images"""
+
+    def setUp(self):
+        img = grid_image([((110, 70), (0, 0, 0)), ((190, 130), (0, 0, 255))])
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'grid.png')
+        cv2.imwrite(self.filename, img)
+        self.cache = PuzzleCache(os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hit(self):
+        """Puzzle found in cache is the same as read from image, image is not read."""
+        reader = SymAPixReader(self.filename, 'template', cache=self.cache)
+        puzzle = reader.create_puzzle()
+        self.assertIsNotNone(reader.img_rgb)
+        cached = SymAPixReader(self.filename, 'template', cache=self.cache)
+        self.assertIsNone(cached.img_rgb)
+        self.assertEqual(cached.get_lines(), reader.get_lines())
+        again = cached.create_puzzle()
+        assert_array_equal(again.get_board(), puzzle.get_board())
+        assert_array_equal(again.get_colors(), puzzle.get_colors())
+        assert_array_equal(again.confidence, puzzle.confidence)
+        self.assertEqual(sorted(again.dot_colors), sorted(puzzle.dot_colors))
+
+    def test_changed_image(self):
+        """Changed image is read again, as new entry."""
+        SymAPixReader(self.filename, 'template', cache=self.cache).create_puzzle()
+        img = cv2.imread(self.filename)
+        cv2.circle(img, (150, 190), 12, (0, 0, 0), -1)
+        cv2.imwrite(self.filename, img)
+        reader = SymAPixReader(self.filename, 'template', cache=self.cache)
+        self.assertIsNotNone(reader.img_rgb)
+        self.assertGreater(reader.create_puzzle().get_board()[8, 6], 0)
+        self.assertEqual(len(self.cache.entries()), 2)
+
+    def test_changed_classifier(self):
+        """Changed classifier makes entries of puzzles read with it stale, entries of other puzzles are found."""
+        SymAPixReader(self.filename, 'template', cache=self.cache).create_puzzle()
+        directory = os.path.join(self.directory.name, 'classifiers')
+        os.mkdir(directory)
+        for name in classifier.TEMPLATES.values():
+            shutil.copy(os.path.join(classifier.DIRECTORY, name), directory)
+
+        def change(name):
+            with open(os.path.join(directory, classifier.TEMPLATES[name]), 'ab') as f:
+                f.write(b'changed')
+            classifier.versions.clear()
+
+        with mock.patch.object(classifier, 'DIRECTORY', directory), mock.patch.dict(classifier.versions, clear=True):
+            fill = FillAPixReader(self.filename, 'template', cache=self.cache).key
+            self.assertIsNotNone(SymAPixReader(self.filename, 'template', cache=self.cache).cached)
+            change('digit')
+            self.assertIsNotNone(SymAPixReader(self.filename, 'template', cache=self.cache).cached)
+            self.assertNotEqual(FillAPixReader(self.filename, 'template', cache=self.cache).key, fill)
+            fill = FillAPixReader(self.filename, 'template', cache=self.cache).key
+            change('square')
+            self.assertIsNone(SymAPixReader(self.filename, 'template', cache=self.cache).cached)
+            self.assertEqual(FillAPixReader(self.filename, 'template', cache=self.cache).key, fill)
+
+    def test_fill_hit(self):
+        """Fill-a-pix puzzle found in cache is the same as read, image is read only when it is cut."""
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fill-a-pix_images', 'image1.jpg')
+        reader = FillAPixReader(filename, 'template', cache=self.cache)
+        puzzle = reader.create_puzzle()
+        cached = FillAPixReader(filename, 'template', cache=self.cache)
+        self.assertIsNone(cached.img_gray)
+        again = cached.create_puzzle()
+        assert_array_equal(again.get_board(), puzzle.get_board())
+        assert_array_equal(again.confidence, puzzle.confidence)
+        assert_array_equal(cached.cut_image(2, 3), reader.cut_image(2, 3))
+
+    def test_evict(self):
+        """Entries not used for the longest time are removed first."""
+        cache = PuzzleCache(self.cache.directory, max_entries=2)
+        for k in range(3):
+            cache.put(str(k), board=np.zeros(3))
+            os.utime(cache.path(str(k)), (k, k))
+        self.assertIsNotNone(cache.get('1'))
+        cache.put('3', board=np.zeros(3))
+        self.assertEqual(sorted(name for name, _, _ in cache.entries()), ['1.npz', '3.npz'])
+        cache.clear()
+        self.assertEqual(cache.entries(), [])
+
+    def test_hit_without_dots(self):
+        """Puzzle read without finding dots is read from image also when it is in cache."""
+        puzzle = SymAPixReader(self.filename, 'template').create_puzzle(find_dots=False)
+        SymAPixReader(self.filename, 'template', cache=self.cache).create_puzzle()
+        cached = SymAPixReader(self.filename, 'template', cache=self.cache)
+        again = cached.create_puzzle(find_dots=False)
+        self.assertIsNotNone(cached.img_rgb)
+        assert_array_equal(again.get_board(), puzzle.get_board())
+        assert_array_equal(again.get_colors(), puzzle.get_colors())
+
+    def test_hit_cut_image(self):
+        """Fragments of image can be cut from reader which found puzzle in cache."""
+        reader = SymAPixReader(self.filename, 'template', cache=self.cache)
+        reader.create_puzzle()
+        cached = SymAPixReader(self.filename, 'template', cache=self.cache)
+        assert_array_equal(cached.cut_image(1, 1, 0), reader.cut_image(1, 1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+"""Images of puzzles drawn for tests (sym-a-pix_tests and fill-a-pix_tests cannot be imported, so helpers
+shared by tests of both puzzles are here, with tests of common code)."""
+
+import cv2
+import numpy as np
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+SIZE = 6        # number of squares in row and column of grid
+CELL = 40       # width of square in pixels
+OFFSET = 10     # position of first line of grid in pixels
+RADIUS = 12     # radius of dots in pixels
+
+
+def grid_image(dots=()):
+    """
+    Draws white image with grid of sym-a-pix puzzle: lines 2 pixels wide, from 10 to 250 pixels.
+    :param dots: filled dots, as centres (x, y in pixels) and bgr colors
+    :return: bgr image, 260 x 260 pixels
+    """
+    img = np.full((2 * OFFSET + SIZE * CELL,) * 2 + (3,), 255, np.uint8)
+    end = OFFSET + SIZE * CELL
+    for k in range(SIZE + 1):
+        cv2.line(img, (OFFSET, OFFSET + CELL * k), (end, OFFSET + CELL * k), (0, 0, 0), 2)
+        cv2.line(img, (OFFSET + CELL * k, OFFSET), (OFFSET + CELL * k, end), (0, 0, 0), 2)
+    for centre, color in dots:
+        cv2.circle(img, centre, RADIUS, color, -1)
+    return img
@@ -0,0 +1,181 @@
+"""Tests of pipeline, which reads and solves puzzles of both kinds."""
+
+import io
+import json
+import os
+import queue
+import tempfile
+import time
+import unittest
+import warnings
+from unittest import mock
+
+import cv2
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from classifiers import classifier
+from common.imageops import find_grids
+from common_tests.images import grid_image
+from pipeline import Job, Pipeline, Stage, guess_kind, read_page, read_paths
+from symapix.imageops.reader import SymAPixReader
+from symapix.solver.solver import SymAPixSolver
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+
+class TestPipeline(unittest.TestCase):
+    """Tests for reading and solving many images in stages"""
+
+    def setUp(self):
+        dots = [((110, 70), (0, 0, 0)), ((190, 130), (0, 0, 255))]
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.directory.name, name) for name in ['sym_1.png', 'sym_2.png', 'sym_3.png']]
+        cv2.imwrite(self.paths[0], grid_image(dots[:1]))
+        cv2.imwrite(self.paths[1], grid_image(dots))
+        with open(self.paths[2], 'w') as f:
+            f.write('not an image')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_guess_kind(self):
+        """Kind of puzzle is told by the closest part of path which tells it."""
+        self.assertEqual(guess_kind(os.path.join('fill-a-pix_images', 'image1.jpg')), 'fill-a-pix')
+        self.assertEqual(guess_kind(os.path.join('fill', 'sym_1.jpg')), 'sym-a-pix')
+        self.assertIsNone(guess_kind(os.path.join('scans', 'image1.jpg')))
+        self.assertEqual(guess_kind('image1.jpg', 'sym-a-pix'), 'sym-a-pix')
+
+    def test_run(self):
+        """Every image gets result (the same as read and solved alone) or error, errors are counted by stages."""
+        output = io.StringIO()
+        pipeline = Pipeline(output, 'template', classifiers=0, solvers=0, batch_size=2, queue_size=1)
+        self.assertEqual(pipeline.run(self.paths + ['image.png']), 4)
+        results = dict((r['path'], r) for r in map(json.loads, output.getvalue().splitlines()))
+        self.assertEqual(sorted(results), sorted(self.paths + ['image.png']))
+        for path in self.paths[:2]:
+            solver = SymAPixSolver(SymAPixReader(path, 'template').create_puzzle())
+            solver.solve()
+            self.assertIsNone(results[path]['error'])
+            assert_array_equal(results[path]['puzzle'], solver.puzzle)
+            assert_array_equal(results[path]['solution'], solver.solution)
+            self.assertEqual(results[path]['solved'], solver.is_solved())
+        self.assertIn('OSError', results[self.paths[2]]['error'])
+        self.assertIn('kind of puzzle', results['image.png']['error'])
+        self.assertEqual([(stage.name, stage.count) for stage in pipeline.stages],
+                         [('read', 4), ('grid', 4), ('classify', 4), ('solve', 4), ('write', 4)])
+        self.assertEqual([stage.errors for stage in pipeline.stages], [1, 1, 0, 0, 0])
+
+    def test_pools(self):
+        """Classifying and solving in processes gives the same results as in one thread."""
+        results = []
+        for workers in [0, 1]:
+            output = io.StringIO()
+            Pipeline(output, 'template', classifiers=workers, solvers=workers).run(self.paths)
+            results.append(dict((r['path'], r) for r in map(json.loads, output.getvalue().splitlines())))
+        for path in self.paths:
+            for key in ['error', 'puzzle', 'solution', 'solved']:
+                self.assertEqual(results[1][path].get(key), results[0][path].get(key))
+
+    def test_batch_error(self):
+        """Only jobs which fail alone get error of batch."""
+        def work(jobs):
+            if any(job.path == 'bad' for job in jobs):
+                raise ValueError('bad image')
+            for job in jobs:
+                job.solved = True
+
+        stage = Stage('test', work, batch=4)
+        stage.output = queue.Queue()
+        jobs = [Job(path, 'sym-a-pix') for path in ['a', 'bad', 'b']]
+        stage.process(jobs)
+        self.assertEqual(sorted(stage.output.get_nowait().path for _ in jobs), ['a', 'b', 'bad'])
+        self.assertEqual([job.error for job in jobs], [None, 'ValueError: bad image', None])
+        self.assertEqual([job.solved for job in jobs], [True, False, True])
+        self.assertEqual(stage.errors, 1)
+
+    def test_missing_classifiers(self):
+        """SVM classifiers which cannot be loaded give errors of images, two-pass backend reads them without SVM."""
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fill-a-pix_images', 'image1.jpg')
+        load = classifier.load
+
+        def load_without_svm(name, backend='svm'):
+            if backend == 'svm':
+                raise ImportError('No module named sklearn')
+            return load(name, backend)
+
+        results = {}
+        with mock.patch.object(classifier, 'load', load_without_svm), mock.patch.dict(classifier.models, clear=True), \
+                warnings.catch_warnings(record=True):
+            for backend in ['svm', 'two-pass']:
+                output = io.StringIO()
+                self.assertEqual(Pipeline(output, backend, classifiers=1, solvers=0).run([path]), 1)
+                results[backend] = json.loads(output.getvalue())
+        self.assertIn('ImportError', results['svm']['error'])
+        self.assertIsNone(results['two-pass']['error'])
+        self.assertTrue(results['two-pass']['solved'])
+
+    def test_stream(self):
+        """Images are processed while next paths are still coming."""
+        output = io.StringIO()
+        written = []
+
+        def stream():
+            yield self.paths[0] + '\n'
+            yield '\n'
+            for _ in range(600):
+                if output.getvalue():
+                    break
+                time.sleep(0.05)
+            written.append(output.getvalue().count('\n'))
+            yield self.paths[1] + '\n'
+
+        pipeline = Pipeline(output, 'template', classifiers=0, solvers=0)
+        self.assertEqual(pipeline.run(read_paths(stream())), 2)
+        self.assertEqual(written, [1])
+
+
+class TestPages(unittest.TestCase):
+    """Tests for reading pages with many puzzles"""
+
+    def setUp(self):
+        self.grids = [grid_image([(dot, (0, 0, 255)) for dot in dots])
+                      for dots in [[(110, 70)], [(190, 130), (70, 170)]]]
+        self.page = np.full((700, 600, 3), 255, np.uint8)
+        self.page[300: 560, 20: 280] = self.grids[1]
+        self.page[20: 280, 320: 580] = self.grids[0]
+        cv2.putText(self.page, 'Sym-a-pix 12', (40, 650), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'sym_page.png')
+        cv2.imwrite(self.filename, self.page)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_find_grids(self):
+        """Grids are found on page, text is not a grid."""
+        regions = find_grids(cv2.cvtColor(self.page, cv2.COLOR_BGR2GRAY))
+        # lines 2 pixels wide, from 10 to 250 in grids
+        self.assertEqual(regions, [(329, 29, 243, 243), (29, 309, 243, 243)])
+
+    def test_read_page(self):
+        """Every grid of page is read as if it was image alone."""
+        puzzles = read_page(self.filename, backend='template', workers=2)
+        self.assertEqual([puzzle.region[:2] for puzzle in puzzles], [(329, 29), (29, 309)])
+        for puzzle, grid in zip(puzzles, self.grids):
+            alone = SymAPixReader(grid, 'template').create_puzzle()
+            assert_array_equal(puzzle.get_board(), alone.get_board())
+        self.assertEqual(int((puzzles[1].get_board() > 0).sum()), 2)
+
+    def test_pipeline(self):
+        """Every grid of page gets its own result, with its region on page."""
+        output = io.StringIO()
+        Pipeline(output, 'template', classifiers=0, solvers=0, pages=True).run([self.filename])
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(sorted(r['region'][:2] for r in results), [[29, 309], [329, 29]])
+        self.assertFalse(any(r['error'] for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from classifiers import classifier
+from classifiers.template import TemplateClassifier
+from fillapix.puzzle.container import Container
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+
+class TestPrefilter(unittest.TestCase):
+    """Tests for finding empty fields without classifiers"""
+
+    def test_empty_fields(self):
+        """Fields without ink are empty and not classified."""
+        puzzle = Container((2, 1), backend='template')
+        scores = puzzle.insert_samples(np.array([np.full((15, 15), 240, np.uint8)] * 2))
+        assert_array_equal(puzzle.get_board(), [[100], [100]])
+        self.assertEqual(scores.shape[0], 2)
+        self.assertEqual(puzzle.get_doubtful(), [])
+
+    def test_doubtful_fields(self):
+        """Fields classifier is not sure about are returned."""
+        puzzle = Container((1, 2), backend='template')
+        sample = classifier.load('digit', 'template').templates[0].reshape(15, 15)
+        puzzle.insert_samples(np.array([sample, (sample.astype(int) + 250) // 2]).astype(np.uint8), prefilter=False)
+        self.assertEqual(puzzle.confidence.shape, (1, 2))
+        self.assertEqual(puzzle.get_doubtful(limit=puzzle.confidence.max()), [(0, 1)])
+
+
+class TestTemplates(unittest.TestCase):
+    """Tests for template classifier of digits (template backend)"""
+
+    def test_bundled(self):
+        """Bundled templates are loaded without sklearn."""
+        self.assertIsInstance(classifier.load('digit', 'template'), TemplateClassifier)
+
+    def test_container(self):
+        """Container with template backend gives every template its own number."""
+        model = classifier.load('digit', 'template')
+        puzzle = Container((1, len(model.templates)), backend='template')
+        puzzle.insert_samples(model.templates.reshape(-1, 15, 15).astype(np.uint8), prefilter=False)
+        assert_array_equal(puzzle.get_board()[0], np.asarray(model.classes_)[model.labels])
+
+    def test_two_pass(self):
+        """Samples template classifier is sure about are not classified again."""
+        samples = np.array([classifier.load('digit', 'template').templates[0]] * 2)
+        loaded = set(classifier.models)
+        model = classifier.load('digit', 'two-pass')
+        labels, scores, confidence = model.classify(samples)
+        assert_array_equal(labels, classifier.classify(classifier.load('digit', 'template'), samples)[0])
+        self.assertTrue((confidence >= 1).all())
+        self.assertEqual(set(classifier.models) - loaded, {('digit', 'two-pass')} - loaded)
+
+    def test_two_pass_without_svm(self):
+        """Samples template classifier is not sure about keep its labels if SVM classifier cannot be loaded."""
+        template = classifier.load('digit', 'template')
+        sample = template.templates[0].reshape(15, 15)
+        samples = np.array([sample, (sample.astype(int) + 250) // 2]).astype(np.uint8)
+        load = classifier.load
+
+        def load_without_svm(name, backend='svm'):
+            if backend == 'svm':
+                raise ImportError('No module named sklearn')
+            return load(name, backend)
+
+        with mock.patch.object(classifier, 'load', load_without_svm), mock.patch.dict(classifier.models, clear=True), \
+                warnings.catch_warnings(record=True):
+            puzzle = Container((1, 2), backend='two-pass')
+            puzzle.insert_samples(samples, prefilter=False)
+        labels, scores = classifier.classify(template, samples.reshape(2, -1))
+        assert_array_equal(puzzle.get_board()[0], labels)
+        assert_array_equal(puzzle.confidence[0], classifier.confidence(template, labels, scores))
+        self.assertEqual(puzzle.get_doubtful(), [(0, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from classifiers import classifier
+from fillapix.imageops.reader import FillAPixReader
+from fillapix.puzzle.container import Container
+from fillapix.solver.solver import FillAPixSolver
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+IMAGES = os.path.join(TESTS, '..', 'fill-a-pix_images')
+
+
+def svm_available():
+    """Checks if SVM classifiers can be loaded (they need sklearn)."""
+    try:
+        classifier.load('digit', 'svm')
+    except Exception:
+        return False
+    return True
+
+
+class TestBundledImages(unittest.TestCase):
+    """Tests for reading bundled images: boards are the same as read by the first version of reader
+    (bundled_boards.npz), and puzzles can be solved"""
+
+    def setUp(self):
+        self.boards = np.load(os.path.join(TESTS, 'bundled_boards.npz'))
+
+    def check(self, backend):
+        for name in sorted(self.boards.files):
+            puzzle = FillAPixReader(os.path.join(IMAGES, name + '.jpg'), backend).create_puzzle()
+            assert_array_equal(puzzle.get_board(), self.boards[name], err_msg=name)
+
+    def test_solvable(self):
+        """Boards of all bundled images (so also boards read correctly) can be solved."""
+        for name in sorted(self.boards.files):
+            solver = FillAPixSolver(None)
+            solver.set_puzzle(self.boards[name])
+            solver.solve()
+            self.assertTrue(solver.is_solved(), name)
+
+    def test_template(self):
+        """Template classifiers read the same boards as the first version of reader."""
+        self.check('template')
+
+    @unittest.skipUnless(svm_available(), 'SVM classifiers cannot be loaded')
+    def test_svm(self):
+        """SVM classifiers read the same boards as the first version of reader."""
+        self.check('svm')
+
+    def test_two_pass(self):
+        """Default backend reads boards also when SVM classifiers cannot be loaded."""
+        self.check('two-pass')
+
+    @unittest.skipUnless(svm_available(), 'SVM classifiers cannot be loaded')
+    def test_backends_agree(self):
+        """Template and SVM classifiers give the same number in every field (empty fields are not skipped)."""
+        for name in sorted(self.boards.files):
+            reader = FillAPixReader(os.path.join(IMAGES, name + '.jpg'), 'template')
+            samples = reader.cut_samples()
+            boards = []
+            for backend in ['template', 'svm']:
+                puzzle = Container(self.boards[name].shape, backend=backend)
+                puzzle.insert_samples(samples, prefilter=False)
+                boards.append(puzzle.get_board())
+            assert_array_equal(boards[0], boards[1], err_msg=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
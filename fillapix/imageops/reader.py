@@ -2,10 +2,9 @@
 """ Fill-a-pix: Processing operation on images - reading puzzle from image.
 """
 
-import cv2
-
-from common.imageops import get_line_positions
-from fillapix.puzzle.container import Container
+from classifiers import classifier
+from common.imageops import cut_cells, load_grid_image
+from fillapix.puzzle.container import CUT_BOTTOM, SAMPLE_SIZE, Container
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
@@ -13,38 +12,87 @@ __email__ = 'ada.borowa@gmail.com'
 
 class FillAPixReader:
     """Reader for fill-a-pix puzzle."""
-    def __init__(self, filename):
+    def __init__(self, filename, backend='two-pass', max_size=1024, cache=None):
         """ Reads puzzle from picture.
-        :param filename: name of file with image of puzzle.
+        :param filename: name of file with image of puzzle (or bytes of file already read, or image already decoded).
+        :param backend: kind of classifier: svm, template (faster, NumPy only) or two-pass (see classifier)
+        :param max_size: bigger images are reduced (lines are detected on smaller image), None - never reduced
+        :param cache: PuzzleCache (see common.cache) with puzzles read earlier, None - puzzle is always read;
+        if image is found in it, image is read only if it is needed (see load_image)
         :return: None
         """
-        self.img_rgb = cv2.imread(str(filename), cv2.IMREAD_COLOR)
-        if self.img_rgb is None:
-            raise IOError('File not found')
-        self.img_gray = cv2.cvtColor(self.img_rgb, cv2.COLOR_BGR2GRAY)
+        self.backend = backend
+        self.filename = filename
+        self.max_size = max_size
+        self.img_rgb = self.img_gray = None
+        self.cache, self.key, self.cached = cache, None, None
+        if cache is not None:
+            self.key = cache.key(filename, 'fill-a-pix', backend, max_size, classifier.version(['digit'], backend))
+            self.cached = cache.get(self.key)
+        if self.cached is not None:
+            self.rho_horizontal = self.cached['rho_horizontal'].tolist()
+            self.rho_vertical = self.cached['rho_vertical'].tolist()
+        else:
+            self.load_image()
         self.img_edges = None
-        self.rho_vertical = []
-        self.rho_horizontal = []
+
+    def load_image(self):
+        """
+        Reads image and detects lines, if image was not read yet (puzzle was found in cache, or image was freed).
+        :return: None
+        """
+        if self.img_gray is None:
+            self.img_rgb, self.img_gray, self.rho_horizontal, self.rho_vertical = \
+                load_grid_image(self.filename, 150, self.max_size)
 
     def create_puzzle(self):
         """
-        Creates new puzzle. Detects lines on image, cuts image along them and passes smaller images to container.
+        Creates new puzzle. Cuts image along lines detected on it and passes smaller images (resized in one go)
+        to container, which classifies all of them at once (decision scores are kept in puzzle.scores,
+        confidence in puzzle.confidence). Puzzle found in cache is returned without reading image
+        (classifier is not loaded), new puzzle is stored in cache.
         :return: puzzle
         """
-        self.rho_horizontal, self.rho_vertical = get_line_positions(self.img_gray, 150)
-        puzzle = Container((len(self.rho_horizontal) - 1, len(self.rho_vertical) - 1))
-
-        for i in range(len(self.rho_horizontal) - 1):
-            for j in range(len(self.rho_vertical) - 1):
-                puzzle.insert(self.cut_image(i, j), i, j)
+        size = (len(self.rho_horizontal) - 1, len(self.rho_vertical) - 1)
+        if self.cached is not None:
+            puzzle = Container(size, from_file=False, backend=self.backend)
+            puzzle.puzzle[...] = self.cached['board']
+            puzzle.scores = self.cached['scores'].copy()
+            puzzle.confidence = self.cached['confidence'].copy()
+            return puzzle
+        puzzle = Container(size, backend=self.backend)
+        puzzle.insert_samples(self.cut_samples())
+        self.store(puzzle)
         return puzzle
 
+    def store(self, puzzle):
+        """
+        Stores puzzle read from image in cache (if reader has one).
+        :param puzzle: puzzle read from image
+        :return: None
+        """
+        if self.cache is not None:
+            self.cache.put(self.key, rho_horizontal=self.rho_horizontal, rho_vertical=self.rho_vertical,
+                           board=puzzle.get_board(), scores=puzzle.scores, confidence=puzzle.confidence)
+
+    def cut_samples(self):
+        """
+        Cuts fragments of image for all fields at once, resized as in Container.features.
+        :return: array of fragments, row by row
+        """
+        self.load_image()
+        rows = [(2 + self.rho_horizontal[x], self.rho_horizontal[x + 1] - CUT_BOTTOM)
+                for x in range(len(self.rho_horizontal) - 1)]
+        cols = [(2 + self.rho_vertical[y], self.rho_vertical[y + 1] - 1) for y in range(len(self.rho_vertical) - 1)]
+        return cut_cells(self.img_gray, rows, cols, SAMPLE_SIZE)
+
     def cut_image(self, x, y):
         """ Cuts part of an image depending on position of lines.
         :param x: position
         :param y: position
         :return: part of an image
         """
+        self.load_image()
         img = self.img_gray[2 + self.rho_horizontal[x]: self.rho_horizontal[x + 1],
                             2 + self.rho_vertical[y]: self.rho_vertical[y + 1] - 1]
         return img
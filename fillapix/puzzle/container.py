@@ -4,29 +4,34 @@
 
 import cv2
 import numpy as np
-import pickle
-import sys
 
 from classifiers import classifier
+from common.board import new_board
+from common.imageops import count_ink
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
 
+SAMPLE_SIZE = (15, 15)  # size of fragments of image given to classifier
+CUT_BOTTOM = 2          # rows cut from bottom of fragments before resizing
+INK = 10                # fragments with fewer dark pixels are empty (on bundled images: digits >= 35, empty <= 1)
+
 
 class Container:
     """Stores puzzle data."""
-    def __init__(self, size, from_file=True):
+    def __init__(self, size, from_file=True, backend='two-pass'):
         """ Initialization of container.
         :param size: size of a puzzle
         :param from_file: loads classifier if puzzle is initialized from file
+        :param backend: kind of classifier: svm, template or two-pass (see classifier)
         """
         self.size = size
-        self.puzzle = np.zeros((size[0], size[1]))
+        self.puzzle = new_board(size)
+        self.scores = None  # decision scores of classifier for every field, if puzzle was read by insert_samples
+        self.confidence = None  # confidence of classifier for every field (see classifier.confidence), as scores
+        self.region = None  # x, y, width, height of puzzle on page (see pipeline.read_page)
         if from_file:
-            if sys.version_info < (3, 0):
-                self.classifier = pickle.load(classifier.get('digit'))
-            else:
-                self.classifier = pickle.load(classifier.get('digit'), encoding='latin1')
+            self.classifier = classifier.load('digit', backend)
 
     def insert(self, image, x, y):
         """
@@ -36,10 +41,83 @@ class Container:
         :param y: position
         :return: None
         """
-        image = image[:-2, :]
-        image = cv2.resize(image, (15, 15))
-        number = self.classifier.predict(image.reshape(1, -1))
-        self.puzzle[x, y] = int(number)
+        number = self.classifier.predict(self.features(image).reshape(1, -1))
+        self.puzzle[x, y] = int(number[0])
+
+    def insert_all(self, images):
+        """
+        Inserts data into whole puzzle, all fields are classified with one call of classifier.
+        :param images: fragments of full image, row by row, one for every field
+        :return: decision scores of classifier, one row for every field
+        """
+        return self.insert_samples(np.array([self.features(image) for image in images]))
+
+    def insert_samples(self, samples, prefilter=True):
+        """
+        Inserts data into whole puzzle from fragments already resized (see features), with one call of classifier
+        (see classify_samples).
+        :param samples: array, one resized fragment (or its features) for every field, row by row
+        :param prefilter: False if all fragments should be classified
+        :return: decision scores of classifier, one row for every field
+        """
+        numbers, scores, certainty = self.classify_samples(samples, prefilter)
+        self.insert_numbers(numbers, scores, certainty)
+        return scores
+
+    def classify_samples(self, samples, prefilter=True):
+        """
+        Classifies fragments already resized (see features), with one call of classifier; fragments can come from
+        many puzzles. Fragments with almost no ink are empty fields, they are not passed to classifier (their scores
+        are nan, confidence is infinite).
+        :param samples: array, one resized fragment (or its features) for every field
+        :param prefilter: False if all fragments should be classified
+        :return: numbers, decision scores (one row for every field) and confidence of classifier
+        """
+        data = samples.reshape(len(samples), -1)
+        digits = np.ones(len(data), bool)
+        if prefilter:
+            digits = count_ink(data.reshape((-1,) + SAMPLE_SIZE[::-1])) >= INK
+        numbers = np.full(len(data), 100)
+        scores = np.empty((len(data), 0))
+        certainty = np.full(len(data), np.inf)
+        if digits.any():
+            numbers[digits], found, certainty[digits] = classifier.classify_with_confidence(self.classifier,
+                                                                                             data[digits])
+            scores = np.full((len(data),) + found.shape[1:], np.nan)
+            scores[digits] = found
+        return numbers, scores, certainty
+
+    def insert_numbers(self, numbers, scores, certainty):
+        """
+        Inserts classified numbers into whole puzzle (see classify_samples).
+        :param numbers: number for every field, row by row
+        :param scores: decision scores of classifier, one row for every field
+        :param certainty: confidence of classifier for every field
+        :return: None
+        """
+        self.puzzle[...] = np.asarray(numbers).reshape(self.size)
+        self.scores = scores.reshape(self.size + scores.shape[1:])
+        self.confidence = np.asarray(certainty).reshape(self.size)
+
+    def get_doubtful(self, limit=1.0):
+        """
+        Returns fields whose numbers classifier was not sure about, e.g. to be checked when puzzle cannot be solved.
+        :param limit: fields with lower confidence are returned
+        :return: list of positions x, y
+        """
+        if self.confidence is None:
+            return []
+        return [(int(x), int(y)) for x, y in np.argwhere(self.confidence < limit)]
+
+    @staticmethod
+    def features(image):
+        """
+        Turns fragment of image into features for classifier.
+        :param image: fragment of full image
+        :return: 225 values of resized image
+        """
+        image = image[:-CUT_BOTTOM, :]
+        return cv2.resize(image, SAMPLE_SIZE).reshape(-1)
 
     def print_puzzle(self):
         """
@@ -68,7 +146,7 @@ class Container:
         :return: solution of generated puzzle
         """
         self.puzzle += 100
-        solution = np.zeros(self.size)
+        solution = new_board(self.size)
         for i, row in enumerate(self.puzzle):
             for j, el in enumerate(row):
                 if np.random.random() < 0.5:
@@ -7,6 +7,8 @@ import math
 import copy
 from operator import xor
 
+from common.board import new_board, as_board
+from common.kernels import hood_counts
 from common.misc import get_unique
 
 __author__ = 'Adriana Borowa'
@@ -21,13 +23,13 @@ class FillAPixSolver:
         :param: puzzle: puzzle container
         """
         if puzzle is None:
-            self.puzzle = np.zeros((10, 10), int)
+            self.puzzle = new_board((10, 10))
         else:
-            self.puzzle = puzzle.get_board()
+            self.puzzle = as_board(puzzle.get_board())
         self.size = self.puzzle.shape
-        self.solution = np.zeros(self.size, int)
+        self.solution = new_board(self.size)
         self.probability = np.zeros(self.size, float)
-        self.user_solution = np.zeros(self.size, int)
+        self.user_solution = new_board(self.size)
 
     def set_puzzle(self, array):
         """
@@ -35,9 +37,9 @@ class FillAPixSolver:
         :param array: array to be set as puzzle.
         :return:
         """
-        self.puzzle = array
+        self.puzzle = as_board(array)
         self.size = self.puzzle.shape
-        self.solution = np.zeros(self.size, int)
+        self.solution = new_board(self.size)
 
     def set_solution(self, array):
         """
@@ -45,7 +47,7 @@ class FillAPixSolver:
         :param array: array with solution to generated puzzle
         :return: None
         """
-        self.solution = array
+        self.solution = as_board(array)
 
     def solve(self):
         """Solver:
@@ -56,13 +58,13 @@ class FillAPixSolver:
         5. One every Every five iterations starts random solver."""
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
-                if self.puzzle[i, j] == 0:
+                if self.puzzle.item(i, j) == 0:
                     self.assign_to_hood(i, j, -1)
-                elif self.puzzle[i, j] == 9:
+                elif self.puzzle.item(i, j) == 9:
                     self.assign_to_hood(i, j, 1)
-                elif self.size_of_hood(i, j) == 4 and self.puzzle[i, j] == 4:
+                elif self.size_of_hood(i, j) == 4 and self.puzzle.item(i, j) == 4:
                     self.assign_to_hood(i, j, 1)
-                elif self.size_of_hood(i, j) == 6 and self.puzzle[i, j] == 6:
+                elif self.size_of_hood(i, j) == 6 and self.puzzle.item(i, j) == 6:
                     self.assign_to_hood(i, j, 1)
                 if i in [0, self.size[0] - 1] or j in [0, self.size[1] - 1]:
                     self.special_case(i, j)
@@ -81,17 +83,20 @@ class FillAPixSolver:
         self.fill_gray()
 
     def fill(self):
-        """Fills fields with respect to actual knowledge."""
+        """Fills fields with respect to actual knowledge.
+        Numbers of filled and unfilled fields around every field are counted once per pass
+        and then updated with every assigned field."""
+        sizes = hood_counts(np.zeros(self.size, np.int8), 0)
         while True:
             changed = 0
+            filled = hood_counts(self.solution, 1)
+            empty = hood_counts(self.solution, -1)
             for k in range(8, 0, -1):
-                for i in range(0, self.size[0]):
-                    for j in range(0, self.size[1]):
-                        if self.puzzle[i, j] == k:
-                            if self.filled_sure(i, j) == k:
-                                changed += self.assign_to_hood(i, j, -1)
-                            elif self.empty_sure(i, j) == self.size_of_hood(i, j) - k:
-                                changed += self.assign_to_hood(i, j, 1)
+                for i, j in np.argwhere(self.puzzle == k).tolist():
+                    if filled.item(i, j) == k:
+                        changed += self.assign_to_hood(i, j, -1, empty)
+                    elif empty.item(i, j) == sizes.item(i, j) - k:
+                        changed += self.assign_to_hood(i, j, 1, filled)
 
             if changed == 0:
                 break
@@ -105,7 +110,7 @@ class FillAPixSolver:
         """
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
-                if self.puzzle[i, j] < 10:
+                if self.puzzle.item(i, j) < 10:
                     self.find_2_clue_logic(i, j)
                     self.find_3_clue_logic(i, j)
                     self.find_asa(i, j)
@@ -114,25 +119,25 @@ class FillAPixSolver:
         """Finds advanced 2 clue logic for point x, y if possible:
         1. Points directly next to each other
         2. Point not next to each other (one point between them)."""
-        el1 = self.puzzle[x, y]
+        el1 = self.puzzle.item(x, y)
         if el1 == 100:
             return
         # directly to each other
         for i in range(max(0, x - 1), min(x + 2, self.size[0])):
             for j in range(max(0, y - 1), min(y + 2, self.size[1])):
-                el1 = self.puzzle[x, y]
+                el1 = self.puzzle.item(x, y)
                 el1_hood = [(a, b) for a in range(max(0, x - 1), min(x + 2, self.size[0]))
                             for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
-                if (i != x or j != y) and self.puzzle[i, j] < 10:
-                    el2 = self.puzzle[i, j]
+                if (i != x or j != y) and self.puzzle.item(i, j) < 10:
+                    el2 = self.puzzle.item(i, j)
                     el2_hood = [(a, b) for a in range(max(0, i - 1), min(i + 2, self.size[0]))
                                 for b in range(max(0, j - 1), min(j + 2, self.size[1]))]
                     intersection = [a for a in set(el1_hood + el2_hood) if
                                     a in el1_hood and a in el2_hood]
-                    el1_alone = [a for a in el1_hood if a not in intersection if self.solution[a] != -1]
-                    el2_alone = [a for a in el2_hood if a not in intersection if self.solution[a] != -1]
-                    el1 -= len([a for a in el1_alone if self.solution[a] == 1])
-                    el2 -= len([a for a in el2_alone if self.solution[a] == 1])
+                    el1_alone = [a for a in el1_hood if a not in intersection if self.solution.item(a) != -1]
+                    el2_alone = [a for a in el2_hood if a not in intersection if self.solution.item(a) != -1]
+                    el1 -= len([a for a in el1_alone if self.solution.item(a) == 1])
+                    el2 -= len([a for a in el2_alone if self.solution.item(a) == 1])
                     if el1 > el2 and len(el1_alone) == math.fabs(el1 - el2):
                         self.assign_to_array(el1_alone, 1)
                         self.assign_to_array(el2_alone, -1)
@@ -143,21 +148,21 @@ class FillAPixSolver:
         # not directly next to each other
         for i in range(max(0, x - 2), min(x + 3, self.size[0])):
             for j in range(max(0, y - 2), min(y + 3, self.size[1])):
-                el1 = self.puzzle[x, y]
+                el1 = self.puzzle.item(x, y)
                 el1_hood = [(a, b) for a in range(max(0, x - 1), min(x + 2, self.size[0]))
                             for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
                 if (i not in range(max(0, x - 1), min(x + 2, self.size[0])) or
                         j not in range(max(0, y - 1), min(y + 2, self.size[1]))) \
-                        and self.puzzle[i, j] < 10:
-                    el2 = self.puzzle[i, j]
+                        and self.puzzle.item(i, j) < 10:
+                    el2 = self.puzzle.item(i, j)
                     el2_hood = [(a, b) for a in range(max(0, i - 1), min(i + 2, self.size[0]))
                                 for b in range(max(0, j - 1), min(j + 2, self.size[1]))]
                     intersection = [a for a in set(el1_hood + el2_hood) if
                                     a in el1_hood and a in el2_hood]
-                    el1_alone = [a for a in el1_hood if a not in intersection if self.solution[a] != -1]
-                    el2_alone = [a for a in el2_hood if a not in intersection if self.solution[a] != -1]
-                    el1 -= len([a for a in el1_alone if self.solution[a] == 1])
-                    el2 -= len([a for a in el2_alone if self.solution[a] == 1])
+                    el1_alone = [a for a in el1_hood if a not in intersection if self.solution.item(a) != -1]
+                    el2_alone = [a for a in el2_hood if a not in intersection if self.solution.item(a) != -1]
+                    el1 -= len([a for a in el1_alone if self.solution.item(a) == 1])
+                    el2 -= len([a for a in el2_alone if self.solution.item(a) == 1])
                     if el1 > el2 and len(el1_alone) == math.fabs(el1 - el2):
                         self.assign_to_array(el1_alone, 1)
                         self.assign_to_array(el2_alone, -1)
@@ -172,7 +177,7 @@ class FillAPixSolver:
         :param y: position
         :return: None
         """
-        el1 = self.puzzle[x, y]
+        el1 = self.puzzle.item(x, y)
         if el1 == 100:
             return
         # first case
@@ -184,10 +189,10 @@ class FillAPixSolver:
                 el3_x, el3_y = pair[1]
                 el1_hood = [(a, b) for a in range(max(0, x - 1), min(x + 2, self.size[0]))
                             for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
-                el2 = self.puzzle[el2_x, el2_y]
+                el2 = self.puzzle.item(el2_x, el2_y)
                 el2_hood = [(a, b) for a in range(max(0, el2_x - 1), min(el2_x + 2, self.size[0]))
                             for b in range(max(0, el2_y - 1), min(el2_y + 2, self.size[1]))]
-                el3 = self.puzzle[el3_x, el3_y]
+                el3 = self.puzzle.item(el3_x, el3_y)
                 el3_hood = [(a, b) for a in range(max(0, el3_x - 1), min(el3_x + 2, self.size[0]))
                             for b in range(max(0, el3_y - 1), min(el3_y + 2, self.size[1]))]
                 a_only = get_unique(np.array([a for a in el1_hood if a not in el2_hood and a not in el3_hood]))
@@ -207,17 +212,17 @@ class FillAPixSolver:
                 el3_x, el3_y = pair[1]
                 el1_hood = [(a, b) for a in range(max(0, x - 1), min(x + 2, self.size[0]))
                             for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
-                el2 = self.puzzle[el2_x, el2_y]
+                el2 = self.puzzle.item(el2_x, el2_y)
                 el2_hood = [(a, b) for a in range(max(0, el2_x - 1), min(el2_x + 2, self.size[0]))
                             for b in range(max(0, el2_y - 1), min(el2_y + 2, self.size[1]))]
-                el3 = self.puzzle[el3_x, el3_y]
+                el3 = self.puzzle.item(el3_x, el3_y)
                 el3_hood = [(a, b) for a in range(max(0, el3_x - 1), min(el3_x + 2, self.size[0]))
                             for b in range(max(0, el3_y - 1), min(el3_y + 2, self.size[1]))]
-                el2 -= len([a for a in el2_hood if a not in el1_hood and self.solution[a] == 1])
-                el3 -= len([a for a in el3_hood if a not in el1_hood and self.solution[a] == 1])
+                el2 -= len([a for a in el2_hood if a not in el1_hood and self.solution.item(a) == 1])
+                el3 -= len([a for a in el3_hood if a not in el1_hood and self.solution.item(a) == 1])
                 a_only = get_unique(np.array([a for a in el1_hood if a not in el2_hood and a not in el3_hood]))
                 b_but_not_a = get_unique(np.array([a for a in el2_hood + el3_hood
-                                                   if a not in el1_hood and self.solution[a] == 0]))
+                                                   if a not in el1_hood and self.solution.item(a) == 0]))
                 a_and_one_b = get_unique(np.array([a for a in el1_hood if xor(a in el2_hood, a in el3_hood)]))
                 # A_and_all_B = get_unique(np.array([a for a in el1_hood if a in el2_hood + el3_hood]))
                 if el1 == el2 + el3 and len(b_but_not_a) == 0 and el1 < len(a_and_one_b):
@@ -230,22 +235,22 @@ class FillAPixSolver:
         :param y: position
         :return: None
         """
-        el1 = self.puzzle[x, y]
+        el1 = self.puzzle.item(x, y)
         if el1 == 100:
             return
         el1_hood = [(a, b) for a in range(max(0, x - 1), min(x + 2, self.size[0]))
                     for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
         hood = []
-        if 1 < x < self.size[0] - 2 and self.puzzle[x - 1, y] + self.puzzle[x + 2, y] == el1:
+        if 1 < x < self.size[0] - 2 and self.puzzle.item(x - 1, y) + self.puzzle.item(x + 2, y) == el1:
             hood = [(a, b) for a in range(max(x - 2, 0), min(x + 4, self.size[0]))
                     for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
-        elif 2 < x < self.size[0] - 1 and self.puzzle[x + 1, y] + self.puzzle[x - 2, y] == el1:
+        elif 2 < x < self.size[0] - 1 and self.puzzle.item(x + 1, y) + self.puzzle.item(x - 2, y) == el1:
             hood = [(a, b) for a in range(max(x - 3, 0), min(x + 3, self.size[0]))
                     for b in range(max(0, y - 1), min(y + 2, self.size[1]))]
-        elif 1 < y < self.size[1] - 2 and self.puzzle[x, y - 1] + self.puzzle[x, y + 2] == el1:
+        elif 1 < y < self.size[1] - 2 and self.puzzle.item(x, y - 1) + self.puzzle.item(x, y + 2) == el1:
             hood = [(a, b) for a in range(max(x - 1, 0), min(x + 2, self.size[0]))
                     for b in range(max(y - 2, 0), min(y + 4, self.size[1]))]
-        elif 2 < y < self.size[1] - 1 and self.puzzle[x, y + 1] + self.puzzle[x, y - 2] == el1:
+        elif 2 < y < self.size[1] - 1 and self.puzzle.item(x, y + 1) + self.puzzle.item(x, y - 2) == el1:
             hood = [(a, b) for a in range(max(x - 1, 0), min(x + 2, self.size[0]))
                     for b in range(max(y - 4, 0), min(y + 2, self.size[1]))]
         to_insert = [a for a in hood if a not in el1_hood]
@@ -256,18 +261,15 @@ class FillAPixSolver:
            number in square - filled squares in neighbourhood == 1.
            Takes one random square and tries filling unfilled squares in its neighbourhood and then
            the rest of puzzle. If solution is not correct discards it."""
-        queue = []
-        for i in range(0, self.size[0]):
-            for j in range(0, self.size[1]):
-                if self.puzzle[i, j] - self.filled_sure(i, j) == 1:
-                    queue.append([i, j])
+        filled = hood_counts(self.solution, 1)
+        queue = np.argwhere(self.puzzle - filled == 1).tolist()
         if len(queue) == 0:
             return
 
         q = queue[np.random.randint(0, len(queue))]
         queue2 = []
         for n in self.get_hood(*q):
-            if self.solution[n[0], n[1]] == 0:
+            if self.solution.item(n[0], n[1]) == 0:
                 queue2.append(n)
         for n in queue2:
             old_solution = copy.deepcopy(self.solution)
@@ -284,7 +286,7 @@ class FillAPixSolver:
         """All not black squares are filled with gray."""
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
-                if self.solution[i, j] == 0:
+                if self.solution.item(i, j) == 0:
                     self.solution[i, j] = -1
 
 
@@ -300,14 +302,14 @@ class FillAPixSolver:
         if close:
             for i in range(max(0, x - 1), min(x + 2, self.size[0])):
                 for j in range(max(0, y - 1), min(y + 2, self.size[1])):
-                    if (i != x or j != y) and self.puzzle[i, j] < 10:
+                    if (i != x or j != y) and self.puzzle.item(i, j) < 10:
                         neighbours.append([i, j])
         else:
             for i in range(max(0, x - 2), min(x + 3, self.size[0])):
                 for j in range(max(0, y - 2), min(y + 3, self.size[1])):
                     if (i not in range(max(0, x - 1), min(x + 2, self.size[0])) or
                             j not in range(max(0, y - 1), min(y + 2, self.size[1]))) \
-                                and self.puzzle[i, j] < 10:
+                                and self.puzzle.item(i, j) < 10:
                         neighbours.append([i, j])
         return neighbours
 
@@ -329,37 +331,37 @@ class FillAPixSolver:
         :param y: position
         :return: None
         """
-        if self.puzzle[x, y] == 2:
+        if self.puzzle.item(x, y) == 2:
             if x == 0 and y == 0:
-                if self.puzzle[x + 1, y] == 2:
+                if self.puzzle.item(x + 1, y) == 2:
                     self.solution[x + 2, 0: 2] = -1
-                if self.puzzle[x, y + 1] == 2:
+                if self.puzzle.item(x, y + 1) == 2:
                     self.solution[0: 2, y + 2] = -1
             if x == 0 and y == self.size[1] - 1:
-                if self.puzzle[x + 1, y] == 2:
+                if self.puzzle.item(x + 1, y) == 2:
                     self.solution[x + 2, self.size[1] - 2: self.size[1]] = -1
-                if self.puzzle[x, y - 1] == 2:
+                if self.puzzle.item(x, y - 1) == 2:
                     self.solution[0: 2, y - 2] = -1
             if x == self.size[0] - 1 and y == 0:
-                if self.puzzle[x - 1, y] == 2:
+                if self.puzzle.item(x - 1, y) == 2:
                     self.solution[x - 2, 0: 2] = -1
-                if self.puzzle[x, y + 1] == 2:
+                if self.puzzle.item(x, y + 1) == 2:
                     self.solution[self.size[0] - 2: self.size[0], y + 2] = -1
             if x == self.size[0] - 1 and y == self.size[1] - 1:
-                if self.puzzle[x - 1, y] == 2:
+                if self.puzzle.item(x - 1, y) == 2:
                     self.solution[x - 2, self.size[1] - 2: self.size[1]] = -1
-                if self.puzzle[x, y - 1] == 2:
+                if self.puzzle.item(x, y - 1) == 2:
                     self.solution[self.size[0] - 2: self.size[0], y - 2] = -1
 
-        elif self.puzzle[x, y] == 3 and (
+        elif self.puzzle.item(x, y) == 3 and (
                         x in [0, self.size[0] - 1] or y in [0, self.size[1] - 1]):
-            if x == 0 and 0 < y < self.size[1] - 1 and self.puzzle[x + 1, y] == 3:
+            if x == 0 and 0 < y < self.size[1] - 1 and self.puzzle.item(x + 1, y) == 3:
                 self.solution[x + 2, y - 1: y + 2] = -1
-            if x == self.size[0] - 1 and 0 < y < self.size[1] - 1 and self.puzzle[x - 1, y] == 3:
+            if x == self.size[0] - 1 and 0 < y < self.size[1] - 1 and self.puzzle.item(x - 1, y) == 3:
                 self.solution[x - 2, y - 1: y + 2] = -1
-            if 0 < x < self.size[0] - 1 and y == 0 and self.puzzle[x, y + 1] == 3:
+            if 0 < x < self.size[0] - 1 and y == 0 and self.puzzle.item(x, y + 1) == 3:
                 self.solution[x - 1: x + 2, y + 2] = -1
-            if 0 < x < self.size[0] - 1 and y == self.size[1] - 1 and self.puzzle[x, y - 1] == 3:
+            if 0 < x < self.size[0] - 1 and y == self.size[1] - 1 and self.puzzle.item(x, y - 1) == 3:
                 self.solution[x - 1: x + 2, y - 2] = -1
 
     def filled_sure(self, x, y):
@@ -372,7 +374,7 @@ class FillAPixSolver:
         count = 0
         for i in range(max(0, x - 1), min(x + 2, self.size[0])):
             for j in range(max(0, y - 1), min(y + 2, self.size[1])):
-                if self.solution[i, j] == 1:
+                if self.solution.item(i, j) == 1:
                     count += 1
         return count
 
@@ -386,7 +388,7 @@ class FillAPixSolver:
         count = 0
         for i in range(max(0, x - 1), min(x + 2, self.size[0])):
             for j in range(max(0, y - 1), min(y + 2, self.size[1])):
-                if self.solution[i, j] == -1:
+                if self.solution.item(i, j) == -1:
                     count += 1
         return count
 
@@ -404,20 +406,23 @@ class FillAPixSolver:
         else:
             return 6
 
-    def assign_to_hood(self, x, y, val):
+    def assign_to_hood(self, x, y, val, counts=None):
         """
         Assign val to entire neighbourhood of point (including point i, j).
         :param x: position
         :param y: position
         :param val: value to be assigned
+        :param counts: if given, counts of val in neighbourhoods (see hood_counts) are updated
         :return: how many points were assigned
         """
         count = 0
         for i in range(max(0, x - 1), min(x + 2, self.size[0])):
             for j in range(max(0, y - 1), min(y + 2, self.size[1])):
-                if self.solution[i, j] not in [-1, 1]:
+                if self.solution.item(i, j) not in [-1, 1]:
                     self.solution[i, j] = val
                     count += 1
+                    if counts is not None:
+                        counts[max(0, i - 1): i + 2, max(0, j - 1): j + 2] += 1
         return count
 
     def reset_hood(self, x, y):
@@ -435,7 +440,7 @@ class FillAPixSolver:
         """
         count = 0
         for x, y in array:
-            if self.solution[x, y] == 0:
+            if self.solution.item(x, y) == 0:
                 self.solution[x, y] = val
                 count += 1
         return count
@@ -445,7 +450,7 @@ class FillAPixSolver:
         count = 0
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
-                if self.solution[i, j] == 0:
+                if self.solution.item(i, j) == 0:
                     count += 1
         if count == 0:
             return True
@@ -456,7 +461,7 @@ class FillAPixSolver:
         """Checks if current filling is correct. If not returns first found mistake."""
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
-                el = self.puzzle[i, j]
+                el = self.puzzle.item(i, j)
                 if el < 10:
                     if self.filled_sure(i, j) > el:
                         return i, j
@@ -491,7 +496,7 @@ class FillAPixSolver:
 
     def get_user_value(self, i, j):
         """Getter for user chosen value in point."""
-        return self.user_solution[i, j]
+        return self.user_solution.item(i, j)
 
     def set_user_value(self, x, y, val):
         """Sets user chosen value."""
@@ -503,13 +508,13 @@ class FillAPixSolver:
 
     def clear_user_solution(self):
         """Resets user's solution."""
-        self.user_solution = np.zeros(self.size, int)
+        self.user_solution = new_board(self.size)
 
     def check_user_solution(self):
         """Checks if user's solution is currently correct. Omits unfilled points."""
         for i in range(self.size[0]):
             for j in range(self.size[1]):
-                if self.solution[i, j] != self.user_solution[i, j] and self.user_solution[i, j] != 0:
+                if self.solution.item(i, j) != self.user_solution.item(i, j) and self.user_solution.item(i, j) != 0:
                     return i, j
         return -1, -1
 
@@ -518,7 +523,7 @@ class FillAPixSolver:
         count = 0
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
-                if self.user_solution[i, j] != self.solution[i, j]:
+                if self.user_solution.item(i, j) != self.solution.item(i, j):
                     count += 1
         if count == 0:
             return True
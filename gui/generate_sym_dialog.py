@@ -17,13 +17,14 @@ class GenerateSymDialog(QtGui.QMainWindow):
         self.ok_btn = QtGui.QPushButton('OK')
         self.size_value = QtGui.QSpinBox()
         self.colors_value = QtGui.QSpinBox()
+        self.unique_value = QtGui.QCheckBox('Unique solution')
         self.parent = parent
         self.init_ui()
 
     def init_ui(self):
         """Dialog window"""
         self.setWindowTitle('Sym-a-pix: generate game')
-        self.resize(200, 120)
+        self.resize(200, 150)
         cw = QtGui.QWidget()
         self.setCentralWidget(cw)
         l = QtGui.QGridLayout()
@@ -43,15 +44,19 @@ class GenerateSymDialog(QtGui.QMainWindow):
         l.addWidget(color_label, *(1, 0))
         l.addWidget(self.colors_value, *(1, 1))
 
+        self.unique_value.setChecked(True)
+        l.addWidget(self.unique_value, *(2, 1))
+
         self.ok_btn.clicked.connect(self.send_values)
-        l.addWidget(self.ok_btn, *(2, 1))
+        l.addWidget(self.ok_btn, *(3, 1))
         cw.setLayout(l)
 
     def send_values(self):
         """Function to send user's values to generating function."""
         size = self.size_value.value()
         color = self.colors_value.value()
-        self.parent.generate_new_sym(size, size, color)
+        unique = self.unique_value.isChecked()
+        self.parent.generate_new_sym(size, size, color, unique)
         self.size_value.setValue(10)
         self.colors_value.setValue(2)
         self.close()
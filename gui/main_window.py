@@ -6,8 +6,8 @@ from PyQt4 import QtGui, QtCore
 from PyQt4.QtCore import Qt
 import sys
 
+from common.cache import PuzzleCache
 from fillapix.puzzle import container as fc
-from symapix.puzzle import container as sc
 from symapix.imageops.reader import SymAPixReader
 from symapix.solver.solver import SymAPixSolver
 from symapix.puzzle.generator import Generator
@@ -30,6 +30,7 @@ class MainWindow(QtGui.QMainWindow):
         super(MainWindow, self).__init__()
         self.gfd = GenerateFillDialog(self)
         self.gsd = GenerateSymDialog(self)
+        self.cache = PuzzleCache()  # puzzles read earlier, the same images are not read again
         self.status_bar = self.statusBar()
         self.l = QtGui.QVBoxLayout()
         self.content = QtGui.QVBoxLayout()
@@ -121,7 +122,7 @@ class MainWindow(QtGui.QMainWindow):
             if '.jpg' not in file_name:
                 raise IOError
             self.change_curr_game(1)
-            reader = SymAPixReader(file_name)
+            reader = SymAPixReader(file_name, cache=self.cache)
             self.puzzle = reader.create_puzzle()
             self.horizontal_lines, self.vertical_lines = reader.get_lines()
             self.solver = SymAPixSolver(self.puzzle)
@@ -129,6 +130,11 @@ class MainWindow(QtGui.QMainWindow):
             self.solver.solve()
             self.draw_game()
             self.status_bar.showMessage('Loaded puzzle from file: {}'.format(file_name.split('/')[-1]))
+            doubtful = self.puzzle.get_doubtful()
+            if not self.solver.is_solved() and doubtful:
+                # positions of dots in squares, walls between them are at halves
+                self.status_bar.showMessage('Cannot solve puzzle, check dots in: {}'.format(
+                    ', '.join('({:g}, {:g})'.format(y / 2.0 + 1, x / 2.0 + 1) for x, y in doubtful)))
         except IOError:
             self.status_bar.showMessage('Cannot read file: {}'.format(file_name.split('/')[-1]))
 
@@ -136,31 +142,24 @@ class MainWindow(QtGui.QMainWindow):
         """Opens dialog where user can set size of puzzle to be generated."""
         self.gsd.show()
 
-    def generate_new_sym(self, width, height, color):
+    def generate_new_sym(self, width, height, color, unique=True):
         """
         Generates new puzzle, puzzle is then showed to user.
         :param width: width of puzzle
         :param height: height of puzzle
         :param color: number of colors used
+        :param unique: if puzzle has to have exactly one solution
         :return:
         """
         self.change_curr_game(1)
-        self.puzzle = sc.Container((height, width))
-        self.puzzle.set_colors(color)
+        generator = Generator()
+        self.puzzle = generator.generate(width, height, color, unique=unique)
         self.horizontal_lines, self.vertical_lines = width + 1, height + 1
-        self.solver = SymAPixSolver(self.puzzle)
+        self.solver = generator.solver
         self.game_size = self.solver.size
-        generator = Generator(self.solver, self.puzzle)
-        generator.generate_random()
-        while not self.solver.is_solved():
-            self.solver.solve()
-            self.solver.correct_solution()
-            generator.correct_lines()
-            generator.fill_dots()
-            self.solver.correct_solution()
-            generator.correct_lines()
-            generator.remove_redundant_walls()
         self.draw_game()
+        self.status_bar.showMessage('Generated puzzle: {} iterations, {:.2f} s'.format(generator.iterations,
+                                                                                    generator.time))
 
     def load_fill_from_file(self):
         """Loads fill-a-pix puzzle from file."""
@@ -170,7 +169,7 @@ class MainWindow(QtGui.QMainWindow):
             if '.jpg' not in file_name:
                 raise IOError
             self.change_curr_game(2)
-            reader = FillAPixReader(file_name)
+            reader = FillAPixReader(file_name, cache=self.cache)
             self.puzzle = reader.create_puzzle()
             self.horizontal_lines, self.vertical_lines = reader.get_lines()
             self.solver = FillAPixSolver(self.puzzle)
@@ -178,6 +177,10 @@ class MainWindow(QtGui.QMainWindow):
             self.solver.solve()
             self.draw_game()
             self.status_bar.showMessage('Loaded puzzle from file: {}'.format(file_name.split('/')[-1]))
+            doubtful = self.puzzle.get_doubtful()
+            if not self.solver.is_solved() and doubtful:
+                self.status_bar.showMessage('Cannot solve puzzle, check numbers in: {}'.format(
+                    ', '.join('({}, {})'.format(y + 1, x + 1) for x, y in doubtful)))
         except IOError:
             self.status_bar.showMessage('Cannot read file: {}'.format(file_name.split('/')[-1]))
 
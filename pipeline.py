@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+""" Reads and solves many images of puzzles without GUI, e.g. whole folders of scans.
+Every image goes through five stages: read (file is read), grid (image is decoded, lines of grid are detected
+and fragments are cut), classify (fragments of many images are classified together), solve and write (one line
+of JSON for every image). Stages run at the same time and are joined by bounded queues, so only a few images
+are kept in memory. Reading and decoding (waiting for disk, OpenCV releases GIL) run in threads, classification
+and solving in processes. Throughput of every stage is reported at the end, to choose numbers of workers.
+Images of both puzzles can be mixed, kind of puzzle is told by path (see guess_kind). Pages with many puzzles
+can be read too (see read_page): every grid found on page is read as separate image.
+
+python pipeline.py folder [folder or image ...] [-o results.jsonl] - paths are read from standard input for '-'
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from classifiers import classifier
+from common.cache import PuzzleCache
+from common.imageops import crop_grid, find_grids, read_image
+from fillapix.imageops.reader import FillAPixReader
+from fillapix.puzzle.container import Container as FillAPixContainer
+from fillapix.solver.solver import FillAPixSolver
+from symapix.imageops.reader import SymAPixReader
+from symapix.puzzle.container import Container as SymAPixContainer
+from symapix.solver.solver import SymAPixSolver
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+KINDS = {'fill-a-pix': (FillAPixReader, FillAPixSolver), 'sym-a-pix': (SymAPixReader, SymAPixSolver)}
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')  # images found in folders
+QUEUE_SIZE = 16     # largest number of images waiting between two stages
+BATCH_SIZE = 32     # largest number of images classified together
+DONE = None         # put into queue after the last image
+
+
+def guess_kind(path, default=None):
+    """
+    Tells kind of puzzle by path of image: by the closest part of path (name of file first, then folders)
+    containing 'fill' or 'sym', e.g. fill-a-pix_images/image1.jpg.
+    :param path: path of image
+    :param default: kind of puzzle if path tells nothing
+    :return: fill-a-pix, sym-a-pix or default
+    """
+    for part in reversed(os.path.normpath(str(path)).lower().split(os.sep)):
+        if 'fill' in part:
+            return 'fill-a-pix'
+        if 'sym' in part:
+            return 'sym-a-pix'
+    return default
+
+
+def find_images(paths):
+    """
+    Gives paths of images, folders are searched (with subfolders, in order of names).
+    :param paths: paths of images and folders
+    :return: generator of paths of images
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folders, files in os.walk(path):
+                folders.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(EXTENSIONS):
+                        yield os.path.join(folder, name)
+        else:
+            yield path
+
+
+def read_paths(stream):
+    """
+    Gives paths read from stream, one in every line (empty lines are skipped), each of them as soon as it is read,
+    so first images are processed while next paths are still coming.
+    :param stream: text stream, e.g. standard input
+    :return: generator of paths
+    """
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def load_page(filename):
+    """
+    Reads page with many puzzles and finds their grids (see find_grids).
+    :param filename: name of file with image of page, or bytes of file already read
+    :return: colour image of page, regions x, y, width, height of grids (whole page if no grid is found)
+    """
+    page = read_image(filename, color=True)
+    regions = find_grids(cv2.cvtColor(page, cv2.COLOR_BGR2GRAY))
+    return page, regions or [(0, 0, page.shape[1], page.shape[0])]
+
+
+def read_page(filename, kind=None, backend='two-pass', max_size=1024, cache=None, workers=None):
+    """
+    Reads all puzzles of page: grids are found on page (see load_page), cut from it and read at the same time
+    by threads, each of them as separate image.
+    :param filename: name of file with image of page, or bytes of file already read
+    :param kind: fill-a-pix or sym-a-pix, None - told by name of file (see guess_kind)
+    :param backend: kind of classifiers: svm, template or two-pass (see classifier)
+    :param max_size: bigger grids are reduced (see readers)
+    :param cache: PuzzleCache with puzzles read earlier, None - grids are always read
+    :param workers: number of threads, None - chosen by ThreadPoolExecutor
+    :return: list of puzzles, in order of grids on page (see find_grids); every puzzle has its region
+    x, y, width, height on page in attribute region
+    """
+    if kind is None and not isinstance(filename, (bytes, bytearray, memoryview)):
+        kind = guess_kind(filename)
+    if kind not in KINDS:
+        raise ValueError('Cannot tell kind of puzzle: {}'.format(filename))
+    page, regions = load_page(filename)
+
+    def read(region):
+        puzzle = KINDS[kind][0](crop_grid(page, region), backend, max_size, cache).create_puzzle()
+        puzzle.region = region
+        return puzzle
+
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(read, regions))
+
+
+def classify_samples(kind, backend, samples, mode=0):
+    """
+    Classifies fragments of many images at once, in worker process (see classify_samples of containers).
+    :param kind: fill-a-pix or sym-a-pix
+    :param backend: kind of classifiers: svm, template or two-pass
+    :param samples: resized fragments of images
+    :param mode: part of sym-a-pix puzzle, 0 - window, 1 - horizontal line, 2 - vertical line, 3 - line crossing
+    :return: numbers, decision scores and confidence of fragments (numbers and confidence for sym-a-pix)
+    """
+    if kind == 'fill-a-pix':
+        return FillAPixContainer((1, 1), backend=backend).classify_samples(samples)
+    return SymAPixContainer((1, 1), backend).classify_samples(samples, mode)
+
+
+def solve_puzzle(kind, puzzle):
+    """
+    Solves puzzle in worker process.
+    :param kind: fill-a-pix or sym-a-pix
+    :param puzzle: container of puzzle
+    :return: solution, True if puzzle was solved
+    """
+    solver = KINDS[kind][1](puzzle)
+    solver.solve()
+    return np.array(solver.solution), solver.is_solved()
+
+
+def describe(error):
+    """Returns description of error of job."""
+    return '{}: {}'.format(type(error).__name__, error)
+
+
+def submit(pool, function, *args):
+    """Runs function in pool of processes, or at once if pool is None; returns future."""
+    if pool is not None:
+        return pool.submit(function, *args)
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+class Job:
+    """Image passing through stages of pipeline."""
+
+    def __init__(self, path, kind):
+        """
+        Initialization of job.
+        :param path: path of image
+        :param kind: fill-a-pix, sym-a-pix or None if it is not known
+        """
+        self.path = path
+        self.kind = kind
+        self.region = None      # x, y, width, height of grid on page, if image is page with many puzzles
+        self.data = None        # bytes of file (or image of grid cut from page)
+        self.reader = None
+        self.parts = None       # fragments to be classified (see cut_samples and cut_parts of readers)
+        self.puzzle = None
+        self.solution = None
+        self.solved = False
+        self.error = None
+        self.seconds = {}       # time of every stage
+
+    def result(self):
+        """Returns result of job, as dictionary which can be written as JSON."""
+        result = {'path': str(self.path), 'kind': self.kind, 'error': self.error, 'seconds': self.seconds}
+        if self.region is not None:
+            result['region'] = [int(v) for v in self.region]
+        if self.puzzle is not None:
+            result['puzzle'] = self.puzzle.get_board().tolist()
+            result['doubtful'] = self.puzzle.get_doubtful()
+            if self.kind == 'sym-a-pix':
+                result['colors'] = [[int(c) for c in color] for color in self.puzzle.get_colors()]
+        if self.solution is not None:
+            result['solution'] = self.solution.tolist()
+            result['solved'] = bool(self.solved)
+        return result
+
+
+class Stage:
+    """Stage of pipeline: workers (threads) take jobs from input queue, process them and put them into output."""
+
+    def __init__(self, name, work, workers=1, batch=1, failed=False):
+        """
+        Initialization of stage.
+        :param name: name of stage
+        :param work: function processing list of jobs, returns jobs to be passed on instead of them (or None)
+        :param workers: number of threads
+        :param batch: largest number of jobs processed together (taken only if they are already waiting)
+        :param failed: True if jobs with error should be processed too, otherwise they are only passed on
+        """
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.batch = batch
+        self.failed = failed
+        self.input = None
+        self.output = None
+        self.threads = []
+        self.running = 0
+        self.lock = threading.Lock()
+        # statistics
+        self.count = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.first = None
+        self.last = None
+
+    def start(self):
+        """Starts workers."""
+        self.running = self.workers
+        self.threads = [threading.Thread(target=self.run, name=self.name, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        """Worker: processes jobs until DONE is found in input, the last worker passes DONE on."""
+        while True:
+            jobs = [self.input.get()]
+            while jobs[-1] is not DONE and len(jobs) < self.batch:
+                try:
+                    jobs.append(self.input.get_nowait())
+                except queue.Empty:
+                    break
+            done = jobs[-1] is DONE
+            if done:
+                jobs.pop()
+            if jobs:
+                self.process(jobs)
+            if done:
+                self.input.put(DONE)  # for other workers
+                with self.lock:
+                    self.running -= 1
+                    last = self.running == 0
+                if last and self.output is not None:
+                    self.output.put(DONE)
+                return
+
+    def process(self, jobs):
+        """
+        Processes jobs (see failed and attempt).
+        :param jobs: list of jobs
+        :return: None
+        """
+        start = time.time()
+        todo = [job for job in jobs if self.failed or job.error is None]
+        fine = [job for job in jobs if job.error is None]
+        passed = [job for job in jobs if job not in todo] + (self.attempt(todo) if todo else [])
+        end = time.time()
+        for job in todo:
+            job.seconds[self.name] = (end - start) / len(todo)
+        with self.lock:
+            self.count += len(jobs)
+            self.errors += sum(job.error is not None for job in fine)
+            self.busy += end - start
+            self.first = start if self.first is None else min(self.first, start)
+            self.last = end if self.last is None else max(self.last, end)
+        if self.output is not None:
+            for job in passed:
+                self.output.put(job)
+
+    def attempt(self, jobs):
+        """
+        Processes jobs with one call of work. If it fails for many jobs, they are processed again one by one,
+        so that only jobs which fail alone get error (work has to give the same results when it is repeated).
+        :param jobs: list of jobs
+        :return: jobs to be passed on
+        """
+        try:
+            done = self.work(jobs)
+        except Exception as error:
+            if len(jobs) > 1:
+                return [job for one in jobs for job in self.attempt([one])]
+            if jobs[0].error is None:
+                jobs[0].error = describe(error)
+            return jobs
+        return jobs if done is None else done
+
+    def report(self):
+        """Returns throughput of stage: images per second of whole stage and of one worker, use of workers."""
+        wall = (self.last - self.first) if self.count else 0.0
+        return '{:<8} {:6d} images {:4d} errors {:8.1f} images/s {:8.1f} images/s per worker, ' \
+               '{} workers {:4.0%} busy'.format(self.name, self.count, self.errors, self.count / wall if wall else 0.0,
+                                                self.count / self.busy if self.busy else 0.0, self.workers,
+                                                self.busy / (wall * self.workers) if wall else 0.0)
+
+
+class Pipeline:
+    """Reads, classifies, solves and writes many images at once, in stages (see module description)."""
+
+    def __init__(self, output, backend='two-pass', max_size=1024, cache=None, kind=None, readers=2, decoders=2,
+                 classifiers=1, solvers=None, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE, pages=False):
+        """
+        Initialization of pipeline.
+        :param output: file (opened for writing text), one line of JSON is written for every image (see Job.result)
+        :param backend: kind of classifiers: svm, template or two-pass (see classifier)
+        :param max_size: bigger images are reduced (see readers)
+        :param cache: PuzzleCache with puzzles read earlier, None - images are always read
+        :param kind: kind of puzzle of images whose path tells nothing (see guess_kind), None - such images are errors
+        :param readers: number of threads reading files
+        :param decoders: number of threads decoding images and detecting grids
+        :param classifiers: number of processes classifying fragments, 0 - fragments are classified in one thread
+        :param solvers: number of processes solving puzzles, 0 - puzzles are solved in one thread,
+        None - number of processors
+        :param batch_size: largest number of images classified together
+        :param queue_size: largest number of images waiting between two stages
+        :param pages: True if images are pages with many puzzles, every grid found on page (see load_page)
+        is then passed on as separate image, with its region on page
+        """
+        self.output = output
+        self.backend = backend
+        self.max_size = max_size
+        self.cache = cache
+        self.kind = kind
+        self.classifiers = classifiers
+        self.solvers = (os.cpu_count() or 1) if solvers is None else solvers
+        self.queue_size = queue_size
+        self.pages = pages
+        self.classify_pool = self.solve_pool = None
+        self.stages = [Stage('read', self.read, readers), Stage('grid', self.grid, decoders),
+                       Stage('classify', self.classify, max(classifiers, 1), batch_size),
+                       Stage('solve', self.solve, max(self.solvers, 1)), Stage('write', self.write, failed=True)]
+
+    def run(self, paths):
+        """
+        Processes images, returns when all of them are written.
+        :param paths: paths of images (any iterable, e.g. generator reading them from a stream)
+        :return: number of images
+        """
+        if self.classifiers:
+            # processes are forked before threads start, and share classifiers loaded here
+            try:
+                classifier.prewarm(backend=self.backend)
+            except Exception:
+                pass  # classifiers which cannot be loaded give errors of images which need them (see classify)
+        self.classify_pool = ProcessPoolExecutor(self.classifiers) if self.classifiers else None
+        self.solve_pool = ProcessPoolExecutor(self.solvers) if self.solvers else None
+        for pool in (self.classify_pool, self.solve_pool):
+            if pool is not None:
+                pool.submit(int).result()
+        try:
+            queues = [queue.Queue(self.queue_size) for _ in self.stages]
+            for k, stage in enumerate(self.stages):
+                stage.input = queues[k]
+                stage.output = queues[k + 1] if k + 1 < len(queues) else None
+                stage.start()
+            count = 0
+            for path in paths:
+                queues[0].put(Job(path, guess_kind(path, self.kind)))
+                count += 1
+            queues[0].put(DONE)
+            for stage in self.stages:
+                for thread in stage.threads:
+                    thread.join()
+        finally:
+            for pool in (self.classify_pool, self.solve_pool):
+                if pool is not None:
+                    pool.shutdown()
+        return count
+
+    def report(self):
+        """Returns throughput of all stages, one line for every stage."""
+        return '\n'.join(stage.report() for stage in self.stages)
+
+    def read(self, jobs):
+        """Stage read: reads files."""
+        for job in jobs:
+            if job.kind not in KINDS:
+                raise ValueError('Cannot tell kind of puzzle: {}'.format(job.path))
+            with open(str(job.path), 'rb') as f:
+                job.data = f.read()
+
+    def grid(self, jobs):
+        """
+        Stage grid: decodes images, detects lines and cuts fragments; puzzles found in cache are created.
+        Pages are cut into grids first, grids go on as separate jobs.
+        """
+        if not self.pages:
+            return self.read_grids(jobs)
+        grids = []
+        for job in jobs:
+            page, regions = load_page(job.data)
+            for region in regions:
+                grid = Job(job.path, job.kind)
+                grid.region = region
+                grid.data = crop_grid(page, region)
+                grid.seconds = dict(job.seconds)
+                # grid which cannot be read does not stop other grids
+                try:
+                    self.read_grids([grid])
+                except Exception as error:
+                    grid.error = describe(error)
+                grids.append(grid)
+        return grids
+
+    def read_grids(self, jobs):
+        """Reads grids of jobs (see grid)."""
+        for job in jobs:
+            reader = KINDS[job.kind][0](job.data, self.backend, self.max_size, self.cache)
+            job.data = None
+            if reader.cached is not None:
+                job.puzzle = reader.create_puzzle()
+            elif job.kind == 'fill-a-pix':
+                job.parts = reader.cut_samples()
+            else:
+                job.parts = reader.cut_parts()
+            # only fragments are needed later
+            reader.img_rgb = reader.img_gray = None
+            job.reader = reader
+        return jobs
+
+    def classify(self, jobs):
+        """Stage classify: classifies fragments of all jobs, with one call of classifier for every kind of them."""
+        fill = [job for job in jobs if job.parts is not None and job.kind == 'fill-a-pix']
+        sym = [job for job in jobs if job.parts is not None and job.kind == 'sym-a-pix']
+        # all calls are submitted first, so that they run at the same time
+        digits = None
+        if fill:
+            digits = submit(self.classify_pool, classify_samples, 'fill-a-pix', self.backend,
+                            np.concatenate([job.parts for job in fill]))
+        dots = []
+        for mode in range(4):
+            parts = [part for job in sym for part in job.parts if part['mode'] == mode and len(part['unsure'])]
+            if parts:
+                dots.append((parts, submit(self.classify_pool, classify_samples, 'sym-a-pix', self.backend,
+                                           np.concatenate([part['samples'] for part in parts]), mode)))
+        if digits is not None:
+            bounds = np.cumsum([len(job.parts) for job in fill])[:-1]
+            for job, numbers, scores, certainty in zip(fill, *[np.split(r, bounds) for r in digits.result()]):
+                h, w = job.reader.get_lines()
+                job.puzzle = FillAPixContainer((h - 1, w - 1), from_file=False, backend=self.backend)
+                job.puzzle.insert_numbers(numbers, scores, certainty)
+                job.reader.store(job.puzzle)
+        for parts, future in dots:
+            bounds = np.cumsum([len(part['unsure']) for part in parts])[:-1]
+            for part, numbers, certainty in zip(parts, *[np.split(r, bounds) for r in future.result()]):
+                part['numbers'][part['unsure']] = numbers
+                part['certainty'][part['unsure']] = certainty
+        for job in sym:
+            job.puzzle = job.reader.insert_parts(job.parts)
+        for job in jobs:
+            job.parts = job.reader = None
+            job.puzzle.region = job.region
+
+    def solve(self, jobs):
+        """Stage solve: solves puzzles."""
+        for job in jobs:
+            job.solution, job.solved = submit(self.solve_pool, solve_puzzle, job.kind, job.puzzle).result()
+
+    def write(self, jobs):
+        """Stage write: writes results of jobs."""
+        for job in jobs:
+            self.output.write(json.dumps(job.result()) + '\n')
+        self.output.flush()
+
+
+def main(argv=None):
+    """Runs pipeline with arguments from command line, throughput of stages is printed to standard error."""
+    parser = argparse.ArgumentParser(description='Reads and solves images of puzzles.')
+    parser.add_argument('paths', nargs='+', help='images or folders with images, - to read paths from standard input')
+    parser.add_argument('-o', '--output', help='file for results (one line of JSON for every image), '
+                                               'standard output if not given')
+    parser.add_argument('--kind', choices=sorted(KINDS), help='kind of puzzle of images whose path tells nothing')
+    parser.add_argument('--backend', default='two-pass', choices=sorted(classifier.BACKENDS))
+    parser.add_argument('--max-size', type=int, default=1024, help='bigger images are reduced')
+    parser.add_argument('--cache', nargs='?', const='', help='use cache of puzzles read earlier (in given folder)')
+    parser.add_argument('--readers', type=int, default=2, help='threads reading files')
+    parser.add_argument('--decoders', type=int, default=2, help='threads decoding images')
+    parser.add_argument('--classifiers', type=int, default=1, help='processes classifying fragments')
+    parser.add_argument('--solvers', type=int, help='processes solving puzzles (number of processors by default)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='images classified together')
+    parser.add_argument('--pages', action='store_true', help='images are pages with many puzzles')
+    args = parser.parse_args(argv)
+
+    paths = read_paths(sys.stdin) if args.paths == ['-'] else args.paths
+    cache = PuzzleCache(args.cache or None) if args.cache is not None else None
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        pipeline = Pipeline(output, args.backend, args.max_size, cache, args.kind, args.readers, args.decoders,
+                            args.classifiers, args.solvers, args.batch_size, pages=args.pages)
+        start = time.time()
+        count = pipeline.run(find_images(paths))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write('{} images in {:.1f} s\n{}\n'.format(count, time.time() - start, pipeline.report()))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,23 @@ import numpy as np
 from numpy.testing import assert_array_equal
 import unittest
 import common.misc as cm
+from common.geometry import Geometry
+import common.kernels as ck
+from common.imageops import count_ink, cut_cells, get_centre_deviation, get_profile, get_profile_lines, refine_lines, \
+    scale_lines
+import copy
+import cv2
+import io
+import os
+import pickle
+import tempfile
+from classifiers import classifier
+from classifiers.template import TemplateClassifier
+from common_tests.images import grid_image
+from symapix.imageops.reader import SymAPixReader
+from symapix.puzzle.container import Container, cluster_colors
+from symapix.puzzle.generator import Generator
+from symapix.solver.solver import SymAPixSolver
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
@@ -33,3 +50,296 @@ class TestSymmetricPoint(unittest.TestCase):
         """Different dots."""
         for d, w, a in zip(self.walls, self.dots, self.answers):
             self.assertEqual(cm.symmetric_point(w[0], w[1], d[0], d[1]), a)
+
+
+class TestGeometry(unittest.TestCase):
+    """Tests for geometry of board"""
+
+    def setUp(self):
+        self.geometry = Geometry((7, 9))
+        self.points = [[0, 0], [2, 3], [3, 4], [1, 1], [6, 8], [-1, 5]]
+
+    def test_shared(self):
+        """Boards of the same shape share geometry."""
+        self.assertIs(Geometry((7, 9)), self.geometry)
+        self.assertIsNot(Geometry((9, 7)), self.geometry)
+
+    def test_pickle(self):
+        """Geometry is shared also after pickling and copying, solver with it can be copied."""
+        self.assertIs(pickle.loads(pickle.dumps(self.geometry)), self.geometry)
+        self.assertIs(copy.deepcopy(self.geometry), self.geometry)
+        solver = SymAPixSolver(None)
+        solver.set_puzzle(np.array([[0, 0, 0], [0, 1, 0], [0, 0, 0]]))
+        solver.solve()
+        copied = copy.deepcopy(solver)
+        self.assertIs(copied.geometry, solver.geometry)
+        assert_array_equal(pickle.loads(pickle.dumps(solver)).solution, solver.solution)
+
+    def test_relations(self):
+        """Relations are the same as given by common.misc."""
+        g = self.geometry
+        for x, y in self.points:
+            self.assertEqual([list(p) for p in g.frame(x, y)], cm.define_frame(x, y))
+            self.assertEqual([list(p) for p in g.block(x, y)], cm.define_block(x, y))
+            self.assertEqual([list(p) for p in g.adjacent(x, y)], cm.adjacent_squares(x, y))
+            self.assertEqual([list(p) for p in g.next_to(x, y)], cm.squares_next_to(x, y))
+            self.assertEqual(g.frame_indices(x, y).tolist(), [g.index(*p) for p in g.frame(x, y)])
+            self.assertEqual(g.block_indices(x, y).tolist(), [g.index(*p) for p in g.block(x, y)])
+            self.assertEqual(g.position(g.index(x, y)), (x, y))
+            self.assertEqual(g.is_inside(x, y), 0 <= x < 7 and 0 <= y < 9)
+        self.assertEqual(g.wall_between(2, 2, 2, 4), (2, 3))
+        self.assertEqual(g.wall_between(0, 4, 2, 4), (1, 4))
+        self.assertEqual(cm.wall_between(0, 4, 2, 4), [1, 4])
+
+    def test_mirrors(self):
+        """Padded board has one line around board, mirrors outside of it are dropped."""
+        g = self.geometry
+        self.assertEqual(g.padded_shape, (9, 11))
+        points = [(x, y) for x in range(-1, 8) for y in range(-1, 10)]
+        indices = np.array([g.index(x, y) for x, y in points])
+        for x, y in [(0, 0), (1, 1), (3, 4), (6, 8), (5, 1)]:
+            mirrors, valid = g.mirror_indices(x, y, indices)
+            for (a, b), k, m, v in zip(points, indices.tolist(), mirrors.tolist(), valid.tolist()):
+                expected = cm.symmetric_point(x, y, a, b)
+                self.assertEqual(v, -1 <= expected[0] <= 7 and -1 <= expected[1] <= 9)
+                self.assertEqual(g.mirror_index(k, g.index(x, y)), m if v else None)
+                if v:
+                    self.assertEqual(list(g.position(m)), list(expected))
+
+
+class TestKernels(unittest.TestCase):
+    """Tests for kernels of board operations"""
+
+    def setUp(self):
+        np.random.seed(0)
+        self.board = np.random.randint(-1, 2, (6, 7)).astype(np.int8)
+        self.solver_board = np.zeros((7, 9), np.int8)
+        self.solver_board[:, [3, 5]] = 1
+        self.solver_board[3, :3] = 1
+
+    def test_hood_counts(self):
+        """Counts are the same as counted field by field."""
+        counts = ck.hood_counts_numpy(self.board, 1)
+        for i in range(6):
+            for j in range(7):
+                self.assertEqual(counts[i, j], np.sum(self.board[max(0, i - 1): i + 2, max(0, j - 1): j + 2] == 1))
+
+    def test_flood(self):
+        """Squares separated by walls are not reached."""
+        g = Geometry(self.solver_board.shape)
+        padded = np.zeros(g.padded_shape, np.int8)
+        top, left = g.margin
+        padded[top - 1: top + 8, left - 1: left + 10] = 1
+        padded[top: top + 7, left: left + 9] = self.solver_board
+        reached = [g.position(k) for k in ck.flood_numpy(padded.reshape(-1), [g.index(6, 0)], g.stride)]
+        self.assertEqual(reached, [(4, 0), (4, 2), (6, 0), (6, 2)])
+        reached = ck.flood_numpy(padded.reshape(-1), [g.index(0, 4), g.index(0, 8)], g.stride)
+        self.assertEqual(len(reached), 12)
+
+    def test_wall_counts(self):
+        """Walls inside of set have 2, walls on its boundary 1."""
+        squares = np.array([[True, True], [False, True]])
+        assert_array_equal(ck.wall_counts_numpy(squares), [[0, 2, 0], [1, 0, 2], [0, 1, 0]])
+
+    @unittest.skipIf(ck.numba is None, 'numba is not installed')
+    def test_numba(self):
+        """Compiled kernels give the same results as NumPy ones."""
+        assert_array_equal(ck.hood_counts_numba(self.board, -1), ck.hood_counts_numpy(self.board, -1))
+        squares = self.board[:, :5] > 0
+        assert_array_equal(ck.wall_counts_numba(squares), ck.wall_counts_numpy(squares))
+        g = Geometry(self.solver_board.shape)
+        padded = np.ones(g.padded_shape, np.int8)
+        top, left = g.margin
+        padded[top: top + 7, left: left + 9] = self.solver_board
+        reach, queue = ck.flood_buffers(padded.size)
+        for squares in [[(0, 0)], [(6, 0)], [(0, 4), (0, 8), (0, 4)]]:
+            seeds = np.array([g.index(*p) for p in squares], np.int64)
+            assert_array_equal(ck.flood_numba(padded.reshape(-1), seeds, g.stride, reach, queue),
+                               ck.flood_numpy(padded.reshape(-1), seeds, g.stride))
+            self.assertFalse(reach.any())
+
+
+class TestModels(unittest.TestCase):
+    """Tests for loading classifiers"""
+
+    def test_generation(self):
+        """Generating puzzle does not load any classifier."""
+        loaded = set(classifier.models)
+        Generator().generate(5, 5, 2, seed=0)
+        self.assertEqual(set(classifier.models), loaded)
+
+    def test_files(self):
+        """Files of classifiers are found independently of working directory."""
+        for name in classifier.FILES:
+            f = classifier.get(name)
+            self.assertTrue(len(f.read(1)) == 1)
+            f.close()
+        self.assertRaises(KeyError, classifier.load, 'circle')
+
+
+class TestTemplates(unittest.TestCase):
+    """Tests for nearest-template classifier"""
+
+    def setUp(self):
+        np.random.seed(0)
+        dark = np.random.randint(0, 60, (5, 16))
+        light = np.random.randint(190, 255, (3, 16))
+        self.model = TemplateClassifier(np.vstack([dark, light]), [0] * 5 + [1] * 3, [0, 100], gamma=0.0001)
+
+    def test_classify(self):
+        """Samples get class of closest templates."""
+        samples = np.array([[30] * 16, [220] * 16, [255] * 16])
+        labels, scores = classifier.classify(self.model, samples)
+        assert_array_equal(labels, [0, 100, 100])
+        self.assertEqual(scores.shape, (3, 2))
+
+    def test_save(self):
+        """Saved classifier gives the same scores."""
+        f = io.BytesIO()
+        self.model.save(f)
+        f.seek(0)
+        samples = np.random.randint(0, 255, (4, 16))
+        assert_array_equal(TemplateClassifier.load(f).decision_function(samples), self.model.decision_function(samples))
+
+    def test_confidence(self):
+        """Confidence is margin of scores relative to margin of classifier."""
+        self.model.margin = 2.0
+        labels, scores, confidence = classifier.classify_with_confidence(self.model, np.array([[30] * 16, [125] * 16]))
+        sorted_scores = np.sort(scores, axis=1)
+        assert_array_equal(confidence, (sorted_scores[:, 1] - sorted_scores[:, 0]) / 2.0)
+        self.assertGreater(confidence[0], confidence[1])
+
+
+class TestProfileLines(unittest.TestCase):
+    """Tests for detecting lines of grid in profiles of image"""
+
+    def setUp(self):
+        self.lines = list(range(2, 245, 24))
+        self.img = np.full((245, 245), 255, np.uint8)
+        for k in self.lines:
+            cv2.line(self.img, (0, k), (244, k), 0, 1)
+            cv2.line(self.img, (k, 0), (k, 244), 0, 1)
+        cv2.putText(self.img, '3', (66, 58), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 2)
+
+    def test_grid(self):
+        """Lines of axis-aligned grid are found at their positions."""
+        rho_horizontal, rho_vertical = get_profile_lines(self.img)
+        self.assertEqual(rho_horizontal, self.lines)
+        self.assertEqual(rho_vertical, self.lines)
+
+    def test_rotated(self):
+        """Rotated grid is not accepted (Hough transformation is used instead)."""
+        rotation = cv2.getRotationMatrix2D((122, 122), 5, 1)
+        rotated = cv2.warpAffine(self.img, rotation, (245, 245), borderValue=255)
+        self.assertEqual(get_profile_lines(rotated), ([], []))
+
+    def test_scaled(self):
+        """Lines found on reduced image are moved to their positions on full image."""
+        small = np.ascontiguousarray(self.img[::2, ::2])
+        rho_horizontal, rho_vertical = get_profile_lines(small)
+        rho_horizontal = refine_lines(get_profile(self.img, 0), scale_lines(rho_horizontal, 2), 2)
+        rho_vertical = refine_lines(get_profile(self.img, 1), scale_lines(rho_vertical, 2), 2)
+        self.assertEqual(rho_horizontal, self.lines)
+        self.assertEqual(rho_vertical, self.lines)
+
+
+class TestCutCells(unittest.TestCase):
+    """Tests for cutting all cells of image at once"""
+
+    def test_resized(self):
+        """Cells are the same as cut and resized one by one (up to rounding)."""
+        np.random.seed(0)
+        img = np.random.randint(0, 255, (60, 50)).astype(np.uint8)
+        rows, cols = [(2, 20), (21, 45), (46, 60)], [(0, 10), (12, 50)]
+        cells = cut_cells(img, rows, cols, (20, 15))
+        self.assertEqual(cells.shape, (6, 15, 20))
+        expected = np.array([cv2.resize(img[a: b, c: d], (20, 15)) for a, b in rows for c, d in cols])
+        self.assertLessEqual(np.abs(cells.astype(int) - expected).max(), 4)
+
+
+class TestPrefilter(unittest.TestCase):
+    """Tests for finding empty fragments without classifiers"""
+
+    def setUp(self):
+        self.blank = np.full((20, 20), 250, np.uint8)
+        self.line = self.blank.copy()
+        self.line[9: 11, :] = 30
+        self.cross = self.line.copy()
+        self.cross[:, 9: 11] = 30
+        self.dot = self.line.copy()
+        cv2.circle(self.dot, (10, 10), 5, 120, -1)
+        self.side = self.blank.copy()
+        cv2.circle(self.side, (19, 10), 5, 30, -1)
+
+    def test_deviation(self):
+        """Lines and things at sides are empty, dot in the centre is not."""
+        deviation = get_centre_deviation(np.array([self.blank, self.line, self.cross, self.side, self.dot]))
+        assert_array_equal(deviation[:3], [0, 0, 0])
+        self.assertLess(deviation[3], 10)
+        self.assertGreater(deviation[4], 20)
+
+    def test_ink(self):
+        """Dark pixels are counted."""
+        assert_array_equal(count_ink(np.array([self.blank, self.line])), [0, 40])
+
+
+class TestFindDots(unittest.TestCase):
+    """Tests for finding all dots of image in one pass"""
+
+    def setUp(self):
+        # dots in square (2, 4) and on horizontal line (5, 8)
+        img = grid_image([((110, 70), (0, 0, 0)), ((190, 130), (0, 0, 255))])
+        cv2.circle(img, (170, 90), 12, (0, 0, 0), 2)     # crossing (3, 7), not filled
+        cv2.rectangle(img, (60, 184), (88, 196), (0, 0, 0), -1)  # not a dot
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'grid.png')
+        cv2.imwrite(self.filename, img)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_positions(self):
+        """Filled and empty round dots are found, blobs of other shape are only to be checked by classifiers."""
+        dots, check = SymAPixReader(self.filename, 'template').find_dots()
+        self.assertEqual(dots, {(2, 4), (5, 8), (3, 7)})
+        self.assertIn((8, 2), check)
+        self.assertEqual(set(x for x, y in check), {8})
+        self.assertFalse(dots & check)
+
+    def test_colors(self):
+        """Dots of the same color (also empty ones, by their rims) get one number, other colors other numbers."""
+        board = SymAPixReader(self.filename, 'template').create_puzzle().get_board()
+        self.assertEqual(board.shape, (11, 11))
+        self.assertEqual(board[2, 4], board[3, 7])
+        self.assertNotEqual(board[2, 4], board[5, 8])
+        self.assertGreater(board[5, 8], 0)
+
+
+class TestClusterColors(unittest.TestCase):
+    """Tests for numbering colors of all dots at once"""
+
+    def setUp(self):
+        self.colors = [[255, 255, 255], [14, 21, 255], [244, 244, 244], [0, 0, 0], [3, 24, 253], [250, 250, 250]]
+
+    def test_groups(self):
+        """Close colors are one group, with median color of group."""
+        groups, means = cluster_colors(self.colors)
+        assert_array_equal(groups, [0, 1, 0, 2, 1, 0])
+        assert_array_equal(means, [[250, 250, 250], [8, 22, 254], [0, 0, 0]])
+
+    def test_order(self):
+        """Groups do not depend on order of colors, only their numbers do."""
+        for order in [[3, 2, 1, 0, 5, 4], [5, 4, 3, 2, 1, 0]]:
+            groups = cluster_colors([self.colors[k] for k in order])[0]
+            same = groups[:, None] == groups[None, :]
+            expected = cluster_colors(self.colors)[0][order]
+            assert_array_equal(same, expected[:, None] == expected[None, :])
+
+    def test_board(self):
+        """Dots inserted in many calls are numbered by groups of all colors found so far."""
+        puzzle = Container((2, 2))
+        puzzle.insert_numbers([1, 0, 1, 1], self.colors[:4], [(0, 0), (0, 1), (1, 0), (1, 1)], 0, assign=False)
+        puzzle.insert_numbers([1], self.colors[4:5], [(1, 1)], 3)
+        assert_array_equal(puzzle.get_board()[::2, ::2], [[1, 0], [1, 2]])
+        self.assertEqual(puzzle.get_board()[1, 1], 3)
+        self.assertEqual(len(puzzle.get_colors()), 3)
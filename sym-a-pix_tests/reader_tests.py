@@ -0,0 +1,72 @@
+import os
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from classifiers import classifier
+from symapix.imageops.reader import SymAPixReader
+from symapix.solver.solver import SymAPixSolver
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+IMAGES = os.path.join(TESTS, '..', 'sym-a-pix_images')
+
+
+def svm_available():
+    """Checks if SVM classifiers can be loaded (they need sklearn)."""
+    try:
+        classifier.load('square', 'svm')
+    except Exception:
+        return False
+    return True
+
+
+class TestBundledImages(unittest.TestCase):
+    """Tests for reading bundled images: dots are the same as read by the first version of reader
+    (bundled_boards.npz), dots of one color have one color there too, and puzzles can be solved.
+    Boards read by the first version are corrected in two places: image3 - dot at 10, 12 was given its own color
+    (244, 244, 244, white like color 2), image4 - dot at 1, 14 was not found (puzzle could not be solved)."""
+
+    def setUp(self):
+        self.boards = np.load(os.path.join(TESTS, 'bundled_boards.npz'))
+
+    def check(self, backend):
+        for name in sorted(self.boards.files):
+            puzzle = SymAPixReader(os.path.join(IMAGES, name + '.jpg'), backend).create_puzzle()
+            board, expected = puzzle.get_board(), self.boards[name]
+            assert_array_equal(board > 0, expected > 0, err_msg=name)
+            # colors may be numbered differently
+            pairs = set(zip(board[board > 0].tolist(), expected[expected > 0].tolist()))
+            self.assertEqual(len(pairs), len(set(a for a, _ in pairs)), name)
+            self.assertEqual(len(pairs), len(set(b for _, b in pairs)), name)
+            solver = SymAPixSolver(puzzle)
+            solver.solve()
+            self.assertTrue(solver.is_solved(), name)
+
+    def test_template(self):
+        """Template classifiers read the same dots as the first version of reader."""
+        self.check('template')
+
+    @unittest.skipUnless(svm_available(), 'SVM classifiers cannot be loaded')
+    def test_svm(self):
+        """SVM classifiers read the same dots as the first version of reader."""
+        self.check('svm')
+
+    def test_two_pass(self):
+        """Default backend reads boards also when SVM classifiers cannot be loaded."""
+        self.check('two-pass')
+
+    @unittest.skipUnless(svm_available(), 'SVM classifiers cannot be loaded')
+    def test_backends_agree(self):
+        """Template and SVM classifiers give the same boards."""
+        for name in sorted(self.boards.files):
+            filename = os.path.join(IMAGES, name + '.jpg')
+            boards = [SymAPixReader(filename, backend).create_puzzle().get_board() for backend in ['template', 'svm']]
+            assert_array_equal(boards[0], boards[1], err_msg=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
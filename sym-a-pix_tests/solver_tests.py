@@ -2,6 +2,7 @@ import unittest
 import numpy as np
 
 from symapix.solver.solver import SymAPixSolver
+from symapix.solver.bitboard import BitBoard
 from common.misc import symmetric_point
 
 __author__ = 'Adriana Borowa'
@@ -55,3 +56,208 @@ class TestIsInside(unittest.TestCase):
                  '\n0001111111000\n0001111111000\n0000000000000\n0000000000000' \
                  '\n0000000000000\n'
         self.assertEqual(txt, answer)
+
+
+class TestSolve(unittest.TestCase):
+    """Tests for solving whole puzzle."""
+    def setUp(self):
+        self.solver = SymAPixSolver(None)
+        self.arr = np.array([[0, 0, 0, 0, 0],
+                             [0, 1, 0, 0, 0],
+                             [0, 0, 0, 0, 2],
+                             [0, 0, 0, 0, 0],
+                             [0, 2, 0, 0, 0]])
+
+    def test_solved(self):
+        """Puzzle is solved and every square belongs to block of right dot."""
+        self.solver.set_puzzle(self.arr)
+        self.solver.solve()
+        self.assertTrue(self.solver.is_solved())
+        self.assertEqual(self.solver.solution[::2, ::2].tolist(), [[1, 1, 2], [1, 1, 2], [2, 2, 2]])
+
+    def test_schedule_finished(self):
+        """After solving no blocks wait to be checked and closed dots are remembered."""
+        self.solver.set_puzzle(self.arr)
+        self.solver.solve()
+        self.assertFalse(self.solver.tracking)
+        self.assertEqual(self.solver.dirty, set())
+        self.assertIn((1, 1), self.solver.closed_dots)
+
+
+class TestCountSolutions(unittest.TestCase):
+    """Tests for counting solutions of puzzle."""
+    def setUp(self):
+        self.solver = SymAPixSolver(None)
+
+    def test_unique(self):
+        """Puzzle with one solution is unique."""
+        self.solver.set_puzzle(np.array([[0, 0, 0, 0, 0],
+                                         [0, 1, 0, 0, 0],
+                                         [0, 0, 0, 0, 2],
+                                         [0, 0, 0, 0, 0],
+                                         [0, 2, 0, 0, 0]]))
+        self.assertEqual(self.solver.count_solutions(), 1)
+
+    def test_two_solutions(self):
+        """Both solutions are counted, counting stops at limit."""
+        self.solver.set_puzzle(np.array([[0, 0, 1, 0, 0],
+                                         [0, 0, 0, 0, 0],
+                                         [0, 0, 1, 0, 0],
+                                         [0, 0, 0, 0, 0],
+                                         [0, 0, 1, 0, 0]]))
+        self.assertEqual(self.solver.count_solutions(), 2)
+        self.assertEqual(self.solver.count_solutions(limit=1), 1)
+
+    def test_no_solution(self):
+        """Puzzle whose dots cannot share board has no solution."""
+        self.solver.set_puzzle(np.array([[1, 0, 0],
+                                         [0, 0, 0],
+                                         [0, 0, 1]]))
+        self.assertEqual(self.solver.count_solutions(), 0)
+
+
+class TestResume(unittest.TestCase):
+    """Tests for resuming solver after new dot was added."""
+    def setUp(self):
+        self.arr = np.array([[0, 0, 0, 0, 0],
+                             [0, 1, 0, 0, 0],
+                             [0, 0, 0, 0, 2],
+                             [0, 0, 0, 0, 0],
+                             [0, 2, 0, 0, 0]])
+
+    def test_same_as_solve(self):
+        """Resuming after dot was added gives the same solution as solving from scratch."""
+        solver = SymAPixSolver(None)
+        solver.set_puzzle(self.arr)
+        solver.solve()
+        resumed = SymAPixSolver(None)
+        resumed.set_puzzle(self.arr.copy())
+        resumed.puzzle[4, 1] = 0
+        resumed.solve()
+        resumed.puzzle[4, 1] = 2
+        resumed.resume()
+        self.assertTrue(resumed.is_solved())
+        self.assertEqual(resumed.solution.tolist(), solver.solution.tolist())
+
+
+class TestUserSolution(unittest.TestCase):
+    """Tests for user's changes of walls."""
+    def setUp(self):
+        self.solver = SymAPixSolver(None)
+        self.solver.set_puzzle(np.array([[0, 0, 0, 0, 0],
+                                         [0, 1, 0, 0, 0],
+                                         [0, 0, 0, 0, 2],
+                                         [0, 0, 0, 0, 0],
+                                         [0, 2, 0, 0, 0]]))
+        self.solver.solve()
+        self.solver.clear_user_solution()
+
+    def test_solved_by_user(self):
+        """Puzzle is solved by user once all walls of solution are set."""
+        for x, y in [[0, 3], [2, 3], [3, 0], [3, 2], [4, 3]]:
+            self.assertFalse(self.solver.is_solved_by_user())
+            self.solver.set_user_value(x, y, 1)
+        self.assertTrue(self.solver.is_solved_by_user())
+        self.assertEqual(self.solver.get_color_board()[::2, ::2].tolist(), [[1, 1, 2], [1, 1, 2], [2, 2, 2]])
+
+    def test_only_closed_block_filled(self):
+        """Only blocks closed by user's walls are colored."""
+        self.solver.set_user_value(0, 3, 1)
+        self.solver.set_user_value(2, 3, 1)
+        self.solver.set_user_value(3, 0, 1)
+        self.assertEqual(self.solver.get_color_board()[::2, ::2].tolist(), [[0, 0, 0], [0, 0, 0], [0, 0, 0]])
+        self.solver.set_user_value(3, 2, 1)
+        self.assertEqual(self.solver.get_color_board()[::2, ::2].tolist(), [[1, 1, 0], [1, 1, 0], [0, 0, 0]])
+
+    def test_mistake(self):
+        """Wall cutting block of dot is reported as mistake, until it is removed."""
+        self.solver.set_user_value(0, 3, 1)
+        self.assertEqual(self.solver.check_user_solution(), (-1, -1))
+        self.solver.set_user_value(1, 2, 1)
+        self.assertEqual(self.solver.check_user_solution(), (0, 1))
+        self.solver.set_user_value(1, 2, 0)
+        self.assertEqual(self.solver.check_user_solution(), (-1, -1))
+
+
+class TestBorders(unittest.TestCase):
+    """Tests for reading points outside of board."""
+    def setUp(self):
+        self.solver = SymAPixSolver(None)
+        self.solver.set_puzzle(np.array([[0, 0, 0],
+                                         [0, 1, 0],
+                                         [0, 0, 0]]))
+
+    def test_border_is_wall(self):
+        """Points just outside of board are walls, points further away are not."""
+        for x, y in [[-1, 0], [3, 2], [0, -1], [2, 3], [-1, -5], [7, 3]]:
+            self.assertTrue(self.solver.is_wall(x, y))
+            self.assertTrue(self.solver.is_wall(x, y, user=True))
+        for x, y in [[-2, 0], [5, 5], [0, 1]]:
+            self.assertFalse(self.solver.is_wall(x, y))
+
+    def test_inside(self):
+        """Only points of board are inside."""
+        self.assertTrue(self.solver.is_inside(2, 2))
+        for x, y in [[-1, 0], [3, 0], [0, 3], [-4, -4]]:
+            self.assertFalse(self.solver.is_inside(x, y))
+
+    def test_solution_shape(self):
+        """Solution keeps shape of puzzle and is read by is_wall."""
+        self.solver.solution[0, 1] = 1
+        self.assertEqual(self.solver.solution.shape, (3, 3))
+        self.assertTrue(self.solver.is_wall(0, 1))
+
+
+class TestMirrorWalls(unittest.TestCase):
+    """Tests for copying walls to their mirror images."""
+    def setUp(self):
+        self.solver = SymAPixSolver(None)
+        self.solver.set_puzzle(np.array([[0, 0, 0, 0, 0],
+                                         [0, 0, 0, 0, 0],
+                                         [0, 0, 1, 0, 0],
+                                         [0, 0, 0, 0, 0],
+                                         [0, 0, 0, 0, 0]]))
+
+    def test_copied_both_ways(self):
+        """Walls are copied to their mirror images in both directions."""
+        self.solver.solution[1, 0] = 1
+        self.solver.solution[2, 3] = 1
+        walls = [self.solver.index(*w) for w in [[1, 0], [3, 4], [2, 1], [2, 3]]]
+        self.assertEqual(self.solver.mirror_walls(2, 2, walls), 2)
+        self.assertEqual(self.solver.solution[3, 4], 1)
+        self.assertEqual(self.solver.solution[2, 1], 1)
+
+    def test_outside_not_changed(self):
+        """Walls whose mirror images are outside of board are not copied."""
+        self.solver.solution[0, 3] = 1
+        self.assertEqual(self.solver.mirror_walls(0, 0, [self.solver.index(0, 3)]), 0)
+        self.assertFalse(self.solver.is_wall(0, -3))
+
+
+class TestBitBoard(unittest.TestCase):
+    """Tests for regions of squares kept as bit masks."""
+    def setUp(self):
+        solution = np.zeros((5, 5), int)
+        for x, y in [[0, 3], [2, 3], [3, 0], [3, 2], [4, 3]]:
+            solution[x, y] = 1
+        self.bits = BitBoard(solution)
+
+    def test_flood(self):
+        """Flood stops at walls, region is closed only if walls surround it."""
+        region = self.bits.flood(self.bits.bit(0, 0))
+        self.assertEqual(self.bits.squares(region), [[0, 0], [0, 2], [2, 0], [2, 2]])
+        self.assertTrue(self.bits.is_closed(region))
+        self.assertFalse(self.bits.is_closed(self.bits.bit(0, 0)))
+
+    def test_set_wall(self):
+        """New walls split region."""
+        self.bits.set_wall(0, 1, True)
+        self.bits.set_wall(2, 1, True)
+        self.assertEqual(self.bits.squares(self.bits.flood(self.bits.bit(0, 0))), [[0, 0], [2, 0]])
+
+    def test_mirror(self):
+        """Region symmetric around dot is its own mirror image."""
+        region = self.bits.flood(self.bits.bit(0, 0))
+        self.assertEqual(self.bits.mirror(region, 1, 1), region)
+        self.assertNotEqual(self.bits.mirror(region, 2, 2), region)
+        self.assertEqual(self.bits.mirror(self.bits.bit(0, 0), 1, 1), self.bits.bit(2, 2))
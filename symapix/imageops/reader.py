@@ -2,88 +2,235 @@
 """ Sym-a-pix: Processing operation on images - reading puzzle from image.
 """
 
-import cv2
+import numpy as np
 
-from common.imageops import get_line_positions
-from symapix.puzzle.container import Container
+from classifiers import classifier
+from common.imageops import cut_cells, get_blobs, load_grid_image
+from symapix.puzzle.container import CLASSIFIERS, SAMPLE_SIZE, Container
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
 
+SHIFTS = [(0, 0), (1, 0), (0, 1), (1, 1)]  # shifts of fragments in x and y, for every mode
+OFF_CENTRE = 0.3    # largest distance of centre of certain dot from its position (1 - distance between positions)
+DOT_SIZE = (0.7, 1.3)  # smallest and largest size of certain dot, relative to median size of dots
+ROUNDNESS = 1.3     # largest ratio of longer and shorter side of certain dot
+
 
 class SymAPixReader:
     """Reader for sym-a-pix puzzle."""
 
-    def __init__(self, filename):
+    def __init__(self, filename, backend='two-pass', max_size=1024, cache=None):
         """ Reads puzzle from picture.
-        :param filename: name of file with image of puzzle.
+        :param filename: name of file with image of puzzle (or bytes of file already read, or image already decoded).
+        :param backend: kind of classifiers: svm, template (faster, NumPy only) or two-pass (see classifier)
+        :param max_size: bigger images are reduced (lines are detected on smaller image), None - never reduced
+        :param cache: PuzzleCache (see common.cache) with puzzles read earlier, None - puzzle is always read;
+        if image is found in it, image is read only if it is needed (see load_image)
         :return: None
         """
-        self.img_rgb = cv2.imread(str(filename), cv2.IMREAD_COLOR)
-        if self.img_rgb is None:
-            raise IOError('File not found')
-        self.img_gray = cv2.cvtColor(self.img_rgb, cv2.COLOR_BGR2GRAY)
+        self.backend = backend
+        self.filename = filename
+        self.max_size = max_size
+        self.img_rgb = self.img_gray = None
+        self.cache, self.key, self.cached = cache, None, None
+        if cache is not None:
+            self.key = cache.key(filename, 'sym-a-pix', backend, max_size, classifier.version(CLASSIFIERS, backend))
+            self.cached = cache.get(self.key)
+        if self.cached is not None:
+            self.rho_horizontal = self.cached['rho_horizontal'].tolist()
+            self.rho_vertical = self.cached['rho_vertical'].tolist()
+        else:
+            self.load_image()
         self.img_edges = None
-        self.rho_vertical = []
-        self.rho_horizontal = []
         # self.count = 0
 
-    def create_puzzle(self):
+    def load_image(self):
+        """
+        Reads image and detects lines, if image was not read yet (puzzle was found in cache, or image was freed).
+        :return: None
+        """
+        if self.img_gray is None:
+            self.img_rgb, self.img_gray, self.rho_horizontal, self.rho_vertical = \
+                load_grid_image(self.filename, 100, self.max_size)
+
+    def create_puzzle(self, find_dots=True):
+        """
+        Creates new puzzle. Dots are found in one pass over image (see find_dots) and only fragments of image
+        with dots whose position is not certain are classified. If find_dots is False, image is cut along lines
+        into fragments and all of them are classified: all fragments of one kind (windows, horizontal lines,
+        vertical lines, crossings) at once.
+        Puzzle found in cache is returned without reading image, new puzzle is stored in cache
+        (only if dots were found with find_dots).
+        :param find_dots: False if all fragments should be classified
+        :return: puzzle
+        """
+        h, w = len(self.rho_horizontal) - 1, len(self.rho_vertical) - 1
+        puzzle = Container((h, w), self.backend)
+        if find_dots and self.cached is not None:
+            puzzle.set_puzzle(self.cached['board'])
+            puzzle.confidence = self.cached['confidence'].copy()
+            puzzle.colors = list(self.cached['colors'])
+            dots = np.argwhere(puzzle.puzzle > 0)
+            puzzle.dot_colors = dict(((int(x), int(y)), puzzle.colors[puzzle.puzzle[x, y] - 1]) for x, y in dots)
+            return puzzle
+        parts = self.cut_parts(find_dots)
+        for part in parts:
+            if len(part['unsure']):
+                part['numbers'][part['unsure']], part['certainty'][part['unsure']] = \
+                    puzzle.classify_samples(part['samples'], part['mode'])
+        return self.insert_parts(parts, puzzle, store=find_dots)
+
+    def cut_parts(self, find_dots=True):
+        """
+        Cuts fragments of image to be classified, for every part of puzzle (see create_puzzle).
+        :param find_dots: False if all fragments should be classified
+        :return: list of parts, dictionaries with: mode, positions x, y of fragments (cells), colors of their centres
+        (colors, read only for fragments with certain dots and fragments to be classified), numbers and confidence
+        known without classifiers (numbers, certainty), indices of fragments to be classified (unsure) and these
+        fragments, resized (samples)
         """
-        Creates new puzzle. Detects lines on image then cuts smaller images and passes them to container.
+        self.load_image()
+        h, w = len(self.rho_horizontal) - 1, len(self.rho_vertical) - 1
+        dots, check = self.find_dots() if find_dots else (None, None)
+        parts = []
+        # normal, shifted in x, shifted in y, shifted in both
+        for mode, (x0, y0) in enumerate(SHIFTS):
+            rows = [self.row_bounds(x, x0) for x in range(x0, h)]
+            cols = [self.col_bounds(y, y0) for y in range(y0, w)]
+            if not rows or not cols:
+                continue
+            cells = [(x, y) for x in range(x0, h) for y in range(y0, w)]
+            if dots is None:
+                numbers = np.zeros(len(cells), int)
+                unsure = np.arange(len(cells))
+                samples = cut_cells(self.img_gray, rows, cols, SAMPLE_SIZE)
+            else:
+                numbers = np.array([int((2 * x - x0, 2 * y - y0) in dots) for x, y in cells])
+                unsure = np.array([k for k, (x, y) in enumerate(cells) if (2 * x - x0, 2 * y - y0) in check], int)
+                samples = np.concatenate([cut_cells(self.img_gray, [rows[cells[k][0] - x0]], [cols[cells[k][1] - y0]],
+                                                    SAMPLE_SIZE) for k in unsure]) if len(unsure) else None
+            # colors are read in centres of fragments, only where dot is certain or can be found by classifier
+            # (image is not kept until fragments are classified, see pipeline)
+            found = np.union1d(np.flatnonzero(numbers), unsure).astype(int)
+            xs, ys = np.array(cells, int).reshape(-1, 2)[found].T
+            centre_rows = np.array([i1 + (min(i2, self.img_rgb.shape[0]) - i1) // 2 for i1, i2 in rows])
+            centre_cols = np.array([j1 + (min(j2, self.img_rgb.shape[1]) - j1) // 2 for j1, j2 in cols])
+            colors = np.zeros((len(cells), 3), np.uint8)
+            colors[found] = self.img_rgb[centre_rows[xs - x0], centre_cols[ys - y0]]
+            parts.append({'mode': mode, 'cells': cells, 'colors': colors, 'numbers': numbers,
+                          'certainty': np.full(len(cells), np.inf), 'unsure': unsure, 'samples': samples})
+        return parts
+
+    def insert_parts(self, parts, puzzle=None, store=True):
+        """
+        Inserts classified parts of puzzle (see cut_parts) into puzzle and numbers colors of dots.
+        :param parts: parts of puzzle, with numbers and confidence of unsure fragments already classified
+        :param puzzle: puzzle, new one if None
+        :param store: False if puzzle should not be stored in cache
         :return: puzzle
         """
-        self.rho_horizontal, self.rho_vertical = get_line_positions(self.img_gray)
-        puzzle = Container((len(self.rho_horizontal) - 1, len(self.rho_vertical) - 1))
-        # normal
-        for x in range(len(self.rho_horizontal) - 1):
-            for y in range(len(self.rho_vertical) - 1):
-                puzzle.insert(self.cut_image(x, y, 0), x, y, 0)
-        # shifted in x
-        for x in range(1, len(self.rho_horizontal) - 1):
-            for y in range(len(self.rho_vertical) - 1):
-                puzzle.insert(self.cut_image(x, y, 1), x, y, 1)
-        # shifted in y
-        for x in range(len(self.rho_horizontal) - 1):
-            for y in range(1, len(self.rho_vertical) - 1):
-                puzzle.insert(self.cut_image(x, y, 2), x, y, 2)
-        # shifted in both
-        for x in range(1, len(self.rho_horizontal) - 1):
-            for y in range(1, len(self.rho_vertical) - 1):
-                puzzle.insert(self.cut_image(x, y, 3), x, y, 3)
+        if puzzle is None:
+            puzzle = Container((len(self.rho_horizontal) - 1, len(self.rho_vertical) - 1), self.backend)
+        for part in parts:
+            puzzle.insert_numbers(part['numbers'], part['colors'], part['cells'], part['mode'], assign=False,
+                                  confidence=part['certainty'])
+        puzzle.assign_colors()
+        if store and self.cache is not None:
+            self.cache.put(self.key, rho_horizontal=self.rho_horizontal, rho_vertical=self.rho_vertical,
+                           board=puzzle.get_board(), confidence=puzzle.confidence,
+                           colors=np.array(puzzle.colors, np.uint8).reshape(-1, 3))
         return puzzle
 
-    def cut_image(self, x, y, mode=0):
+    def find_dots(self):
+        """
+        Finds dots on whole image at once (see get_blobs) and moves them to the closest positions of board
+        (in doubled coordinates: squares, walls and crossings). Pieces of one dot (cut by removed lines)
+        are joined. Dot is certain if it is round, of usual size and close to its position; other blobs
+        (touching dots, digits, dirt) give all positions they cover, to be checked by classifiers.
+        :return: set of positions of certain dots, set of positions to be checked
+        """
+        self.load_image()
+        rho_h, rho_v = np.array(self.rho_horizontal, float), np.array(self.rho_vertical, float)
+        cell = min(np.median(np.diff(rho_h)), np.median(np.diff(rho_v)))
+        size = (2 * len(rho_h) - 3, 2 * len(rho_v) - 3)
+
+        def position(i, rho):
+            return 2 * np.interp(i, rho, np.arange(len(rho))) - 1
+
+        x, y, width, height = get_blobs(self.img_rgb, self.rho_horizontal, self.rho_vertical).T
+        keys = np.column_stack([np.rint(position(y + height / 2.0, rho_h)), np.rint(position(x + width / 2.0, rho_v))])
+        keys, group = np.unique(keys, axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        # pieces of one dot are joined: bounding box of all blobs with the same position
+        i1, j1 = np.full(len(keys), np.inf), np.full(len(keys), np.inf)
+        i2, j2 = np.full(len(keys), -np.inf), np.full(len(keys), -np.inf)
+        np.minimum.at(i1, group, y)
+        np.minimum.at(j1, group, x)
+        np.maximum.at(i2, group, y + height)
+        np.maximum.at(j2, group, x + width)
+        long_side, short_side = np.maximum(i2 - i1, j2 - j1), np.minimum(i2 - i1, j2 - j1)
+        # noise and remains of lines are thin
+        blob = (long_side >= 0.2 * cell) & (short_side >= 0.1 * cell)
+        if not blob.any():
+            return set(), set()
+        low, high = np.median(long_side[blob]) * np.array(DOT_SIZE)
+        u1, u2, v1, v2 = position(i1, rho_h), position(i2, rho_h), position(j1, rho_v), position(j2, rho_v)
+        u, v = (u1 + u2) / 2.0, (v1 + v2) / 2.0
+        x, y = np.rint(u), np.rint(v)
+        certain = (blob & (x >= 0) & (x < size[0]) & (y >= 0) & (y < size[1]) &
+                   (np.maximum(abs(u - x), abs(v - y)) <= OFF_CENTRE) &
+                   (low <= long_side) & (long_side <= high) & (long_side <= ROUNDNESS * short_side))
+        dots = set(zip(x[certain].astype(int).tolist(), y[certain].astype(int).tolist()))
+        check = set()
+        for k in np.flatnonzero(blob & ~certain):
+            check.update((a, b) for a in range(max(0, int(np.ceil(u1[k]))), min(size[0], int(np.floor(u2[k])) + 1))
+                         for b in range(max(0, int(np.ceil(v1[k]))), min(size[1], int(np.floor(v2[k])) + 1)))
+        return dots, check - dots
+
+    def row_bounds(self, x, shifted=0):
+        """
+        Rows of image cut for fragment of puzzle.
+        :param x: position
+        :param shifted: 1 if fragment is shifted in x (centred on line between x - 1 and x)
+        :return: first row and row after the last one
+        """
+        rho = self.rho_horizontal
+        if shifted:
+            return int(2 + (rho[x - 1] + rho[x]) / 2.0), int((rho[x] + rho[x + 1]) / 2.0 - 1)
+        return 2 + rho[x], rho[x + 1] - 1
+
+    def col_bounds(self, y, shifted=0):
+        """
+        Columns of image cut for fragment of puzzle.
+        :param y: position
+        :param shifted: 1 if fragment is shifted in y (centred on line between y - 1 and y)
+        :return: first column and column after the last one
+        """
+        rho = self.rho_vertical
+        if shifted:
+            return int(1 + (rho[y - 1] + rho[y]) / 2.0), int((rho[y] + rho[y + 1]) / 2.0 - 1)
+        return 2 + rho[y], rho[y + 1] - 1
+
+    def cut_image(self, x, y, mode=0, image=None):
         """ Cuts part of an image depending on position of lines.
         :param x: position
         :param y: position
         :param mode: mode=0 - cuts normally, mode=1 cuts shifted in x, mode=2 cuts shifted in y, mode=3 cuts shifted
         in x and y
+        :param image: image to be cut, rgb image if None
         :return: part of an image
         """
-        if mode == 0:
-            i1, i2 = 2 + self.rho_horizontal[x], self.rho_horizontal[x + 1] - 1
-            j1, j2 = 2 + self.rho_vertical[y], self.rho_vertical[y + 1] - 1
-        elif mode == 1:
-            assert (0 < x < len(self.rho_horizontal) - 1)
-            i1, i2 = 2 + (self.rho_horizontal[x - 1] + self.rho_horizontal[x]) / 2.0, \
-                         (self.rho_horizontal[x] + self.rho_horizontal[x + 1]) / 2.0 - 1
-            j1, j2 = 2 + self.rho_vertical[y], self.rho_vertical[y + 1] - 1
-        elif mode == 2:
-            assert (0 < y < len(self.rho_vertical) - 1)
-            i1, i2 = 2 + self.rho_horizontal[x], self.rho_horizontal[x + 1] - 1
-            j1, j2 = 1 + (self.rho_vertical[y - 1] + self.rho_vertical[y]) / 2.0, \
-                         (self.rho_vertical[y] + self.rho_vertical[y + 1]) / 2.0 - 1
-        elif mode == 3:
-            assert (0 < x < len(self.rho_horizontal) - 1 and 0 < y < len(self.rho_vertical) - 1)
-            i1, i2 = 2 + (self.rho_horizontal[x - 1] + self.rho_horizontal[x]) / 2.0, \
-                         (self.rho_horizontal[x] + self.rho_horizontal[x + 1]) / 2.0 - 1
-            j1, j2 = 1 + (self.rho_vertical[y - 1] + self.rho_vertical[y]) / 2.0, \
-                         (self.rho_vertical[y] + self.rho_vertical[y + 1]) / 2.0 - 1
-        else:
-            i1, i2, j1, j2 = 0, 0, 0, 0
-        i1, i2, j1, j2 = int(i1), int(i2), int(j1), int(j2)
-        return self.img_rgb[i1: i2, j1: j2]
+        if image is None:
+            self.load_image()
+            image = self.img_rgb
+        if mode not in range(len(SHIFTS)):
+            return image[0: 0, 0: 0]
+        x0, y0 = SHIFTS[mode]
+        assert (not x0 or 0 < x < len(self.rho_horizontal) - 1) and (not y0 or 0 < y < len(self.rho_vertical) - 1)
+        i1, i2 = self.row_bounds(x, x0)
+        j1, j2 = self.col_bounds(y, y0)
+        return image[i1: i2, j1: j2]
 
     def get_lines(self):
         """Returns number of vertical in horizontal lines (this is also size + 1)"""
@@ -4,16 +4,21 @@
 
 import cv2
 import numpy as np
-import pickle
-import math
-import sys
 
 from classifiers import classifier
+from common.board import new_board, as_board
+from common.imageops import get_centre_deviation
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
 
 
+SAMPLE_SIZE = (20, 20)  # size of fragments of image given to classifiers
+# fragments with smaller centre deviation have no dot (on bundled images: dots >= 22, 90% of others < 6)
+DEVIATION = 10
+COLOR_DISTANCE = 12  # colors of dots closer than this (in Lab space) are one color
+CLASSIFIERS = ['horizontal', 'vertical', 'square', 'x']  # classifiers of fragments of image with parts of dots
+
 # Colors possible to use when creating random game.
 COLORS = [[0, 0, 0], [255, 255, 255], [60, 69, 177],
           [17, 23, 105], [60, 133, 177], [127, 202, 247],
@@ -21,34 +26,72 @@ COLORS = [[0, 0, 0], [255, 255, 255], [60, 69, 177],
           [113, 189, 97]]
 
 
-def dist(x, y):
-    """Turns bgr points to float, returns distance between points"""
-    x = np.array(x, float)
-    y = np.array(y, float)
-    return math.sqrt((x[0]-y[0])**2 + (x[1] - y[1])**2 + (x[2] - y[2])**2)
+def cluster_colors(colors, distance=COLOR_DISTANCE):
+    """
+    Groups colors of dots: colors closer than distance in Lab space (where distance is close to perceived
+    difference) are in one group, and so are colors joined by a chain of such colors, so groups do not depend
+    on order of colors.
+    :param colors: array of bgr colors
+    :param distance: largest distance of colors in one group
+    :return: group of every color (groups are numbered from 0 in order of their first colors), median bgr color
+    of every group
+    """
+    colors = np.asarray(colors, np.uint8).reshape(-1, 3)
+    if len(colors) == 0:
+        return np.zeros(0, int), []
+    lab = cv2.cvtColor(colors.reshape(-1, 1, 3).astype(np.float32) / 255, cv2.COLOR_BGR2LAB).reshape(-1, 3)
+    close = ((lab[:, None, :] - lab[None, :, :]) ** 2).sum(axis=2) < distance ** 2
+    # every color gets the smallest index of colors connected with it
+    groups = np.arange(len(colors))
+    while True:
+        joined = np.where(close, groups[None, :], len(colors)).min(axis=1)
+        if (joined == groups).all():
+            break
+        groups = joined[joined]
+    groups = np.unique(groups, return_inverse=True)[1].reshape(-1)
+    return groups, [np.median(colors[groups == g], axis=0).astype(np.uint8) for g in range(groups.max() + 1)]
 
 
 class Container:
     """Stores puzzle data."""
-    def __init__(self, size):
+    def __init__(self, size, backend='two-pass'):
         """
         Initialization of container.
         :param: size: width and height of puzzle
+        :param backend: kind of classifiers used when puzzle is read from image: svm, template or two-pass
         :returns: None
         """
+        self.backend = backend
         self.size = (size[0] * 2 - 1, size[1] * 2 - 1)
-        self.puzzle = np.zeros((self.size[0], self.size[1])) - 1
+        self.puzzle = new_board(self.size, -1)
+        # confidence of classifiers for every position (see classifier.confidence), infinite if it was not classified
+        self.confidence = np.full(self.size, np.inf)
         self.colors = []
-        if sys.version_info < (3, 0):
-            self.sq_clf = pickle.load(classifier.get('square'))
-            self.horiz_clf = pickle.load(classifier.get('horizontal'))
-            self.vert_clf = pickle.load(classifier.get('vertical'))
-            self.x_clf = pickle.load(classifier.get('x'))
-        else:
-            self.sq_clf = pickle.load(classifier.get('square'), encoding='latin1')
-            self.horiz_clf = pickle.load(classifier.get('horizontal'), encoding='latin1')
-            self.vert_clf = pickle.load(classifier.get('vertical'), encoding='latin1')
-            self.x_clf = pickle.load(classifier.get('x'), encoding='latin1')
+        # colors of dots read from image, by positions; numbers of colors are given by assign_colors
+        self.dot_colors = {}
+        # x, y, width, height of puzzle on page, if it was read from page with many puzzles (see pipeline.read_page)
+        self.region = None
+
+    # classifiers are loaded at first use only, so generated puzzles never load them
+    @property
+    def sq_clf(self):
+        """Classifier of windows."""
+        return classifier.load('square', self.backend)
+
+    @property
+    def horiz_clf(self):
+        """Classifier of horizontal lines."""
+        return classifier.load('horizontal', self.backend)
+
+    @property
+    def vert_clf(self):
+        """Classifier of vertical lines."""
+        return classifier.load('vertical', self.backend)
+
+    @property
+    def x_clf(self):
+        """Classifier of line crossings."""
+        return classifier.load('x', self.backend)
 
     def set_puzzle(self, puzzle):
         """
@@ -56,7 +99,7 @@ class Container:
         :param puzzle: new puzzle
         :return:
         """
-        self.puzzle = puzzle
+        self.puzzle = as_board(puzzle)
 
     def get_board(self):
         """Returns puzzle board."""
@@ -76,28 +119,100 @@ class Container:
         :return: None
         """
         img_gray = cv2.cvtColor(img_rgb, cv2.COLOR_BGR2GRAY)
-        image = cv2.resize(img_gray, (20, 20))
-        number = 0
-        i, j = 0, 0
-        if mode == 0:
-            number = self.sq_clf.predict(image.reshape(1, -1))
-            i = 2 * x
-            j = 2 * y
-        elif mode == 1:
-            number = self.horiz_clf.predict(image.reshape(1, -1))
-            i = 2 * x - 1
-            j = 2 * y
-        elif mode == 2:
-            number = self.vert_clf.predict(image.reshape(1, -1))
-            i = 2 * x
-            j = 2 * y - 1
-        elif mode == 3:
-            number = self.x_clf.predict(image.reshape(1, -1))
-            i = 2 * x - 1
-            j = 2 * y - 1
-        if number > 0:
-            number = self.get_color(img_rgb)
-        self.puzzle[i, j] = int(number)
+        self.insert_all([img_rgb], [img_gray], [(x, y)], mode)
+
+    def insert_all(self, images_rgb, images_gray, cells, mode):
+        """
+        Inserts data of one part of puzzle for many fields, all of them are classified with one call of classifier.
+        Colors are read only for fields where dot was found, in order of cells.
+        :param images_rgb: fragments of full image in rgb
+        :param images_gray: the same fragments in gray
+        :param cells: positions x, y of fragments
+        :param mode: part of puzzle, 0 - window, 1 - horizontal line, 2 - vertical line, 3 - line crossing
+        :return: None
+        """
+        if len(cells) == 0:
+            return
+        samples = np.array([cv2.resize(image, SAMPLE_SIZE) for image in images_gray])
+        numbers, certainty = self.classify_samples(samples, mode)
+        colors = np.zeros((len(cells), 3), np.uint8)
+        for k in np.flatnonzero(numbers > 0):
+            img_rgb = images_rgb[k]
+            colors[k] = img_rgb[int(img_rgb.shape[0] / 2.0), int(img_rgb.shape[1] / 2.0)]
+        self.insert_numbers(numbers, colors, cells, mode, confidence=certainty)
+
+    def insert_samples(self, samples, colors, cells, mode, prefilter=True):
+        """
+        Inserts data of one part of puzzle from fragments already resized to SAMPLE_SIZE, with one call of classifier.
+        Fragments whose centre looks like empty grid (see get_centre_deviation) are not passed to classifier.
+        :param samples: array, one gray fragment for every field
+        :param colors: bgr colors of centres of fragments (used only where dot was found)
+        :param cells: positions x, y of fragments
+        :param mode: part of puzzle, 0 - window, 1 - horizontal line, 2 - vertical line, 3 - line crossing
+        :param prefilter: False if all fragments should be classified
+        :return: None
+        """
+        if len(cells) == 0:
+            return
+        numbers, certainty = self.classify_samples(samples, mode, prefilter)
+        self.insert_numbers(numbers, colors, cells, mode, confidence=certainty)
+
+    def classify_samples(self, samples, mode, prefilter=True):
+        """
+        Classifies fragments of one part of puzzle, already resized to SAMPLE_SIZE, with one call of classifier.
+        :param samples: array, one gray fragment for every field
+        :param mode: part of puzzle, 0 - window, 1 - horizontal line, 2 - vertical line, 3 - line crossing
+        :param prefilter: False if all fragments should be classified (not only these that do not look empty)
+        :return: array, 1 for every fragment with dot, 0 for others; array of confidence of classifier
+        (infinite for fragments not classified)
+        """
+        samples = np.asarray(samples).reshape((-1,) + SAMPLE_SIZE[::-1])
+        dots = np.ones(len(samples), bool)
+        if prefilter:
+            dots = get_centre_deviation(samples) >= DEVIATION
+        numbers = np.zeros(len(samples), int)
+        certainty = np.full(len(samples), np.inf)
+        if dots.any():
+            clf = [self.sq_clf, self.horiz_clf, self.vert_clf, self.x_clf][mode]
+            numbers[dots], _, certainty[dots] = classifier.classify_with_confidence(
+                clf, samples[dots].reshape(int(dots.sum()), -1))
+        return numbers, certainty
+
+    def insert_numbers(self, numbers, colors, cells, mode, assign=True, confidence=None):
+        """
+        Inserts found dots of one part of puzzle.
+        :param numbers: positive number for every field with dot, 0 for others
+        :param colors: bgr colors of centres of fragments (used only where dot was found)
+        :param cells: positions x, y of fragments
+        :param mode: part of puzzle, 0 - window, 1 - horizontal line, 2 - vertical line, 3 - line crossing
+        :param assign: False if colors of dots should not be assigned yet (assign_colors is called later)
+        :param confidence: confidence of classifiers for every field, None if fields were not classified
+        :return: None
+        """
+        shift = [(0, 0), (1, 0), (0, 1), (1, 1)][mode]
+        numbers = np.asarray(numbers)
+        cells = np.asarray(cells, int).reshape(-1, 2)
+        xs, ys = 2 * cells[:, 0] - shift[0], 2 * cells[:, 1] - shift[1]
+        self.puzzle[xs, ys] = 0
+        self.confidence[xs, ys] = np.inf if confidence is None else confidence
+        colors = np.asarray(colors, np.uint8).reshape(-1, 3)
+        for x, y, number, color in zip(xs.tolist(), ys.tolist(), numbers.tolist(), colors):
+            if number > 0:
+                self.dot_colors[(x, y)] = color
+            else:
+                self.dot_colors.pop((x, y), None)
+        if assign:
+            self.assign_colors()
+
+    def assign_colors(self):
+        """
+        Numbers colors of all dots read so far at once (see cluster_colors) and writes them into board.
+        :return: None
+        """
+        groups, self.colors = cluster_colors(list(self.dot_colors.values()))
+        if self.dot_colors:
+            xs, ys = np.array(list(self.dot_colors)).T
+            self.puzzle[xs, ys] = groups + 1
 
     def print_puzzle(self):
         """
@@ -120,24 +235,14 @@ class Container:
                     txt += str(int(el)) + ' '
             print(txt)
 
-    def get_color(self, img):
-        """Reads color of dot on image and adds to list of colors (if color is not on it, yet)"""
-        w, h, _ = img.shape
-        color = img[int(w/2.0), int(h/2.0)]
-        curr = 0
-        if len(self.colors) == 0:
-            self.colors.append(color)
-            return 1
-        for i, c in enumerate(self.colors):
-            if dist(c, color) < 10:
-                curr = i + 1
-                break
-        if curr == 0:
-            self.colors.append(color)
-            return len(self.colors)
-        else:
-            return curr
-
     def get_colors(self):
         """Returns list of colors."""
         return self.colors
+
+    def get_doubtful(self, limit=1.0):
+        """
+        Returns positions whose dots classifiers were not sure about, e.g. to be checked when puzzle cannot be solved.
+        :param limit: positions with lower confidence are returned
+        :return: list of positions x, y (in doubled coordinates)
+        """
+        return [(int(x), int(y)) for x, y in np.argwhere(self.confidence < limit)]
@@ -2,9 +2,14 @@
 """ Container for puzzle.
 """
 
+import time
+
 import numpy as np
 
 import common.misc as misc
+from common.kernels import wall_counts
+from symapix.puzzle.container import Container
+from symapix.solver.solver import SymAPixSolver
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
@@ -12,11 +17,65 @@ __email__ = 'ada.borowa@gmail.com'
 
 class Generator:
     """Generator class for sym-a-pix puzzle."""
-    def __init__(self, solver, container):
+    def __init__(self, solver=None, container=None):
         self.solver = solver
         self.container = container
+        self.size = (0, 0)
+        self.colors = 0
+        if container is not None:
+            self.size = self.container.size
+            self.colors = len(self.container.colors)
+        self.iterations = 0
+        self.time = 0
+
+    def generate(self, width, height, colors, max_iters=200, seed=None, unique=True, grow=True):
+        """
+        Generates new puzzle, without GUI. Number of iterations and time are kept in self.iterations and self.time.
+        :param width: width of puzzle
+        :param height: height of puzzle
+        :param colors: number of colors used
+        :param max_iters: maximal number of iterations of correcting loop
+        :param seed: seed of random generator, None for random puzzle
+        :param unique: if puzzle has to have exactly one solution
+        :param grow: if blocks are grown (generate_regions), otherwise random dots are corrected by solver
+        :return: container with generated puzzle
+        """
+        start = time.time()
+        if seed is not None:
+            np.random.seed(seed)
+        self.container = Container((height, width))
+        self.container.set_colors(colors)
+        self.solver = SymAPixSolver(self.container)
         self.size = self.container.size
-        self.colors = len(self.container.colors)
+        self.colors = colors
+        self.iterations = 0
+        if grow:
+            self.generate_regions()
+        else:
+            self.generate_by_solving(max_iters)
+        if unique:
+            self.make_unique(max_iters)
+        self.time = time.time() - start
+        return self.container
+
+    def generate_by_solving(self, max_iters=200):
+        """
+        Puts random dots, then solves puzzle and fills unsolved parts with new dots until it is solved.
+        After first iteration solver only resumes from changes made by generator.
+        :param max_iters: maximal number of iterations
+        :return: if puzzle was solved
+        """
+        self.generate_random()
+        while not self.solver.is_solved() and self.iterations < max_iters:
+            self.solver.resume()
+            self.solver.correct_solution()
+            self.correct_lines()
+            self.fill_dots()
+            self.solver.correct_solution()
+            self.correct_lines()
+            self.remove_redundant_walls()
+            self.iterations += 1
+        return self.solver.is_solved()
 
     def generate_random(self):
         """
@@ -30,14 +89,64 @@ class Generator:
                         self.container.puzzle[i, j] = c
                         self.solver.solution[i, j] = -2
 
+    def generate_regions(self, max_size=12):
+        """
+        Generates random sym-a-pix puzzle in one pass: blocks are grown around random centres,
+        square and its symmetric square are always added together, so every block is symmetric.
+        Then dot with random color is put in center of every block.
+        :param max_size: maximal number of squares in block
+        :return: None
+        """
+        geometry = self.solver.geometry
+        h, w = (self.size[0] + 1) // 2, (self.size[1] + 1) // 2
+        owner = np.zeros((h, w), int) - 1
+        dots = []
+        for s in np.random.permutation(h * w):
+            r, c = divmod(int(s), w)
+            if owner[r, c] >= 0:
+                continue
+            k = len(dots)
+            centers = []
+            for a, b in [[0, 0], [0, 1], [0, -1], [1, 0], [-1, 0], [1, 1], [1, -1], [-1, 1], [-1, -1]]:
+                center = [2 * r + a, 2 * c + b]
+                if all(0 <= x < h and 0 <= y < w and owner[x, y] < 0
+                       for x, y in [[i // 2, j // 2] for i, j in geometry.block(*center)]):
+                    centers.append(center)
+            dx, dy = centers[np.random.randint(len(centers))]
+            block = [[i // 2, j // 2] for i, j in geometry.block(dx, dy)]
+            frontier = []
+            for x, y in block:
+                owner[x, y] = k
+                frontier += [[x - 1, y], [x + 1, y], [x, y - 1], [x, y + 1]]
+            size = len(block)
+            target = np.random.randint(size, max(size, max_size) + 1)
+            while frontier and size < target:
+                f = np.random.randint(len(frontier))
+                frontier[f], frontier[-1] = frontier[-1], frontier[f]
+                x, y = frontier.pop()
+                sym_x, sym_y = dx - x, dy - y
+                if not (0 <= x < h and 0 <= y < w and 0 <= sym_x < h and 0 <= sym_y < w) or \
+                        owner[x, y] >= 0 or owner[sym_x, sym_y] >= 0:
+                    continue
+                for x, y in {(x, y), (sym_x, sym_y)}:
+                    owner[x, y] = k
+                    frontier += [[x - 1, y], [x + 1, y], [x, y - 1], [x, y + 1]]
+                    size += 1
+            dots.append([dx, dy])
+        for dx, dy in dots:
+            self.solver.puzzle[dx, dy] = np.random.randint(1, self.colors + 1)
+        self.solver.set_dots()
+        self.solver.set_blocks(owner, dots)
+
     def correct_lines(self):
         """Checks if lines were not put in place of dot."""
+        geometry = self.solver.geometry
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
                 if not (i % 2 == 0 and j % 2 == 0) and not (i % 2 > 0 and j % 2 > 0):
                     if self.solver.puzzle[i, j] > 0:
                         self.solver.solution[i, j] = -2
-                    [a, b], [c, d] = misc.squares_next_to(i, j)
+                    [a, b], [c, d] = geometry.next_to(i, j)
                     corner_dot = self.solver.dot_in_corner(a, b, c, d)
                     if corner_dot != [-1, -1]:
                         self.solver.solution[i, j] = -2
@@ -49,14 +158,15 @@ class Generator:
         :param y: position
         :return: if it was successful
         """
-        frame = misc.define_frame(x, y)
+        geometry = self.solver.geometry
+        frame = geometry.frame(x, y)
         closed = True
         for f in frame:
             if not self.solver.is_wall(*f):
                 closed = False
         if closed:
             return closed
-        visited = misc.define_block(x, y)
+        visited = geometry.block(x, y)
         for v in visited:
             if self.solver.contains_dot(*v):
                 return False
@@ -64,29 +174,14 @@ class Generator:
 
     def remove_redundant_walls(self):
         """Removes any redundant walls inside blocks."""
+        geometry = self.solver.geometry
         for i in range(0, self.size[0]):
             for j in range(0, self.size[1]):
                 if self.solver.puzzle[i, j] > 0:
-                    queue = misc.define_block(i, j)
-                    visited = []
-                    while queue:
-                        q = queue.pop()
-                        visited.append(q)
-                        queue2 = misc.adjacent_squares(*q)
-                        for q2 in queue2:
-                            if q2 not in visited and \
-                                not self.solver.is_wall(*misc.wall_between(q[0], q[1], q2[0], q2[1])) and \
-                                    self.solver.is_inside(*q2):
-                                queue.append(q2)
-
-                    block = misc.get_unique(np.array(visited))
-                    all_walls = []
-                    for b in block:
-                        all_walls.append(misc.define_frame(b[0], b[1]))
-                    all_walls = np.array(all_walls).reshape(-1, 2)
-                    red_walls = np.array([x for x in all_walls if misc.count(all_walls, x) > 1])
-                    for w in red_walls:
-                        self.solver.solution[w[0], w[1]] = 0
+                    block = np.array(self.solver.connected_squares(geometry.block(i, j)))
+                    squares = np.zeros(((self.size[0] + 1) // 2, (self.size[1] + 1) // 2), bool)
+                    squares[block[:, 0] // 2, block[:, 1] // 2] = True
+                    self.solver.solution[wall_counts(squares) > 1] = 0
 
     def fill_dots(self):
         """Fills dots in empty blocks."""
@@ -104,25 +199,14 @@ class Generator:
         :param c: color to fill
         :return:
         """
-        queue = misc.define_block(x, y)
-        visited = []
-        while queue:
-            q = queue.pop()
-            visited.append(q)
-            queue2 = misc.adjacent_squares(*q)
-            for q2 in queue2:
-                if q2 not in visited and \
-                    not self.solver.is_wall(*misc.wall_between(q[0], q[1], q2[0], q2[1])) and \
-                        self.solver.is_inside(*q2):
-                    queue.append(q2)
-
-        block = misc.get_unique(np.array(visited))
+        geometry = self.solver.geometry
+        block = misc.get_unique(np.array(self.solver.connected_squares(geometry.block(x, y))))
         if len(block) == 1:
             b = block[0]
             self.solver.puzzle[b[0], b[1]] = c
             self.solver.solution[b[0], b[1]] = c
         elif len(block) == 2:
-            new_dot = misc.wall_between(block[0][0], block[0][1], block[1][0], block[1][1])
+            new_dot = geometry.wall_between(block[0][0], block[0][1], block[1][0], block[1][1])
             self.solver.puzzle[new_dot[0], new_dot[1]] = c
             self.solver.solution[block[0][0], block[0][1]] = c
             self.solver.solution[block[1][0], block[1][1]] = c
@@ -146,5 +230,91 @@ class Generator:
                 return True
         return False
 
+    def make_unique(self, max_iters=200):
+        """
+        Adds dots until puzzle has only one solution. Square on which two found solutions differ
+        (and its symmetric square) gets its own dot, colored as its block in first solution.
+        If rest of that block is not connected, whole block is split into one square blocks.
+        :param max_iters: maximal number of corrections
+        :return: if puzzle has exactly one solution, solver's solution is then set to it
+        """
+        for _ in range(max_iters):
+            self.iterations += 1
+            found = self.solver.count_solutions(2)
+            counter = self.solver.counter
+            if found == 0 and self.repair_blocks():
+                continue
+            if found < 2:
+                if found == 1:
+                    self.solver.clear_user_solution()
+                    self.solver.set_dots()
+                    self.solver.set_blocks(counter.owners(counter.solutions[0]), counter.dots)
+                return found == 1
+            first, second = counter.solutions
+            k = [i for i in range(len(first)) if first[i] & ~second[i]][0]
+            diff = first[k] & ~second[k]
+            square = diff & -diff
+            dx, dy = counter.dots[k]
+            pinned = square | counter.mirror(square, dx, dy)
+            rest = first[k] & ~pinned
+            c = self.solver.puzzle[dx, dy]
+            if counter.flood(counter.cores[k], rest) != rest:
+                pinned = first[k]
+                self.solver.puzzle[dx, dy] = 0
+            for r in range(counter.height):
+                for s in range(counter.width):
+                    if pinned & counter.bit(2 * r, 2 * s):
+                        self.solver.puzzle[2 * r, 2 * s] = c
+        return False
 
-
+    def repair_blocks(self):
+        """
+        Splits blocks of current solution which do not have exactly one dot or are not symmetric
+        into one square blocks, each with own dot.
+        :return: if any block was split
+        """
+        geometry = self.solver.geometry
+        blocks = np.zeros(self.size, int) - 1
+        label = 0
+        for i in range(0, self.size[0], 2):
+            for j in range(0, self.size[1], 2):
+                if blocks[i, j] < 0:
+                    queue = [[i, j]]
+                    blocks[i, j] = label
+                    while queue:
+                        q = queue.pop()
+                        for q2 in geometry.adjacent(*q):
+                            if self.solver.is_inside(*q2) and blocks[q2[0], q2[1]] < 0 and \
+                                    not self.solver.is_wall(*geometry.wall_between(q[0], q[1], q2[0], q2[1])):
+                                blocks[q2[0], q2[1]] = label
+                                queue.append(q2)
+                    label += 1
+        dots = [[] for _ in range(label)]
+        for i, j in zip(*np.nonzero(self.solver.puzzle > 0)):
+            labels = set(blocks[a, b] for a, b in geometry.block(i, j))
+            if len(labels) == 1:
+                dots[labels.pop()].append((i, j))
+            else:
+                self.solver.puzzle[i, j] = 0
+        repaired = False
+        for k in range(label):
+            squares = np.argwhere(blocks == k)
+            if len(dots[k]) == 1:
+                x, y = dots[k][0]
+                symmetric = True
+                for a, b in squares:
+                    sym_a, sym_b = misc.symmetric_point(x, y, a, b)
+                    if not self.solver.is_inside(sym_a, sym_b) or blocks[sym_a, sym_b] != k:
+                        symmetric = False
+                if symmetric:
+                    continue
+            if len(dots[k]) > 0:
+                c = self.solver.puzzle[dots[k][0][0], dots[k][0][1]]
+            else:
+                c = np.random.randint(1, self.colors + 1)
+            for x, y in dots[k]:
+                self.solver.puzzle[x, y] = 0
+            for a, b in squares:
+                self.solver.puzzle[a, b] = c
+            repaired = True
+        return repaired
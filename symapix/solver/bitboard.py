@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+""" Sym-a-pix: Board of squares and walls kept as bit masks.
+Sets of squares are stored as python integers, square (r, c) is bit r * width + c,
+so regions are expanded and compared for whole board at once (see also SquareMasks, shared with counter).
+"""
+
+import numpy as np
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+
+class SquareMasks:
+    """Sets of squares of board as bits: masks of rows and mirror images of sets around dots."""
+
+    def __init__(self, shape):
+        """
+        Initialization of masks.
+        :param shape: shape of board (in doubled coordinates)
+        """
+        self.height = (shape[0] + 1) // 2
+        self.width = (shape[1] + 1) // 2
+        self.n = self.height * self.width
+        self.all = (1 << self.n) - 1
+        row = (1 << self.width) - 1
+        self.not_first = 0  # squares which are not first in their row
+        self.not_last = 0  # squares which are not last in their row
+        for r in range(self.height):
+            self.not_first |= (row - 1) << (r * self.width)
+            self.not_last |= (row >> 1) << (r * self.width)
+        self.mirrors = {}
+
+    def bit(self, x, y):
+        """Returns mask of square in board position x, y."""
+        return 1 << (int(x) // 2 * self.width + int(y) // 2)
+
+    def mask(self, squares):
+        """Returns mask of squares given by board positions."""
+        mask = 0
+        for x, y in squares:
+            mask |= self.bit(x, y)
+        return mask
+
+    def mirror(self, mask, x, y):
+        """
+        Mirrors squares around dot.
+        :param mask: set of squares
+        :param x: dot position
+        :param y: dot position
+        :return: mirrored squares (squares without mirror inside of board are dropped)
+        """
+        if (x, y) not in self.mirrors:
+            valid = 0
+            for r in range(max(0, x - self.height + 1), min(self.height, x + 1)):
+                c1, c2 = max(0, y - self.width + 1), min(self.width, y + 1)
+                if c1 < c2:
+                    valid |= (((1 << (c2 - c1)) - 1) << c1) << (r * self.width)
+            self.mirrors[(x, y)] = (valid, self.n - 1 - (x * self.width + y))
+        valid, shift = self.mirrors[(x, y)]
+        mask &= valid
+        if not mask:
+            return 0
+        reverse = int(format(mask, '0{}b'.format(self.n))[::-1], 2)
+        return reverse >> shift if shift >= 0 else reverse << -shift
+
+
+class BitBoard(SquareMasks):
+    """Squares of solution as bits, with masks of squares that have no wall on right or lower side."""
+
+    def __init__(self, solution):
+        """
+        Initialization of bit board.
+        :param solution: solution board, walls have value 1
+        """
+        super().__init__(solution.shape)
+        right = np.zeros((self.height, self.width), bool)
+        right[:, :-1] = solution[::2, 1::2] != 1
+        down = np.zeros((self.height, self.width), bool)
+        down[:-1, :] = solution[1::2, ::2] != 1
+        self.right = self.to_mask(right)
+        self.down = self.to_mask(down)
+
+    @staticmethod
+    def to_mask(array):
+        """Turns boolean array of squares into mask."""
+        return int.from_bytes(np.packbits(array.reshape(-1), bitorder='little').tobytes(), 'little')
+
+    def to_array(self, mask):
+        """Turns mask into boolean array of squares."""
+        data = np.frombuffer(mask.to_bytes((self.n + 7) // 8, 'little'), np.uint8)
+        return np.unpackbits(data, bitorder='little')[:self.n].astype(bool).reshape(self.height, self.width)
+
+    def squares(self, mask):
+        """Returns board positions of squares in mask, row by row."""
+        return [[2 * int(r), 2 * int(c)] for r, c in zip(*np.nonzero(self.to_array(mask)))]
+
+    def walls(self, mask):
+        """Returns board positions of walls (inside of board) around squares in mask."""
+        array = self.to_array(mask)
+        walls = np.zeros((2 * self.height - 1, 2 * self.width - 1), bool)
+        walls[::2, 1::2] = array[:, :-1] | array[:, 1:]
+        walls[1::2, ::2] = array[:-1, :] | array[1:, :]
+        return [(int(x), int(y)) for x, y in zip(*np.nonzero(walls))]
+
+    def set_wall(self, x, y, wall):
+        """
+        Updates sides of squares next to wall.
+        :param x: wall position
+        :param y: wall position
+        :param wall: True if there is wall
+        :return: None
+        """
+        if x % 2 == 0:
+            b = self.bit(x, y - 1)
+            self.right = self.right & ~b if wall else self.right | b
+        else:
+            b = self.bit(x - 1, y)
+            self.down = self.down & ~b if wall else self.down | b
+
+    def flood(self, seed):
+        """
+        Expands seed to all squares connected to it, not separated by walls.
+        :param seed: starting squares
+        :return: reached squares
+        """
+        reach = seed
+        while True:
+            grown = (reach | ((reach & self.right) << 1) | ((reach >> 1) & self.right) |
+                     ((reach & self.down) << self.width) | ((reach >> self.width) & self.down))
+            if grown == reach:
+                return reach
+            reach = grown
+
+    def is_closed(self, mask):
+        """Checks if every side leading out of squares in mask is a wall."""
+        w = self.width
+        right = mask & ~(mask >> 1) & self.not_last
+        left = mask & ~(mask << 1) & self.not_first
+        down = mask & ~(mask >> w)
+        up = mask & ~(mask << w)
+        return not (right & self.right or left & (self.right << 1) or down & self.down or up & (self.down << w))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" Sym-a-pix: Counting solutions of puzzle.
+Sets of squares are stored as python integers, square (r, c) is bit r * width + c (see bitboard.SquareMasks).
+"""
+
+import numpy as np
+
+from common.geometry import Geometry
+from symapix.solver.bitboard import SquareMasks
+
+__author__ = 'Adriana Borowa'
+__email__ = 'ada.borowa@gmail.com'
+
+
+class SolutionCounter(SquareMasks):
+    """Counts solutions by assigning squares to dots, with symmetric pairs of squares assigned together."""
+
+    def __init__(self, puzzle):
+        """
+        Initialization of counter.
+        :param puzzle: puzzle board, dots have values greater then 0
+        """
+        super().__init__(puzzle.shape)
+        self.puzzle = puzzle
+        self.dots = [(int(i), int(j)) for i, j in zip(*np.nonzero(puzzle > 0))]
+        geometry = Geometry(puzzle.shape)
+        self.cores = [self.mask(geometry.block(dx, dy)) for dx, dy in self.dots]
+        self.solutions = []
+        self.nodes = 0
+
+    def flood(self, seed, allowed):
+        """
+        Expands seed to all squares of allowed connected to it.
+        :param seed: starting squares
+        :param allowed: squares which can be visited
+        :return: reached squares
+        """
+        reach = seed & allowed
+        while True:
+            grown = (reach | ((reach << 1) & self.not_first) | ((reach >> 1) & self.not_last) |
+                     (reach << self.width) | (reach >> self.width)) & allowed
+            if grown == reach:
+                return reach
+            reach = grown
+
+    def count(self, limit=2):
+        """
+        Counts solutions, stops after limit solutions are found.
+        :param limit: maximal number of solutions to find
+        :return: number of solutions found
+        """
+        self.solutions = []
+        self.nodes = 0
+        owned = list(self.cores)
+        taken = 0
+        for core in owned:
+            if core & taken:
+                return 0
+            taken |= core
+        free = self.all & ~taken
+        stack = [(owned, free, [None] * len(owned), -1)]
+        while stack and len(self.solutions) < limit:
+            owned, free, allowed, changed = stack.pop()
+            self.nodes += 1
+            state = self.propagate(owned, free, allowed, changed)
+            if state is None:
+                continue
+            owned, free, allowed, choice = state
+            if not free:
+                self.solutions.append(owned)
+                continue
+            square = choice & -choice
+            for k in reversed(range(len(owned))):
+                if allowed[k] & square:
+                    new = square | self.mirror(square, *self.dots[k])
+                    child = list(owned)
+                    child[k] |= new
+                    stack.append((child, free & ~new, allowed, new))
+        return len(self.solutions)
+
+    def propagate(self, owned, free, allowed, changed):
+        """
+        Narrows squares each dot can reach symmetrically and assigns squares with only one possible dot.
+        :param owned: squares assigned to each dot
+        :param free: unassigned squares
+        :param allowed: squares each dot could reach in parent state (None if unknown)
+        :param changed: squares assigned since allowed was computed
+        :return: owned, free, allowed and squares with fewest possible dots, or None if there is no solution
+        """
+        owned = list(owned)
+        allowed = list(allowed)
+        while True:
+            once, twice, thrice = 0, 0, 0
+            for k in range(len(owned)):
+                a = allowed[k]
+                if a is None or a & changed & ~owned[k]:
+                    a = owned[k] | free
+                    while True:
+                        b = self.flood(self.cores[k], a & self.mirror(a, *self.dots[k]))
+                        if b == a:
+                            break
+                        a = b
+                    if owned[k] & ~a:
+                        return None
+                    allowed[k] = a
+                f = a & free
+                thrice |= twice & f
+                twice |= once & f
+                once |= f
+            if free & ~once:
+                return None
+            forced = once & ~twice
+            if not forced:
+                return owned, free, allowed, (twice & ~thrice) or free
+            changed = 0
+            for k in range(len(owned)):
+                new = forced & allowed[k]
+                if new:
+                    new |= self.mirror(new, *self.dots[k])
+                    if new & ~(free | owned[k]):
+                        return None
+                    owned[k] |= new
+                    free &= ~new
+                    changed |= new
+
+    def owners(self, solution):
+        """
+        Gives dot owning each square.
+        :param solution: found solution
+        :return: array of squares with index of dot
+        """
+        owner = np.zeros((self.height, self.width), int) - 1
+        for k, mask in enumerate(solution):
+            for r in range(self.height):
+                row = (mask >> (r * self.width)) & ((1 << self.width) - 1)
+                for c in range(self.width):
+                    if row >> c & 1:
+                        owner[r, c] = k
+        return owner
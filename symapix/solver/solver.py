@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 """ Sym-a-pix: Solving puzzle
 """
-import copy
-
 import numpy as np
 
-from common.misc import get_unique, define_frame, define_block, symmetric_point, wall_between, count, point_dist, \
-    adjacent_squares, closest_closed
+from common.board import new_board, as_board
+from common.geometry import Geometry
+from common.kernels import flood, flood_buffers
+from common.misc import get_unique, symmetric_point, point_dist, closest_closed
+from symapix.solver.bitboard import BitBoard
+from symapix.solver.counter import SolutionCounter
 
 __author__ = 'Adriana Borowa'
 __email__ = 'ada.borowa@gmail.com'
@@ -17,58 +19,262 @@ class SymAPixSolver:
 
     def __init__(self, puzzle):
         if puzzle is None:
-            self.puzzle = np.zeros((10, 10), int) - 1
+            self.puzzle = new_board((10, 10), -1)
         else:
-            self.puzzle = puzzle.get_board()
+            self.puzzle = as_board(puzzle.get_board())
             self.colors = puzzle.get_colors()
         self.size = self.puzzle.shape
 
         # solution: -2 - dot, 1 - wall, 0 - empty
-        self.solution = np.zeros(self.size, int)
-        self.user_solution = np.zeros(self.size, int)
-        self.fill_color = np.zeros(self.size, int) - 1  # -1 - non, [0,1,2,3,...] - color from list
+        self.solution = None
+        self.user_solution = None
+        self.pad_boards()
+        self.fill_color = new_board(self.size, -1)  # -1 - non, [0,1,2,3,...] - color from list
+
+        # scheduler: tasks are (kind, position) pairs re-run only when walls they read have changed
+        self.tracking = False
+        self.task = None
+        self.task_reads = set()
+        self.task_writes = set()
+        self.reads = {}
+        self.watchers = {}
+        self.dirty = set()
+        self.closed_dots = set()
+        self.snapshot = None
+        self.bits = None  # walls of solution as bit masks, kept up to date while tracking
+        self.counter = None
+        self.mismatches = None  # walls where user's solution differs from solution
         self.set_dots()
 
     def set_puzzle(self, array):
         """Setting puzzle board; just for fill-a-pix_tests."""
-        self.puzzle = array
+        self.puzzle = as_board(array)
         self.size = self.puzzle.shape
-        self.solution = np.zeros(self.size, int)
+        self.pad_boards()
+        self.fill_color = new_board(self.size, -1)
+        self.snapshot = None
+        self.mismatches = None
         self.set_dots()
 
+    def pad_boards(self):
+        """
+        Creates empty solution and user's solution as views of larger (padded) boards, laid out by geometry
+        of board. Lines just outside of board (margin of padded board) are walls, so walls around points
+        of board can be read by flat index without checking bounds.
+        :return: None
+        """
+        h, w = self.size
+        self.geometry = Geometry(self.size)
+        self.margin = self.geometry.margin
+        self.stride = self.geometry.stride
+        self.offset = self.geometry.offset
+        self.wall_offsets = self.geometry.wall_offsets
+        self.inside_mask = self.geometry.inside_mask
+        top, left = self.margin
+        padded = []
+        for _ in range(2):
+            board = new_board(self.geometry.padded_shape)
+            board[[top - 1, top + h], :] = 1
+            board[:, [left - 1, left + w]] = 1
+            padded.append(board)
+        self.padded_solution, self.padded_user_solution = padded
+        self.solution = self.padded_solution[top: top + h, left: left + w]
+        self.user_solution = self.padded_user_solution[top: top + h, left: left + w]
+        self.flat_solution = self.padded_solution.reshape(-1)
+        self.flood_buffers = flood_buffers(self.flat_solution.size)
+
+    def index(self, x, y):
+        """Returns flat index of point x, y in padded boards."""
+        return self.offset + x * self.stride + y
+
+    def position(self, index):
+        """Returns point x, y of flat index in padded boards."""
+        x, y = divmod(index, self.stride)
+        return x - self.margin[0], y - self.margin[1]
+
     def set_dots(self):
         """Sets values in solution were dots are"""
-        for i, row in enumerate(self.puzzle):
+        for i, row in enumerate(self.puzzle.tolist()):
             for j, el in enumerate(row):
                 if el > 0:
                     self.solution[i, j] = -2
                     self.user_solution[i, j] = -2
 
     def solve(self):
-        """Main solver function"""
+        """Main solver function.
+        Every dot and square is a task; after the first round only tasks which read a wall
+        changed since their last run are repeated, until no task is left to run."""
+        self.start_schedule()
         self.init_fill()
+        self.run_schedule()
+
+    def resume(self):
+        """Continues solving after puzzle or solution were changed outside of solver (e.g. by generator).
+        Only tasks which read changed positions or their neighbours are run again."""
+        if self.snapshot is None:
+            self.solve()
+            return
+        solution, puzzle = self.snapshot
+        changed = np.argwhere((self.solution != solution) | (self.puzzle != puzzle))
+        new_dots = np.argwhere((self.puzzle > 0) & (puzzle <= 0))
+        self.tracking = True
+        self.bits = BitBoard(self.solution)
+        self.closed_dots = set()
+        dots = self.dots_positions()
+        self.dirty = set([('closed', d) for d in dots] +
+                         [('smallest', d) for d in dots if ('smallest', d) not in self.reads])
+        for x, y in changed:
+            for i in range(x - 1, x + 2):
+                for j in range(y - 1, y + 2):
+                    self.dirty.update(self.watchers.get((i, j), ()))
+        squares = []
+        for x, y in new_dots:
+            squares += [[i, j] for i in range(x - 1, x + 2) for j in range(y - 1, y + 2)
+                        if i % 2 == 0 and j % 2 == 0 and self.is_inside(i, j)]
+        self.init_fill(squares)
+        self.run_schedule()
+
+    def run_schedule(self):
+        """Runs tasks until none of them has to be run again, then corrects solution."""
         self.fill_smallest()
         self.check_closed()
-        filled_count = 1
-        while filled_count > 0:
-            filled_count = self.find_blocked_regions()
+        while self.dirty:
+            self.find_blocked_regions()
             self.check_closed()
             self.fill_smallest()
             self.check_closed()
+        self.stop_schedule()
         self.correct_solution()
+        self.mismatches = None
 
-    def init_fill(self):
-        """Fills obvious lines between two dots: if two squares contain dot or part of dot there is line."""
-        for x in range(0, self.size[0], 2):
-            for y in range(0, self.size[1], 2):
-                if self.contains_dot(x, y):
-                    adjacent = adjacent_squares(x, y)
-                    for pair in adjacent:
-                        if self.is_inside(*pair):
-                            i, j = pair
-                            if self.contains_dot(i, j) and not self.is_same_dot(x, y, i, j):
-                                a, b = wall_between(x, y, i, j)
-                                self.solution[a, b] = 1
+    def count_solutions(self, limit=2):
+        """
+        Counts solutions of puzzle, search stops after limit solutions are found.
+        Found solutions are kept in self.counter.
+        :param limit: maximal number of solutions to look for
+        :return: number of found solutions
+        """
+        self.counter = SolutionCounter(self.puzzle)
+        return self.counter.count(limit)
+
+    def set_blocks(self, owner, dots):
+        """
+        Sets solution from blocks: squares get color of their dot, walls are put between different blocks.
+        :param owner: array of squares with index of dot the square belongs to
+        :param dots: positions of dots
+        :return: None
+        """
+        colors = np.array([self.puzzle.item(d[0], d[1]) for d in dots], int)
+        self.solution[...] = 0
+        self.mismatches = None
+        self.solution[::2, ::2] = colors[owner]
+        self.solution[::2, 1::2] = owner[:, :-1] != owner[:, 1:]
+        self.solution[1::2, ::2] = owner[:-1, :] != owner[1:, :]
+        for dx, dy in dots:
+            if dx % 2 > 0 or dy % 2 > 0:
+                self.solution[dx, dy] = -2
+
+    def start_schedule(self):
+        """Turns on tracking of walls read and changed, marks all tasks to be run."""
+        self.tracking = True
+        self.bits = BitBoard(self.solution)
+        self.reads = {}
+        self.watchers = {}
+        self.closed_dots = set()
+        dots = self.dots_positions()
+        self.dirty = set([('closed', d) for d in dots] + [('smallest', d) for d in dots] +
+                         [('region', s) for s in self.squares_positions()])
+
+    def stop_schedule(self):
+        """Turns off tracking, so that solver functions work on whole board again.
+        Current boards are stored, so that solving can be resumed after changes."""
+        self.tracking = False
+        self.bits = None
+        self.dirty = set()
+        self.snapshot = (self.solution.copy(), self.puzzle.copy())
+
+    def scheduled(self, kind, positions):
+        """
+        Yields positions whose task has to be run. Without tracking yields all positions.
+        :param kind: kind of task: closed, smallest or region
+        :param positions: candidate positions, in order
+        :return: generator of positions
+        """
+        for pos in positions:
+            task = (kind, pos)
+            if not self.tracking:
+                yield pos
+            elif task in self.dirty:
+                self.task = task
+                self.task_reads = set()
+                self.task_writes = set()
+                yield pos
+                self.finish_task()
+
+    def finish_task(self):
+        """Stores walls read by current task, so it is run again only when one of them changes."""
+        task = self.task
+        for pos in self.reads.get(task, ()):
+            self.watchers[pos].discard(task)
+        for pos in self.task_reads:
+            self.watchers.setdefault(pos, set()).add(task)
+        self.reads[task] = self.task_reads
+        if self.task_reads & self.task_writes:
+            self.dirty.add(task)
+        else:
+            self.dirty.discard(task)
+        self.task = None
+
+    def watch(self, x, y):
+        """Records that current task depends on value of solution in x, y."""
+        if self.task is not None:
+            self.task_reads.add((x, y))
+
+    def watch_squares(self, bits, mask):
+        """Records that current task depends on all walls around squares in mask."""
+        if self.task is not None:
+            self.task_reads.update(bits.walls(mask))
+
+    def bitboard(self):
+        """Returns solution as bit masks: kept up to date while tracking, created from solution otherwise."""
+        if self.bits is None:
+            return BitBoard(self.solution)
+        return self.bits
+
+    def set_solution(self, x, y, val):
+        """
+        Sets value of solution and marks tasks depending on it to be run again.
+        :param x: position
+        :param y: position
+        :param val: new value
+        :return: None
+        """
+        if self.solution.item(x, y) != val:
+            self.solution[x, y] = val
+            if self.bits is not None and (x + y) % 2 > 0:
+                self.bits.set_wall(x, y, val == 1)
+            if self.tracking:
+                self.dirty.update(self.watchers.get((x, y), ()))
+                if self.task is not None:
+                    self.task_writes.add((x, y))
+
+    def init_fill(self, squares=None):
+        """
+        Fills obvious lines between two dots: if two squares contain dot or part of dot there is line.
+        :param squares: squares to be checked, all if None
+        :return: None
+        """
+        if squares is None:
+            squares = self.squares_positions()
+        for x, y in squares:
+            if self.contains_dot(x, y):
+                adjacent = self.geometry.adjacent(x, y)
+                for pair in adjacent:
+                    if self.is_inside(*pair):
+                        i, j = pair
+                        if self.contains_dot(i, j) and not self.is_same_dot(x, y, i, j):
+                            a, b = self.geometry.wall_between(x, y, i, j)
+                            self.set_solution(a, b, 1)
 
     def contains_dot(self, x, y):
         """
@@ -83,15 +289,15 @@ class SymAPixSolver:
         if x % 2 == 0 and y % 2 == 0:
             for i in range(max(x - 1, 0), min(x + 2, self.size[0])):
                 for j in range(max(y - 1, 0), min(y + 2, self.size[1])):
-                    if self.puzzle[i, j] > 0:
+                    if self.puzzle.item(i, j) > 0:
                         return True
         elif x % 2 == 0:
             for j in range(y - 1, y + 2):
-                if self.puzzle[x, j] > 0:
+                if self.puzzle.item(x, j) > 0:
                     return True
         elif y % 2 == 0:
             for i in range(x - 1, x + 2):
-                if self.puzzle[i, y] > 0:
+                if self.puzzle.item(i, y) > 0:
                     return True
         return False
 
@@ -112,7 +318,7 @@ class SymAPixSolver:
         elif y == j:
             corners = [[int((x + i) / 2), y - 1], [int((x + i) / 2), y + 1]]
         for c in corners:
-            if self.is_inside(*c) and self.puzzle[c[0], c[1]] > 0:
+            if self.is_inside(*c) and self.puzzle.item(c[0], c[1]) > 0:
                 return c
         return [-1, -1]
 
@@ -142,31 +348,58 @@ class SymAPixSolver:
         dots = []
         for i in range(max(x - 1, 0), min(x + 2, self.size[0])):
             for j in range(max(y - 1, 0), min(y + 2, self.size[1])):
-                if self.puzzle[i, j] > 0:
+                if self.puzzle.item(i, j) > 0:
                     dots.append([i, j])
         return dots
 
     def fill_smallest(self):
         """Fills the smallest blocks (1, 2 or 4 squares depending on where dot is)."""
         filled_count = 0
-        for x in range(0, self.size[0]):
-            for y in range(0, self.size[1]):
-                if self.puzzle[x, y] > 0:
-                    frame = define_frame(x, y)
-                    for wall in frame:
-                        if self.is_wall(*wall):
-                            a, b = symmetric_point(x, y, wall[0], wall[1])
-                            if 0 <= a < self.size[0] and 0 <= b < self.size[1]:
-                                self.solution[a, b] = 1
-                                filled_count += 1
+        for x, y in self.scheduled('smallest', self.dots_positions()):
+            frame = self.geometry.frame_indices(x, y)
+            filled_count += self.mirror_walls(x, y, frame, both=False)
         return filled_count
 
+    def mirror_walls(self, x, y, walls, both=True):
+        """
+        Copies known walls to their mirror images around dot, with one gather and one scatter.
+        Mirror images outside of board and dots are not changed, mirror images outside of padded board
+        are dropped (they are not walls).
+        :param x: dot position
+        :param y: dot position
+        :param walls: flat indices of walls positions
+        :param both: if True walls are copied also from mirror images back to walls
+        :return: number of walls put in
+        """
+        walls = np.asarray(walls, int)
+        mirrors, valid = self.geometry.mirror_indices(x, y, walls)
+        walls, mirrors = walls[valid], mirrors[valid]
+        if self.task is not None:
+            for k in walls.tolist() + (mirrors.tolist() if both else []):
+                self.watch(*self.position(k))
+        targets = mirrors[self.flat_solution[walls] == 1]
+        if both:
+            targets = np.concatenate((targets, walls[self.flat_solution[mirrors] == 1]))
+        targets = targets[self.inside_mask[targets] & (self.flat_solution[targets] == 0)]
+        targets = np.unique(targets).tolist()
+        for k in targets:
+            self.set_solution(*self.position(k), 1)
+        return len(targets)
+
+    def dots_positions(self):
+        """Returns positions of all dots, row by row."""
+        return [(int(i), int(j)) for i, j in zip(*np.nonzero(self.puzzle > 0))]
+
+    def squares_positions(self):
+        """Returns positions of all squares, row by row."""
+        return [(i, j) for i in range(0, self.size[0], 2) for j in range(0, self.size[1], 2)]
+
     def fill(self, k):
         """Fills to length of k"""
         filled_count = 0
-        for i, row in enumerate(self.solution):
+        for i, row in enumerate(self.solution.tolist()):
             for j, el in enumerate(row):
-                if self.puzzle[i, j] > 0 and not closest_closed(i, j, self.solution):
+                if self.puzzle.item(i, j) > 0 and not closest_closed(i, j, self.solution):
                     filled_count += self.fill_from_dot(i, j, k)
         return filled_count
 
@@ -180,136 +413,126 @@ class SymAPixSolver:
         :return: how many walls were put in
         """
         filled_count = 0
-        queue = define_block(i, j)
+        geometry = self.geometry
+        queue = list(geometry.block(i, j))
         visited = []
         no_queue = False
         while queue:
             p = queue.pop()
             visited.append(p)
             next_ones = []
-            for n in adjacent_squares(p[0], p[1]):
+            for n in geometry.adjacent(p[0], p[1]):
                 if 0 < k < point_dist(n[0], n[1], i, j):
                     no_queue = True
-                wall = wall_between(n[0], n[1], p[0], p[1])
+                wall = geometry.wall_between(n[0], n[1], p[0], p[1])
                 if n not in visited:
                     if block is not None:
                         if n in block:
-                            if not (self.is_inside(*wall) and self.puzzle[wall[0], wall[1]] > 0) \
-                                    and not (self.is_inside(*n) and self.solution[n[0], n[1]] < 0):
+                            if not (self.is_inside(*wall) and self.puzzle.item(wall[0], wall[1]) > 0) \
+                                    and not (self.is_inside(*n) and self.solution_at(*n) < 0):
                                 next_ones.append(n)
                     else:
-                        if not (self.is_inside(*wall) and self.puzzle[wall[0], wall[1]] > 0) \
-                                and not (self.is_inside(*n) and self.puzzle[n[0], n[1]] > 0):
+                        if not (self.is_inside(*wall) and self.puzzle.item(wall[0], wall[1]) > 0) \
+                                and not (self.is_inside(*n) and self.puzzle.item(n[0], n[1]) > 0):
                             next_ones.append(n)
-            for n in next_ones:
-                n_sym = symmetric_point(i, j, n[0], n[1])
-                p_sym = symmetric_point(i, j, p[0], p[1])
-                new_wall = wall_between(p_sym[0], p_sym[1], n_sym[0], n_sym[1])
-                curr_wall = wall_between(p[0], p[1], n[0], n[1])
-                if self.is_wall(*curr_wall) and \
-                        self.is_inside(*new_wall) and not (self.is_wall(*new_wall)
-                                                           or self.puzzle[new_wall[0], new_wall[1]] > 0):
-                    self.solution[new_wall[0], new_wall[1]] = 1
-                    filled_count += 1
-                if self.is_wall(*new_wall) and \
-                        self.is_inside(*curr_wall) and not (self.is_wall(*curr_wall)
-                                                            or self.puzzle[curr_wall[0], curr_wall[1]] > 0):
-                    self.solution[curr_wall[0], curr_wall[1]] = 1
-                    filled_count += 1
+            if next_ones:
+                walls = [self.index(*geometry.wall_between(p[0], p[1], n[0], n[1])) for n in next_ones]
+                filled_count += self.mirror_walls(i, j, walls)
             if not no_queue:
                 for n in next_ones:
-                    curr_wall = wall_between(p[0], p[1], n[0], n[1])
+                    curr_wall = geometry.wall_between(p[0], p[1], n[0], n[1])
                     if not self.is_wall(*curr_wall) and \
-                            self.is_inside(*n) and self.solution[n[0], n[1]] < 1:
+                            self.is_inside(*n) and self.solution_at(*n) < 1:
                         queue.append(n)
 
-        if self.puzzle[i, j] > 0:
+        if self.puzzle.item(i, j) > 0:
             block = get_unique(np.array(visited))
             if self.block_is_closed(block, self.solution):
-                for b in block:
-                    self.solution[b[0], b[1]] = self.puzzle[i, j]
+                self.close_block(i, j, block)
 
         return filled_count
 
+    def close_block(self, i, j, block):
+        """
+        Fills closed block with color of its dot, dot is not checked again.
+        :param i: dot position
+        :param j: dot position
+        :param block: squares of block
+        :return: None
+        """
+        for b in block:
+            self.set_solution(b[0], b[1], self.puzzle.item(i, j))
+        self.closed_dots.add((i, j))
+
     def check_closed(self):
-        """Checks if there are new closed blocks."""
-        for i, row in enumerate(self.solution):
-            for j, el in enumerate(row):
-                if self.puzzle[i, j] > 0 and not closest_closed(i, j, self.solution):
-                    queue = define_block(i, j)
-                    visited = []
-                    while queue:
-                        p = queue.pop()
-                        visited.append(p)
-                        next_ones = adjacent_squares(p[0], p[1])
-                        for n in next_ones:
-                            if self.is_inside(*n) and not self.puzzle[n[0], n[1]] < 0 \
-                                    and not self.is_wall(*wall_between(p[0], p[1], n[0], n[1])) \
-                                    and n not in visited:
-                                n_sym = symmetric_point(i, j, n[0], n[1])
-                                p_sym = symmetric_point(i, j, p[0], p[1])
-                                if (self.is_inside(*n_sym) and self.is_inside(*p_sym)) and \
-                                        not self.puzzle[n_sym[0], n_sym[1]] < 0 or \
-                                        not self.is_wall(*wall_between(p_sym[0], p_sym[1], n_sym[0], n_sym[1])):
-                                    queue.append(n)
-                    if self.puzzle[i, j] > 0:
-                        block = get_unique(np.array(visited))
-                        if self.block_is_closed(block, self.solution):
-                            for b in block:
-                                self.solution[b[0], b[1]] = self.puzzle[i, j]
+        """Checks if there are new closed blocks: region of squares connected with dot (not separated by walls)
+        is closed block if it is symmetric around dot and has no other dot."""
+        bits = self.bitboard()
+        dots = self.dots_positions()
+        cores = dict((d, bits.mask(self.geometry.block(*d))) for d in dots)
+        all_cores = 0
+        for core in cores.values():
+            all_cores |= core
+        for i, j in self.scheduled('closed', dots):
+            if (i, j) not in self.closed_dots and not closest_closed(i, j, self.solution):
+                region = bits.flood(cores[(i, j)])
+                self.watch_squares(bits, region)
+                if not region & all_cores & ~cores[(i, j)] and bits.mirror(region, i, j) == region:
+                    self.close_block(i, j, bits.squares(region))
 
     def find_blocked_regions(self):
         """Finds parts of blocks with all walls checked and one dot.
         Then fills symmetric part of that block."""
         filled_count = 0
-        for i, row in enumerate(self.solution):
-            for j, el in enumerate(row):
-                if i % 2 == 0 and j % 2 == 0 and el == 0:
-                    queue = []
-                    dots = []
-                    visited = [[i, j]]
-
-                    for p in adjacent_squares(i, j):
-                        pos_wall = wall_between(i, j, p[0], p[1])
-                        cor_dot = self.dot_in_corner(i, j, p[0], p[1])
-                        if self.is_inside(*pos_wall) and self.puzzle[pos_wall[0], pos_wall[1]] > 0:
-                            dots.append(pos_wall)
-                        elif not self.is_wall(*pos_wall) and self.is_inside(*p) and self.puzzle[p[0], p[1]] > 0:
-                            dots.append(p)
-                        elif not self.is_wall(*pos_wall):
-                            queue.append(p)
-                        if not cor_dot == [-1, -1]:
-                            dots.append(cor_dot)
-                    while queue:
-                        p = queue.pop()
-                        sym_part = False
-                        if len(dots) == 1:
-                            for d in dots:
-                                s = symmetric_point(d[0], d[1], p[0], p[1])
-                                if [s[0], s[1]] in visited:
-                                    sym_part = True
-                        if not sym_part:
-                            visited.append(p)
-                            next_ones = adjacent_squares(p[0], p[1])
-                            for n in next_ones:
-                                pos_wall = wall_between(p[0], p[1], n[0], n[1])
-                                if n not in visited and not self.is_wall(*pos_wall):
-                                    corner_dot = self.dot_in_corner(n[0], n[1], p[0], p[1])
-                                    if self.is_inside(*pos_wall) and self.puzzle[pos_wall[0], pos_wall[1]] > 0 \
-                                            and pos_wall not in dots:
-                                        dots.append(pos_wall)
-                                    elif self.is_inside(*n) and self.puzzle[n[0], n[1]] > 0 and n not in dots:
-                                        dots.append(n)
-                                    elif self.is_inside(*n) and n not in visited and n not in dots:
-                                        queue.append(n)
-                                    if not corner_dot == [-1, -1] and corner_dot not in dots:
-                                        dots.append(corner_dot)
-                    block = get_unique(np.array(visited))
-                    if len(dots) == 1 and len(block) > 0:
-                        dot = dots[0]
-                        filled_count += self.fill_from_dot(dot[0], dot[1], k=0, block=block)
-                    elif len(dots) > 1 and len(block) > 0:
-                        self.test_dots(i, j, dots)
+        bits = self.bitboard()
+        geometry = self.geometry
+        for i, j in self.scheduled('region', self.squares_positions()):
+            if self.solution.item(i, j) == 0:
+                queue = []
+                dots = []
+                visited = bits.bit(i, j)
+
+                for p in geometry.adjacent(i, j):
+                    pos_wall = geometry.wall_between(i, j, p[0], p[1])
+                    cor_dot = self.dot_in_corner(i, j, p[0], p[1])
+                    if self.is_inside(*pos_wall) and self.puzzle.item(pos_wall[0], pos_wall[1]) > 0:
+                        dots.append(pos_wall)
+                    elif not self.is_wall(*pos_wall) and self.is_inside(*p) and self.puzzle.item(p[0], p[1]) > 0:
+                        dots.append(p)
+                    elif not self.is_wall(*pos_wall):
+                        queue.append(p)
+                    if not cor_dot == [-1, -1]:
+                        dots.append(cor_dot)
+                while queue:
+                    p = queue.pop()
+                    sym_part = False
+                    if len(dots) == 1:
+                        for d in dots:
+                            s = symmetric_point(d[0], d[1], p[0], p[1])
+                            if self.is_inside(*s) and visited & bits.bit(*s):
+                                sym_part = True
+                    if not sym_part:
+                        visited |= bits.bit(*p)
+                        next_ones = geometry.adjacent(p[0], p[1])
+                        for n in next_ones:
+                            pos_wall = geometry.wall_between(p[0], p[1], n[0], n[1])
+                            if not self.is_wall(*pos_wall) and not visited & bits.bit(*n):
+                                corner_dot = self.dot_in_corner(n[0], n[1], p[0], p[1])
+                                if self.is_inside(*pos_wall) and self.puzzle.item(pos_wall[0], pos_wall[1]) > 0 \
+                                        and pos_wall not in dots:
+                                    dots.append(pos_wall)
+                                elif self.is_inside(*n) and self.puzzle.item(n[0], n[1]) > 0 and n not in dots:
+                                    dots.append(n)
+                                elif self.is_inside(*n) and n not in dots:
+                                    queue.append(n)
+                                if not corner_dot == [-1, -1] and corner_dot not in dots:
+                                    dots.append(corner_dot)
+                block = np.array(bits.squares(visited))
+                if len(dots) == 1 and len(block) > 0:
+                    dot = dots[0]
+                    filled_count += self.fill_from_dot(dot[0], dot[1], k=0, block=block)
+                elif len(dots) > 1 and len(block) > 0:
+                    self.test_dots(i, j, dots)
         return filled_count
 
     def block_is_closed(self, block, array):
@@ -319,15 +542,11 @@ class SymAPixSolver:
         :param array: solution or user_solution
         :return: bool
         """
-        all_walls = []
-        for b in block:
-            all_walls.append(define_frame(b[0], b[1]))
-        all_walls = np.array(all_walls).reshape(-1, 2)
-        all_walls = np.array([x for x in all_walls if count(all_walls, x) == 1])
-        for w in all_walls:
-            if 0 <= w[0] < self.size[0] and 0 <= w[1] < self.size[1] and array[w[0], w[1]] != 1:
-                return False
-        return True
+        bits = self.bitboard() if array is self.solution else BitBoard(array)
+        mask = bits.mask(block)
+        if array is self.solution:
+            self.watch_squares(bits, mask)
+        return bits.is_closed(mask)
 
     def test_dots(self, x, y, dots):
         """
@@ -340,17 +559,11 @@ class SymAPixSolver:
         ok_dots = []
         for d in dots:
             p = symmetric_point(d[0], d[1], x, y)
-            if self.is_inside(*p) and self.solution[p[0], p[1]] == 0:
+            if self.is_inside(*p) and self.solution_at(*p) == 0:
                 ok_dots.append(d)
         if len(ok_dots) == 1:
             d = ok_dots[0]
-            walls = define_frame(x, y)
-            for w in walls:
-                sym_w = symmetric_point(d[0], d[1], w[0], w[1])
-                if self.is_wall(*w) and self.is_inside(*sym_w):
-                    self.solution[sym_w[0], sym_w[1]] = 1
-                elif self.is_wall(*sym_w) and self.is_inside(*w):
-                    self.solution[w[0], w[1]] = 1
+            self.mirror_walls(d[0], d[1], self.geometry.frame_indices(x, y))
 
     def is_wall(self, x, y, user=False):
         """
@@ -360,17 +573,17 @@ class SymAPixSolver:
         :param user: whether to check user solution or not
         :return: bool
         """
+        if not (-1 <= x <= self.size[0] and -1 <= y <= self.size[1]):
+            return x in (-1, self.size[0]) or y in (-1, self.size[1])  # lines of border go on outside of margin
         if user:
-            array = self.user_solution
-        else:
-            array = self.solution
-        if x in [-1, self.size[0]]:
-            return True
-        elif y in [-1, self.size[1]]:
-            return True
-        elif 0 <= x < self.size[0] and 0 <= y < self.size[1] and array[x, y] == 1:
-            return True
-        return False
+            return self.padded_user_solution.item(self.offset + x * self.stride + y) == 1
+        self.watch(x, y)
+        return self.padded_solution.item(self.offset + x * self.stride + y) == 1
+
+    def solution_at(self, x, y):
+        """Reads value of solution in x, y, recording it for current task."""
+        self.watch(x, y)
+        return self.solution.item(x, y)
 
     def is_inside(self, i, j):
         """
@@ -379,47 +592,41 @@ class SymAPixSolver:
         :param j: position
         :return:
         """
-        if 0 <= i < self.size[0] and 0 <= j < self.size[1]:
-            return True
-        else:
-            return False
+        return 0 <= i < self.size[0] and 0 <= j < self.size[1]
 
     def is_solved(self):
         """Checks if puzzle is finished: if all squares are filled (value grater then 0)."""
         for i in range(0, self.size[0], 2):
             for j in range(0, self.size[1], 2):
-                if self.solution[i, j] == 0:
+                if self.solution.item(i, j) == 0:
                     return False
         return True
 
     def correct_solution(self):
-        """Corrects solution."""
-        for i in range(0, self.size[0]):
-            for j in range(0, self.size[1]):
-                if self.puzzle[i, j] > 0:
-                    queue = define_block(i, j)
-                    visited = []
-                    while queue:
-                        q = queue.pop()
-                        visited.append(q)
-                        for p in adjacent_squares(*q):
-                            p_sym = symmetric_point(i, j, *p)
-                            q_sym = symmetric_point(i, j, *q)
-                            pos_wall = wall_between(p[0], p[1], q[0], q[1])
-                            sym_wall = wall_between(p_sym[0], p_sym[1], q_sym[0], q_sym[1])
-                            if not self.is_wall(*pos_wall) and not self.is_wall(*sym_wall) and p not in visited:
-                                queue.append(p)
-                            elif self.is_wall(*pos_wall) and not self.is_wall(*sym_wall):
-                                self.solution[sym_wall[0], sym_wall[1]] = 1
-                            elif not self.is_wall(*pos_wall) and self.is_wall(*sym_wall):
-                                self.solution[pos_wall[0], pos_wall[1]] = 1
-                    block = get_unique(visited)
-                    for b in block:
-                        self.solution[b[0], b[1]] = self.puzzle[i, j]
+        """Corrects solution: squares reachable from dot without crossing wall or its mirror image
+        are filled with color of dot, and walls around them are copied to their mirror images."""
+        for i, j in self.dots_positions():
+            d = self.index(i, j)
+            queue = self.geometry.block_indices(i, j).tolist()
+            visited = set()
+            walls = []
+            while queue:
+                q = queue.pop()
+                visited.add(q)
+                for o in self.wall_offsets:
+                    w = q + o
+                    m = self.geometry.mirror_index(w, d)
+                    if self.flat_solution.item(w) != 1 and (m is None or self.flat_solution.item(m) != 1):
+                        if q + 2 * o not in visited:
+                            queue.append(q + 2 * o)
+                    else:
+                        walls.append(w)
+            self.mirror_walls(i, j, walls)
+            self.flat_solution[list(visited)] = self.puzzle.item(i, j)
 
     def print_solution(self):
         """For tests: prints solution"""
-        for i, row in enumerate(self.solution):
+        for i, row in enumerate(self.solution.tolist()):
             txt = ''
             for j, el in enumerate(row):
                 if el == -4:
@@ -472,7 +679,7 @@ class SymAPixSolver:
     def get_user_value(self, i, j):
         """Reads value chosen by user."""
         if 0 <= i < self.size[0] and 0 <= j < self.size[1]:
-            return self.user_solution[i, j]
+            return self.user_solution.item(i, j)
 
     def clear_user_board(self):
         """Clears user's solution."""
@@ -481,83 +688,97 @@ class SymAPixSolver:
                 self.user_solution[i, j] = 0
 
     def set_user_value(self, x, y, val):
-        """Sets value chosen by user."""
-        self.clear_user_board()
+        """Sets value chosen by user, updates only blocks next to changed wall."""
         self.user_solution[x, y] = val
-        self.update_user_filling()
+        if (x + y) % 2 > 0:
+            if self.mismatches is not None:
+                if self.user_solution.item(x, y) != self.solution.item(x, y):
+                    self.mismatches.add((x, y))
+                else:
+                    self.mismatches.discard((x, y))
+            self.update_user_blocks(self.geometry.next_to(x, y))
 
     def update_user_filling(self):
         """Updates blocked regions and fills them."""
-        for i in range(self.size[0]):
-            for j in range(self.size[1]):
-                if self.puzzle[i, j] > 0:
-                    block = []
-                    if self.block_is_closed(define_block(i, j), self.user_solution):
-                        block = define_block(i, j)
-                    else:
-                        queue = define_block(i, j)
-                        visited = []
-                        search = True
-                        while queue and search:
-                            p = queue.pop()
-                            visited.append(p)
-                            next_ones = adjacent_squares(p[0], p[1])
-                            for n in next_ones:
-                                if self.is_inside(*n) and n not in visited:
-                                    if not self.is_wall(*wall_between(p[0], p[1], n[0], n[1]), user=True):
-                                        queue.append(n)
-                                    if self.puzzle[n[0], n[1]] > 0 and \
-                                            not self.is_wall(*wall_between(p[0], p[1], n[0], n[1])):
-                                        search = False
-                                        break
-                        if search:
-                            block = get_unique(np.array(visited))
-                    if len(block) > 0:
-                        if self.block_is_closed(block, self.user_solution):
-                            for b in block:
-                                self.user_solution[b[0], b[1]] = self.puzzle[i, j]
-        for i, row in enumerate(self.user_solution):
-            for j, el in enumerate(row):
-                self.fill_color[i, j] = el if i % 2 == 0 and j % 2 == 0 and el > 0 else 0
+        self.update_user_blocks(self.squares_positions())
+
+    def update_user_blocks(self, squares):
+        """
+        Finds user's blocks containing given squares and fills them if they have exactly one dot.
+        :param squares: squares to be updated
+        :return: None
+        """
+        done = set()
+        for x, y in squares:
+            if self.is_inside(x, y) and (x, y) not in done:
+                block = self.user_block(x, y)
+                done |= block
+                dots = set()
+                for a, b in block:
+                    dots.update((d[0], d[1]) for d in self.dots_list(a, b))
+                color = 0
+                if len(dots) == 1:
+                    i, j = dots.pop()
+                    if all((a, b) in block for a, b in self.geometry.block(i, j)):
+                        color = self.puzzle.item(i, j)
+                for a, b in block:
+                    self.user_solution[a, b] = color
+                    self.fill_color[a, b] = color
+
+    def user_block(self, x, y):
+        """
+        Finds squares connected with square x, y, not separated by user's walls.
+        :param x: position
+        :param y: position
+        :return: set of squares
+        """
+        return set(self.connected_squares([(x, y)], user=True))
+
+    def connected_squares(self, squares, user=False):
+        """
+        Finds squares connected with given squares, not separated by walls.
+        Walls are not recorded for current task.
+        :param squares: starting squares
+        :param user: whether to use user solution or not
+        :return: list of squares, row by row
+        """
+        board = self.padded_user_solution if user else self.padded_solution
+        reached = flood(board.reshape(-1), [self.index(a, b) for a, b in squares], self.stride, self.flood_buffers)
+        return [self.position(k) for k in reached.tolist()]
+
+    def user_mismatches(self):
+        """Returns set of walls where user's solution differs from solution; kept up to date by set_user_value."""
+        if self.mismatches is None:
+            walls = np.zeros(self.size, bool)
+            walls[::2, 1::2] = True
+            walls[1::2, ::2] = True
+            diff = walls & (self.user_solution != self.solution)
+            self.mismatches = set((int(i), int(j)) for i, j in np.argwhere(diff))
+        return self.mismatches
 
     def set_solved(self):
         """Sets user solution to real solution."""
-        self.user_solution = copy.deepcopy(self.solution)
-        for i, row in enumerate(self.user_solution):
+        self.user_solution[...] = self.solution
+        self.mismatches = None
+        for i, row in enumerate(self.user_solution.tolist()):
             for j, el in enumerate(row):
                 self.fill_color[i, j] = el if i % 2 == 0 and j % 2 == 0 and el > 0 else -1
 
     def clear_user_solution(self):
         """Resets user solution."""
-        self.user_solution = np.zeros(self.size, int)
-        self.fill_color = np.zeros(self.size, int) - 1
+        self.user_solution[...] = 0
+        self.user_solution[self.puzzle > 0] = -2
+        self.fill_color = new_board(self.size, -1)
+        self.mismatches = None
 
     def check_user_solution(self):
         """Checks user solution. Omits unsure squares."""
-        for i in range(self.size[0]):
-            for j in range(self.size[1]):
-                if not (i % 2 == 0 and j % 2 == 0) and not (i % 2 > 0 and j % 2 > 0):
-                    if self.solution[i, j] != self.user_solution[i, j] and self.user_solution[i, j] != 0:
-                        if i % 2 == 0:
-                            i /= 2
-                        else:
-                            i = (i - 1) / 2
-                        if j % 2 == 0:
-                            j /= 2
-                        else:
-                            j = (j - 1) / 2
-                        return int(i), int(j)
+        wrong = [w for w in self.user_mismatches() if self.user_solution.item(w[0], w[1]) != 0]
+        if wrong:
+            i, j = min(wrong)
+            return i // 2, j // 2
         return -1, -1
 
     def is_solved_by_user(self):
         """Checks if puzzle is solved by user."""
-        filled_count = 0
-        for i in range(0, self.size[0]):
-            for j in range(0, self.size[1]):
-                if not (i % 2 == 0 and j % 2 == 0) and not (i % 2 > 0 and j % 2 > 0):
-                    if self.user_solution[i, j] != self.solution[i, j]:
-                        filled_count += 1
-        if filled_count == 0:
-            return True
-        else:
-            return False
+        return len(self.user_mismatches()) == 0